@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OA_back.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# 服务端推送事件流（SSE，见app/home/events.py）不经过Django的中间件和视图，
+# 在ASGI层直接处理，一个连接只占用一个协程；其他请求交给Django
+# 部署：uvicorn OA_back.asgi:application（WSGI下没有这个接口，前端继续轮询）
+from app.home.events import EVENTS_PATH, stream  # noqa: E402 需要在Django初始化之后导入
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH and scope['method'] == 'GET':
+        return await stream(scope, receive, send)
+    return await django_application(scope, receive, send)
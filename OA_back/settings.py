@@ -130,6 +130,11 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# 批量创建用户时并行计算密码哈希的进程数，None表示使用CPU核数
+PASSWORD_HASH_WORKERS = None
+# 少于这个数量的密码直接串行计算，不启动进程池
+PASSWORD_HASH_PARALLEL_THRESHOLD = 32
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -157,6 +162,15 @@ STATICFILES_DIRS = [
 MEDIA_ROOT=BASE_DIR / 'media'#媒体文件保存路径
 MEDIA_URL = '/media/'#媒体文件访问路径
 
+# 导出（Excel/CSV）时每次从数据库读取的行数
+EXPORT_CHUNK_SIZE = 2000
+# 异步导出生成的文件保留时间（秒），过期后由定时任务删除
+EXPORT_FILE_TTL = 60*60*24
+# 异步导出生成的文件保存路径：不能放在MEDIA_ROOT下（/api/media/不需要登录），只能通过导出任务的下载接口下载
+EXPORT_ROOT = env.str('EXPORT_ROOT', str(BASE_DIR / 'exports'))
+# 批量导入员工时每批插入的行数
+STAFF_IMPORT_BATCH_SIZE = 500
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -185,7 +199,8 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'app.oaauth.authentications.UserTokenAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # 页码分页，带上cursor参数时切换为keyset分页（?cursor=&count=0）
+    'DEFAULT_PAGINATION_CLASS': 'utils.paginations.KeysetPagination',
     'PAGE_SIZE': 10
 }
 
@@ -200,6 +215,23 @@ EMAIL_PORT = 587
 EMAIL_HOST_USER = ''
 EMAIL_HOST_PASSWORD = ''
 DEFAULT_FROM_EMAIL = ''
+# 批量发送激活邮件：每块邮件数量、每块失败重试次数、重试间隔（秒，指数退避）、每秒最多发送数量（0不限制）
+ACTIVE_EMAIL_CHUNK_SIZE = 100
+ACTIVE_EMAIL_MAX_RETRIES = 3
+ACTIVE_EMAIL_RETRY_DELAY = 5
+ACTIVE_EMAIL_RATE_LIMIT = 10
+# 邮件发件箱：每批领取的消息数量、每次任务最多处理的批数、最多尝试次数、重试间隔（秒，指数退避）、
+# 全局每秒最多发送数量（所有worker共享，0不限制）、领取后多久没发完可以被其他worker重新领取（秒）
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_BATCHES = 10
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 30
+EMAIL_OUTBOX_RATE_LIMIT = 10
+EMAIL_OUTBOX_LEASE = 60*5
+# 通知已读回执：每批写入数量、每次任务最多处理的批数、已读标记（去重）在缓存中的有效期（秒）
+INFORM_RECEIPT_BATCH_SIZE = 1000
+INFORM_RECEIPT_MAX_BATCHES = 20
+INFORM_READ_MARKER_TIMEOUT = 60*60*24*7
 
 
 
@@ -207,6 +239,27 @@ DEFAULT_FROM_EMAIL = ''
 CELERY_BROKER_URL = env.str('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/1')# 中间人地址
 CELERY_RESULT_BACKEND = env.str('CELERY_RESULT_BACKEND', 'redis://127.0.0.1:6379/2')# 指定结果的接受地址
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True # 是否在启动时重试连接
+# 测试时可以不依赖Redis：CELERY_BROKER_URL=memory:// CELERY_RESULT_BACKEND=cache+memory:// CELERY_TASK_ALWAYS_EAGER=True
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', False) # 是否在当前进程中同步执行任务
+# 定时任务（celery -A OA_back beat）
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-export-jobs': {
+        'task': 'cleanup_export_jobs_task', # 清理过期的导出文件
+        'schedule': 60*10,
+    },
+    'dispatch-email-outbox': {
+        'task': 'dispatch_outbox_task', # 发送邮件发件箱中到期（重试）的消息
+        'schedule': 30,
+    },
+    'flush-inform-receipts': {
+        'task': 'flush_receipts_task', # 把缓冲区中的已读回执写入数据库
+        'schedule': 60,
+    },
+    'reconcile-badges': {
+        'task': 'reconcile_badges_task', # 重新计算首页角标计数
+        'schedule': 60*10,
+    },
+}
 
 # 缓存配置
 CACHES = {
@@ -216,6 +269,24 @@ CACHES = {
     }
 }
 
+# 登录用户（principal）缓存配置：进程内LRU + Redis
+PRINCIPAL_CACHE_LOCAL_SIZE = 2048 # 进程内LRU最多缓存的用户数
+PRINCIPAL_CACHE_LOCAL_TTL = 10 # 进程内缓存有效期（秒），其他进程修改用户后最多延迟这么久生效
+PRINCIPAL_CACHE_TIMEOUT = 60*30 # Redis中缓存有效期（秒）
+# 考勤审批路由表（用户 -> 部门 -> 审批人）缓存有效期（秒），数据变化时由signals增量更新
+ROUTING_CACHE_TIMEOUT = 60*60*24
+# 工作日计算的每周工作日（周一到周日，1为上班），节假日和调休上班日在Holiday表中维护
+WORK_WEEKMASK = '1111100'
+# 首页角标计数（待审批考勤、未读通知）缓存有效期（秒），定时任务reconcile_badges_task会重新计算
+BADGE_CACHE_TIMEOUT = 60*60*24
+# 基础数据（考勤类型、部门列表、部门人数）缓存：缓存有效期（秒），以及返回的Cache-Control（客户端每次用ETag验证）
+REFDATA_CACHE_TIMEOUT = 60*60*24
+REFDATA_CACHE_CONTROL = 'private, no-cache'
+# 服务端推送事件流（ASGI）：心跳间隔（秒）、连接最长保持时间（秒，到期后客户端自动重连并重新认证）、每个连接最多积压的事件数
+EVENTS_HEARTBEAT = 15
+EVENTS_MAX_AGE = 60*30
+EVENTS_QUEUE_SIZE = 100
+
 #日志设置
 LOGGING = {
     "version": 1,
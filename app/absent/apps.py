@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AbsentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.absent'
+
+    def ready(self):
+        # 注册信号处理函数（审批路由表增量更新）
+        from . import signals  # noqa: F401
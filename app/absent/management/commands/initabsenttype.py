@@ -3,6 +3,7 @@ from django.core.management.base import BaseCommand
 
 # 导入模型类（假设模型位于 app.absent.models 模块中）
 from app.absent.models import AbsentType
+from utils import refdata
 
 
 # 定义自定义命令类，继承自 BaseCommand
@@ -23,6 +24,8 @@ class Command(BaseCommand):
         # 使用 bulk_create 方法批量创建记录（一次性将所有实例保存到数据库）
         # bulk_create 比逐条 save() 更高效，减少数据库查询次数
         AbsentType.objects.bulk_create(absents)
+        # bulk_create 不会触发 signal，手动让考勤类型列表的缓存失效
+        refdata.bump(refdata.ABSENT_TYPES)
 
         # 在控制台输出成功消息（使用 self.stdout.write 而不是 print 可以更好地处理输出流）
         self.stdout.write('考勤类型数据初始化成功！')
\ No newline at end of file
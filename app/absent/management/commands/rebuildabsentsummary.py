@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from app.absent.summary import rebuild
+
+
+#从考勤表全量重建考勤汇总表（上线汇总功能、或者直接改过数据库之后执行）
+# python manage.py rebuildabsentsummary
+class Command(BaseCommand):
+    help = '重建考勤汇总表（按员工、部门、考勤类型、月份）'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild()
+        self.stdout.write(f'考勤汇总表重建完成：{count}行，耗时{time.perf_counter() - start:.2f}秒')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app.absent.routing import rebuild
+
+
+#把所有用户、部门的审批路由信息写入缓存（清空缓存或者直接改过数据库之后执行）
+# python manage.py rebuildrouting
+class Command(BaseCommand):
+    help = '重建考勤审批路由表缓存'
+
+    def handle(self, *args, **options):
+        users, departments = rebuild()
+        self.stdout.write(f'审批路由表重建完成：{users}个用户，{departments}个部门')
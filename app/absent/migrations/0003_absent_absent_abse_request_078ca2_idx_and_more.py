@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absent', '0002_alter_absent_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absent',
+            index=models.Index(fields=['requester', '-create_time'], name='absent_abse_request_078ca2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='absent',
+            index=models.Index(fields=['responder', '-create_time'], name='absent_abse_respond_1f0e18_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absent', '0003_absent_absent_abse_request_078ca2_idx_and_more'),
+        ('oaauth', '0003_oauser_oaauth_oaus_departm_daa723_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AbsentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('auditing_count', models.IntegerField(default=0)),
+                ('auditing_days', models.IntegerField(default=0)),
+                ('pass_count', models.IntegerField(default=0)),
+                ('pass_days', models.IntegerField(default=0)),
+                ('reject_count', models.IntegerField(default=0)),
+                ('reject_days', models.IntegerField(default=0)),
+                ('absent_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', related_query_name='summaries', to='absent.absenttype')),
+                ('department', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='absent_summaries', related_query_name='absent_summaries', to='oaauth.oadepartment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='absent_summaries', related_query_name='absent_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['month', 'department'], name='absent_abse_month_ef0459_idx')],
+                'unique_together': {('user', 'department', 'absent_type', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absent', '0004_absentsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absent',
+            index=models.Index(fields=['requester', 'end_date', 'start_date'], name='absent_abse_request_b06ffd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='absent',
+            index=models.Index(fields=['start_date', 'end_date'], name='absent_abse_start_d_8b7b79_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absent', '0005_absent_absent_abse_request_b06ffd_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('is_workday', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='absentsummary',
+            name='auditing_workdays',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='absentsummary',
+            name='pass_workdays',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='absentsummary',
+            name='reject_workdays',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:33
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+COUNTER_FIELDS = ('auditing_count', 'auditing_days', 'auditing_workdays', 'pass_count', 'pass_days', 'pass_workdays',
+                  'reject_count', 'reject_days', 'reject_workdays')
+
+
+def backfill(apps, schema_editor):
+    # 已有考勤的部门：只能取申请人当前的部门，和rebuildabsentsummary重建汇总表时的部门一致
+    # summary_workdays留空，审批时按当前节假日重新计算（执行rebuildabsentsummary后会补上）
+    Absent = apps.get_model('absent', 'Absent')
+    OAUser = apps.get_model(settings.AUTH_USER_MODEL)
+    Absent.objects.update(department_id=Subquery(OAUser.objects.filter(pk=OuterRef('requester_id')).values('department_id')[:1]))
+
+
+def merge_null_department_summaries(apps, schema_editor):
+    # 添加唯一约束之前，合并重复的没有部门的汇总行
+    AbsentSummary = apps.get_model('absent', 'AbsentSummary')
+    duplicates = (
+        AbsentSummary.objects.filter(department__isnull=True).values('user_id', 'absent_type_id', 'month')
+        .annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for group in duplicates:
+        first, *rest = AbsentSummary.objects.filter(department__isnull=True, **{key: group[key] for key in ('user_id', 'absent_type_id', 'month')}).order_by('id')
+        for row in rest:
+            for field in COUNTER_FIELDS:
+                setattr(first, field, getattr(first, field) + getattr(row, field))
+        first.save()
+        AbsentSummary.objects.filter(id__in=[row.id for row in rest]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absent', '0006_holiday_absentsummary_auditing_workdays_and_more'),
+        ('oaauth', '0003_oauser_oaauth_oaus_departm_daa723_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='absent',
+            name='department',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='absents', related_query_name='absents', to='oaauth.oadepartment'),
+        ),
+        migrations.AddField(
+            model_name='absent',
+            name='summary_workdays',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.RunPython(merge_null_department_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='absentsummary',
+            constraint=models.UniqueConstraint(models.F('user'), django.db.models.functions.comparison.Coalesce('department', 0), models.F('absent_type'), models.F('month'), name='absent_summary_unique_null_department'),
+        ),
+    ]
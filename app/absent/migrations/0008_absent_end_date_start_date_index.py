@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('absent', '0007_absent_department_summary_workdays'),
+        ('oaauth', '0003_oauser_oaauth_oaus_departm_daa723_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='absent',
+            name='absent_abse_start_d_8b7b79_idx',
+        ),
+        migrations.AddIndex(
+            model_name='absent',
+            index=models.Index(fields=['end_date', 'start_date'], name='absent_abse_end_dat_1db6e0_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models  # 导入Django的模型类
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model  # 导入Django的用户模型
 
 # 获取用户模型，这里重命名为 OAUser
@@ -41,6 +42,67 @@ class Absent(models.Model): #请假详情信息
     create_time = models.DateTimeField(auto_now_add=True)
     # 10. 审批回复内容
     response_content = models.TextField(blank=True)
+    # 11. 计入汇总表时的部门（申请时所在的部门）和每个月的工作日天数（见summary.py）
+    # 审批时按这些数据从审核中减掉，员工换了部门、节假日修改之后也和创建时加上的一致
+    department = models.ForeignKey('oaauth.OAdepartment', null=True, on_delete=models.SET_NULL, related_name='absents', related_query_name='absents')
+    summary_workdays = models.JSONField(default=list, blank=True)
 
     class Meta:
-        ordering = ['-create_time']#按照时间倒序排列
\ No newline at end of file
+        ordering = ['-create_time']#按照时间倒序排列
+        indexes = [
+            # 我的考勤 / 下属的考勤：按申请人或审批人过滤，按时间倒序
+            models.Index(fields=['requester', '-create_time']),
+            models.Index(fields=['responder', '-create_time']),
+            # 时间段重叠查询（start_date <= 结束 AND end_date >= 开始）：
+            # 某个员工的请假冲突检查，按员工定位后在end_date上范围扫描
+            models.Index(fields=['requester', 'end_date', 'start_date']),
+            # 日历：按end_date范围扫描（end_date >= 开始），start_date在索引中直接过滤，不需要回表
+            # 请假都已经结束了的历史数据不会被扫描；反过来按start_date扫描时，start_date <= 结束 会扫到之前的全部考勤
+            models.Index(fields=['end_date', 'start_date']),
+        ]
+
+# 考勤汇总：每个员工、部门、考勤类型、月份一行，考勤创建和审批时增量更新（见summary.py）
+# 月报直接读这张表，不需要扫描全部考勤数据
+class AbsentSummary(models.Model):
+    user = models.ForeignKey(OAUser, on_delete=models.CASCADE, related_name='absent_summaries', related_query_name='absent_summaries')
+    # 统计时员工所在的部门
+    department = models.ForeignKey('oaauth.OAdepartment', null=True, on_delete=models.SET_NULL, related_name='absent_summaries', related_query_name='absent_summaries')
+    absent_type = models.ForeignKey(AbsentType, on_delete=models.CASCADE, related_name='summaries', related_query_name='summaries')
+    # 月份，统一存成每月1号
+    month = models.DateField()
+    # 各个状态的考勤次数和天数；跨月的考勤，次数记在开始的月份，天数按每个月实际的天数拆分
+    auditing_count = models.IntegerField(default=0)
+    auditing_days = models.IntegerField(default=0)
+    pass_count = models.IntegerField(default=0)
+    pass_days = models.IntegerField(default=0)
+    reject_count = models.IntegerField(default=0)
+    reject_days = models.IntegerField(default=0)
+    # 工作日天数（去掉周末、节假日，加上调休上班日）
+    auditing_workdays = models.IntegerField(default=0)
+    pass_workdays = models.IntegerField(default=0)
+    reject_workdays = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'department', 'absent_type', 'month')
+        constraints = [
+            # unique_together不约束部门为NULL的行（NULL互不相等），并发插入没有部门的汇总行时会重复
+            # 用COALESCE(department_id, 0)再约束一次；MySQL会忽略带condition的部分唯一约束，所以不用condition
+            models.UniqueConstraint('user', Coalesce('department', 0), 'absent_type', 'month', name='absent_summary_unique_null_department'),
+        ]
+        ordering = ['-month']
+        indexes = [
+            # 按月份、部门查询月报
+            models.Index(fields=['month', 'department']),
+        ]
+
+
+# 节假日和调休上班日：工作日计算（workdays.py）加载一次后缓存在进程中，修改后通过signals让缓存失效
+# 注意：修改节假日后，考勤汇总表中的工作日天数需要执行 rebuildabsentsummary 重新计算
+class Holiday(models.Model):
+    date = models.DateField(unique=True)
+    name = models.CharField(max_length=100, blank=True)
+    # False：放假（即使是工作日）；True：调休上班（即使是周末）
+    is_workday = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['date']
@@ -0,0 +1,220 @@
+#考勤审批路由表：预先把"用户 -> 部门"、"部门 -> (leader, manager, 是否董事会)"存到缓存中
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  routing:user:{uid}  -> department_id                          │
+# │  routing:dept:{id}   -> (leader_id, manager_id, is_board)       │
+# │                                                                 │
+# │  审批人：                                                        │
+# │    没有部门              -> 没有审批人                           │
+# │    部门leader（董事会）   -> 没有审批人                           │
+# │    部门leader（其他部门） -> 分管该部门的董事（manager）            │
+# │    普通员工              -> 部门leader，部门没有leader时交给manager │
+# │    以上审批人为空（没有设置或已被删除） -> UNASSIGNED，不能发起考勤  │
+# │                                                                 │
+# │  部门的leader/manager变化、员工换部门时由signals在事务提交后增量更新  │
+# │  resolve_responders() 批量解析：两次get_many + 未命中的两次IN查询   │
+# │  get_responder() 返回审批人用户对象，审批人已被删除时丢弃过期的路由  │
+# │        信息，从数据库重新解析                                     │
+# └─────────────────────────────────────────────────────────────────┘
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from app.oaauth.models import OAdepartment
+from app.oaauth.principals import principal_cache
+from app.oaauth.scopes import BOARD_DEPARTMENT_NAME
+
+logger = logging.getLogger(__name__)
+
+OAUser = get_user_model()
+
+USER_KEY = 'routing:user:{uid}'
+DEPARTMENT_KEY = 'routing:dept:{id}'
+# 缓存中用来表示"没有部门"/"部门不存在"，和未命中（None）区分开
+MISSING = 'missing'
+# 需要审批人，但是部门没有设置leader/manager（或者已经被删除）；和"不需要审批人"（None）区分开，不能当作直接通过
+UNASSIGNED = 'unassigned'
+
+
+class ResponderUnassigned(Exception):
+    """需要审批人，但是所在部门没有可以审批的人"""
+
+
+def get_timeout():
+    return getattr(settings, 'ROUTING_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def department_route(department):
+    """部门的路由信息：(leader_id, manager_id, is_board)"""
+    return department.leader_id, department.manager_id, department.name == BOARD_DEPARTMENT_NAME
+
+
+def route(uid, department_id, departments):
+    """
+    根据用户的部门和部门路由信息计算审批人uid：不需要审批人返回None，
+    需要审批人但是部门的leader/manager为空返回UNASSIGNED
+    """
+    department = departments.get(department_id) if department_id not in (None, MISSING) else None
+    if department is None or department == MISSING:
+        return None
+    leader_id, manager_id, is_board = department
+    if leader_id == uid:
+        if is_board:
+            return None
+        return manager_id or UNASSIGNED
+    # 部门还没有leader（或者leader已经被删除）：交给分管该部门的董事
+    return leader_id or manager_id or UNASSIGNED
+
+
+def _cache_get_many(keys):
+    try:
+        return cache.get_many(keys)
+    except Exception as e:
+        # 缓存不可用时直接查数据库
+        logger.warning('routing cache unavailable: %s', e)
+        return {}
+
+
+def _cache_set_many(mapping):
+    try:
+        cache.set_many(mapping, get_timeout())
+    except Exception as e:
+        logger.warning('routing cache unavailable: %s', e)
+
+
+def _cache_delete_many(keys):
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning('routing cache unavailable: %s', e)
+
+
+def load_user_departments(uids):
+    """{uid: department_id}，缓存未命中的用户一次IN查询"""
+    uids = list(uids)
+    cached = _cache_get_many([USER_KEY.format(uid=uid) for uid in uids])
+    result = {}
+    missed = []
+    for uid in uids:
+        value = cached.get(USER_KEY.format(uid=uid))
+        if value is None:
+            missed.append(uid)
+        else:
+            result[uid] = value
+    if missed:
+        found = dict(OAUser.objects.filter(uid__in=missed).values_list('uid', 'department_id'))
+        fresh = {uid: found.get(uid) or MISSING for uid in missed}
+        result.update(fresh)
+        _cache_set_many({USER_KEY.format(uid=uid): value for uid, value in fresh.items()})
+    return result
+
+
+def load_departments(department_ids):
+    """{department_id: (leader_id, manager_id, is_board) 或 MISSING}，缓存未命中的部门一次IN查询"""
+    department_ids = [value for value in set(department_ids) if value not in (None, MISSING)]
+    cached = _cache_get_many([DEPARTMENT_KEY.format(id=value) for value in department_ids])
+    result = {}
+    missed = []
+    for department_id in department_ids:
+        value = cached.get(DEPARTMENT_KEY.format(id=department_id))
+        if value is None:
+            missed.append(department_id)
+        else:
+            result[department_id] = tuple(value) if value != MISSING else MISSING
+    if missed:
+        found = {
+            department.id: department_route(department)
+            for department in OAdepartment.objects.filter(id__in=missed).only('id', 'name', 'leader_id', 'manager_id')
+        }
+        fresh = {department_id: found.get(department_id, MISSING) for department_id in missed}
+        result.update(fresh)
+        _cache_set_many({DEPARTMENT_KEY.format(id=key): value for key, value in fresh.items()})
+    return result
+
+
+def resolve_responders(uids):
+    """
+    批量解析审批人：{uid: 审批人uid、None（不需要审批人）或UNASSIGNED（没有可以审批的人）}
+    导入员工、批量审批时一次调用解析成千上万个用户，而不是每个用户查询一次
+    """
+    uids = list(dict.fromkeys(uids))
+    if not uids:
+        return {}
+    user_departments = load_user_departments(uids)
+    departments = load_departments(user_departments.values())
+    return {uid: route(uid, user_departments.get(uid), departments) for uid in uids}
+
+
+def resolve_responder(uid):
+    """解析单个用户的审批人uid，返回值同resolve_responders"""
+    return resolve_responders([uid])[uid]
+
+
+def get_responder(uid):
+    """
+    用户的审批人（principal缓存中的用户对象，部门已经预先加载），不需要审批人返回None，
+    需要审批人但是部门没有设置时抛出ResponderUnassigned
+    删除用户时数据库把部门的leader/manager置空，不会触发signals，路由表中可能还是已经删除的审批人：
+    这时删除这个用户和他部门的路由信息，从数据库重新解析一次
+    """
+    responder_id = resolve_responder(uid)
+    if responder_id is None:
+        return None
+    if responder_id == UNASSIGNED:
+        raise ResponderUnassigned(uid)
+    try:
+        return principal_cache.get(responder_id)
+    except OAUser.DoesNotExist:
+        logger.warning('stale routing entry: responder %s of %s does not exist', responder_id, uid)
+
+    stale_department_id = load_user_departments([uid]).get(uid)
+    forget_users([uid])
+    department_id = load_user_departments([uid]).get(uid)
+    forget_departments([value for value in (stale_department_id, department_id) if value not in (None, MISSING)])
+    responder_id = resolve_responder(uid)
+    if responder_id is None:
+        return None
+    if responder_id == UNASSIGNED:
+        raise ResponderUnassigned(uid)
+    # 已经是数据库中的数据，审批人还不存在说明刚好被并发删除，不能当作没有审批人（会直接审批通过），直接抛出异常
+    return principal_cache.get(responder_id)
+
+
+def update_user(uid, department_id):
+    """用户保存（事务提交）后更新用户 -> 部门"""
+    _cache_set_many({USER_KEY.format(uid=uid): department_id or MISSING})
+
+
+def update_department(department_id, value):
+    """部门保存（事务提交）后更新部门路由信息，value是department_route()的返回值"""
+    _cache_set_many({DEPARTMENT_KEY.format(id=department_id): value})
+
+
+def forget_users(uids):
+    _cache_delete_many([USER_KEY.format(uid=uid) for uid in uids])
+
+
+def forget_departments(department_ids):
+    _cache_delete_many([DEPARTMENT_KEY.format(id=department_id) for department_id in department_ids])
+
+
+def rebuild(chunk_size=2000):
+    """把所有用户和部门的路由信息写入缓存，返回 (用户数量, 部门数量)"""
+    departments = {
+        DEPARTMENT_KEY.format(id=department.id): department_route(department)
+        for department in OAdepartment.objects.only('id', 'name', 'leader_id', 'manager_id')
+    }
+    _cache_set_many(departments)
+    count = 0
+    chunk = {}
+    for uid, department_id in OAUser.objects.values_list('uid', 'department_id').iterator(chunk_size=chunk_size):
+        chunk[USER_KEY.format(uid=uid)] = department_id or MISSING
+        if len(chunk) >= chunk_size:
+            _cache_set_many(chunk)
+            count += len(chunk)
+            chunk = {}
+    if chunk:
+        _cache_set_many(chunk)
+        count += len(chunk)
+    return count, len(departments)
@@ -1,17 +1,60 @@
 from rest_framework import serializers # 导入序列化器模块
-from .models import Absent, AbsentType, AbsentStatusChoices # 导入模型类
+from utils.serializers import SparseFieldsMixin  # 支持 ?fields=&expand= 裁剪返回的字段
+from .models import Absent, AbsentType, AbsentStatusChoices, AbsentSummary, Holiday # 导入模型类
 from app.oaauth.serializer import UserSerializer # 导入用户序列化器
 from rest_framework import exceptions # 导入异常类
-from .utils import get_responder # 导入获取审批人函数
+from .utils import get_responder, overlap_q # 导入获取审批人函数、时间段重叠条件
+from .routing import ResponderUnassigned # 部门没有可以审批的人
+from .workdays import count_workdays # 批量计算工作日天数
+from .signals import absents_decided # 考勤审批后的信号
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from app.home import badges # 首页角标计数
 
+OAUser = get_user_model()
 
-class AbsentTypeSerializer(serializers.ModelSerializer): # 定义一个考勤类型序列化器
+
+class AbsentTypeSerializer(SparseFieldsMixin, serializers.ModelSerializer): # 定义一个考勤类型序列化器
     class Meta:
         model = AbsentType# 指定模型类为AbsentType
         fields = "__all__"# 指定所有字段都序列化
 
 
-class AbsentSerializer(serializers.ModelSerializer):
+def decide_absents(conditions, responder_id, status, response_content):
+    """
+    审批满足conditions（必须包含审批人、状态=审核中）的考勤：先锁住这些行，再一次UPDATE修改的就正好是这些行，
+    只有这些考勤通知汇总表等下游、减少审批人的待审批数量；返回被修改的考勤列表
+    """
+    with transaction.atomic():
+        # 汇总表（类型、申请人、日期、部门、工作日天数）和事件推送（标题、审批人）用到的字段一次查出来
+        decided = list(
+            Absent.objects.select_for_update().filter(**conditions)
+            .only('id', 'title', 'requester_id', 'responder_id', 'absent_type_id', 'start_date', 'end_date', 'department_id', 'summary_workdays')
+        )
+        if not decided:
+            return decided
+        Absent.objects.filter(**conditions).update(status=status, response_content=response_content)
+        for absent in decided:
+            absent.status = status
+            absent.response_content = response_content
+        # 整批只通知一次
+        absents_decided.send(sender=Absent, absents=decided, status=status)
+        badges.absents_decided(responder_id, len(decided))
+    return decided
+
+
+# 序列化多条考勤时，所有考勤的工作日天数一次计算，而不是每条考勤计算一次
+class AbsentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        absents = list(data.all() if hasattr(data, 'all') else data)
+        if 'workdays' in self.child.fields:
+            workdays = count_workdays([absent.start_date for absent in absents], [absent.end_date for absent in absents])
+            for absent, value in zip(absents, workdays):
+                absent._workdays = value
+        return super().to_representation(absents)
+
+
+class AbsentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     #1. read_only=True：这个字段只只能读，只有在返回数据的时候会使用。
     #2. write_only=True：这个字段只能被写，只有在新增数据或者更新数据的时候会用到
 
@@ -20,17 +63,57 @@ class AbsentSerializer(serializers.ModelSerializer):
     #这样做是为了在序列化时，将absent_type_id转换为absent_type
     requester = UserSerializer(read_only=True)#read_only=True: 只读，即在序列化时包含这个字段，在反序列化时忽略这个字段
     responder = UserSerializer(read_only=True)#read_only=True: 只读，即在序列化时包含这个字段，在反序列化时忽略这个字段
+    workdays = serializers.SerializerMethodField()# 请假的工作日天数（去掉周末、节假日，加上调休上班日）
+    # 审批时只能改成通过或拒绝（发起时由create根据审批人决定，不用传）
+    status = serializers.ChoiceField(choices=[AbsentStatusChoices.PASS, AbsentStatusChoices.REJECT], required=False,
+                                     error_messages={"invalid_choice": "审批状态错误！"})
 
     class Meta:
         model = Absent# 指定模型类为Absent
-        fields = "__all__"# 指定所有字段都序列化
+        exclude = ('summary_workdays',)# 除了计入汇总表的工作日天数（内部使用），其他字段都序列化
+        read_only_fields = ('department',)# 申请时所在的部门，创建时自动记录
+        list_serializer_class = AbsentListSerializer# 列表一次计算所有考勤的工作日天数
+
+    def get_workdays(self, absent):
+        # 列表中已经由AbsentListSerializer批量计算好了
+        if hasattr(absent, '_workdays'):
+            return absent._workdays
+        return count_workdays([absent.start_date], [absent.end_date])[0]
 
     # 验证absent_type_id是否在数据库中存在
     def validate_absent_type_id(self, value):
-        if not AbsentType.objects.filter(pk=value).exists(): # pk=value: 通过主键查找，value是用户传入的ID
+        # 直接查出考勤类型对象（而不是exists()），create时赋值给absent，返回数据时序列化absent_type不用再查一次
+        self.absent_type = AbsentType.objects.filter(pk=value).first() # pk=value: 通过主键查找，value是用户传入的ID
+        if self.absent_type is None:
             raise exceptions.ValidationError("考勤类型不存在！")
         return value
 
+    def validate(self, attrs):
+        # 只在发起请假时检查，审批时不检查
+        if self.instance is None:
+            start_date, end_date = attrs.get('start_date'), attrs.get('end_date')
+            if start_date and end_date:
+                if start_date > end_date:
+                    raise exceptions.ValidationError("开始日期不能晚于结束日期！")
+                # 和自己审核中、已通过的请假时间重叠就不能再申请，走 (requester, end_date, start_date) 索引
+                # 先锁住申请人（用户表中的这一行），同一个人的请假申请串行执行，否则两个并发请求都能通过检查，
+                # 创建两条时间重叠的请假；锁在视图的事务（AbsentViewSet.create）提交后释放，这时考勤已经创建了
+                request = self.context['request']
+                user = request.user
+                # 部门没有leader/分管董事时不能发起（否则没有审批人，会被当作董事会leader直接通过）
+                try:
+                    get_responder(request)
+                except ResponderUnassigned:
+                    raise exceptions.ValidationError("所在部门还没有设置审批人，请联系管理员！")
+                list(OAUser.objects.select_for_update().filter(pk=user.uid).values_list('pk', flat=True))
+                if Absent.objects.filter(overlap_q(start_date, end_date), requester_id=user.uid,
+                                         status__in=[AbsentStatusChoices.AUDITING, AbsentStatusChoices.PASS]).exists():
+                    raise exceptions.ValidationError("该时间段内已经有请假申请！")
+        elif 'status' not in attrs:
+            # 审批时必须给出通过还是拒绝
+            raise exceptions.ValidationError({'status': ["审批状态错误！"]})
+        return attrs
+
     # create方法 - 用于创建新的请假审批记录
     def create(self, validated_data): #validated_data: 经过序列化器验证后的数据字典，相当于上面初步序列化后的数据字典
         request = self.context['request']  # 获取请求对象
@@ -55,7 +138,11 @@ class AbsentSerializer(serializers.ModelSerializer):
             validated_data['status']=AbsentStatusChoices.AUDITING #如果是部门leader，审批状态为审核中
 
         # 调用模型类的create方法，创建新的请假审批记录，包含请求对象和审批人，**validated_data 包含已经通过序列化器验证的所有字段数据
-        absent=Absent.objects.create(**validated_data,requester=user,responder=responder)
+        # requester和responder来自登录用户缓存，部门都已经加载好了；absent_type用校验时查出的对象
+        # 这样返回创建的数据时，序列化不会再产生查询
+        validated_data.pop('absent_type_id')
+        absent=Absent.objects.create(**validated_data,absent_type=self.absent_type,requester=user,responder=responder)
+        badges.absent_created(absent) # 审批人的待审批数量+1
         #absent包含字段有：id, absent_type, absent_type_id, requester, responder, start_time, end_time, reason, status, response_content, created_at, updated_at
 
         return absent
@@ -87,24 +174,92 @@ class AbsentSerializer(serializers.ModelSerializer):
 
         # 权限验证：检查当前用户是否为该请假记录的负责人
         # 只有请假记录的负责人才能进行审批操作
-        if instance.responder.uid != user.uid:  # 如果请假记录中的负责人UID与当前用户UID不匹配
+        if instance.responder_id != user.uid:  # 如果请假记录中的负责人UID与当前用户UID不匹配
             raise exceptions.AuthenticationFailed(detail='您无权处理该考勤！')
             # 抛出认证失败异常，表示用户无权限
             # 注意：这里用的是AuthenticationFailed，但实际上是权限问题
             # 更合适的可能是PermissionDenied异常
 
-        # 更新请假记录的状态
-        # validated_data['status'] 是用户提交的新状态
-        # 可能是批准、拒绝等状态
-        instance.status = validated_data['status']
-
-        # 更新审批内容/备注
-        # validated_data['response_content'] 是审批意见或说明
-        instance.response_content = validated_data['response_content']
-
-        # 将更新保存到数据库
-        instance.save()
+        # 审批：validated_data['status'] 只能是通过或拒绝，validated_data['response_content'] 是审批意见
+        # 上面的检查用的是读出来的instance，并发时可能已经被审批过了，所以和批量审批一样用带条件的UPDATE，
+        # 只有真正由这次请求修改的考勤才通知汇总表、减少待审批数量，重复提交不会重复计数
+        status = validated_data['status']
+        response_content = validated_data.get('response_content', '')
+        conditions = {'pk': instance.pk, 'responder_id': user.uid, 'status': AbsentStatusChoices.AUDITING}
+        if not decide_absents(conditions, user.uid, status, response_content):
+            raise exceptions.APIException(detail='不能修改已经确定的请假数据！')
+        instance.status = status
+        instance.response_content = response_content
 
         # 返回更新后的实例
         return instance
 
+
+
+
+# 考勤月报（汇总表的一行）
+class AbsentSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user_id = serializers.CharField(read_only=True)
+    realname = serializers.CharField(source='user.realname', read_only=True)
+    department_name = serializers.CharField(source='department.name', read_only=True, default=None)
+    absent_type_name = serializers.CharField(source='absent_type.name', read_only=True)
+    month = serializers.DateField(format='%Y-%m', read_only=True)
+
+    class Meta:
+        model = AbsentSummary
+        fields = ('user_id', 'realname', 'department_id', 'department_name', 'absent_type_id', 'absent_type_name', 'month',
+                  'auditing_count', 'auditing_days', 'auditing_workdays', 'pass_count', 'pass_days', 'pass_workdays',
+                  'reject_count', 'reject_days', 'reject_workdays')
+
+
+# 批量审批：一次UPDATE处理多条考勤
+class BulkDecideAbsentSerializer(serializers.Serializer):
+    # 每个考勤的处理结果
+    UPDATED = 'updated'      # 审批成功
+    NOT_FOUND = 'not_found'  # 考勤不存在
+    FORBIDDEN = 'forbidden'  # 不是该考勤的审批人
+    DECIDED = 'decided'      # 已经审批过了
+
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=1000, error_messages={"required": "请选择要审批的考勤！"})
+    status = serializers.ChoiceField(choices=[AbsentStatusChoices.PASS, AbsentStatusChoices.REJECT], error_messages={"invalid_choice": "审批状态错误！"})
+    response_content = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def decide(self):
+        """
+        只有当前用户是审批人、并且还在审核中的考勤才会被修改（条件都在同一个UPDATE的WHERE中）
+        返回 (成功数量, [{'id': 考勤id, 'result': 处理结果}, ...])
+        """
+        user = self.context['request'].user
+        ids = list(dict.fromkeys(self.validated_data['ids']))
+        status = self.validated_data['status']
+        response_content = self.validated_data['response_content']
+        conditions = {'id__in': ids, 'responder_id': user.uid, 'status': AbsentStatusChoices.AUDITING}
+
+        decided = decide_absents(conditions, user.uid, status, response_content)
+
+        # 没有修改的考勤，查一次原因
+        results = {absent.id: self.UPDATED for absent in decided}
+        rest = [pk for pk in ids if pk not in results]
+        if rest:
+            for pk, responder_id in Absent.objects.filter(id__in=rest).values_list('id', 'responder_id'):
+                results[pk] = self.FORBIDDEN if responder_id != user.uid else self.DECIDED
+        return len(decided), [{'id': pk, 'result': results.get(pk, self.NOT_FOUND)} for pk in ids]
+
+
+# 团队日历中的一条请假
+class AbsentCalendarSerializer(serializers.ModelSerializer):
+    requester_id = serializers.CharField(read_only=True)
+    realname = serializers.CharField(source='requester.realname', read_only=True)
+    department_id = serializers.IntegerField(source='requester.department_id', read_only=True)
+    absent_type_name = serializers.CharField(source='absent_type.name', read_only=True)
+
+    class Meta:
+        model = Absent
+        fields = ('id', 'requester_id', 'realname', 'department_id', 'absent_type_id', 'absent_type_name', 'start_date', 'end_date', 'status')
+
+
+# 节假日、调休上班日
+class HolidaySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Holiday
+        fields = "__all__"
@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver, Signal
+from app.home import events
+from app.oaauth.models import OAdepartment
+from utils import refdata
+from .models import Absent, AbsentType, Holiday
+from . import routing, summary, workdays
+
+OAUser = get_user_model()
+
+# 一批审核中的考勤被审批（通过/拒绝）后发送，每批只发送一次
+# 参数：absents（考勤对象列表，status已经是新状态）、status（新状态）
+# 发送：absents_decided.send(sender=Absent, absents=[...], status=AbsentStatusChoices.PASS)
+absents_decided = Signal()
+
+
+# 考勤创建：先记下计入汇总表的部门和工作日天数（和考勤一起INSERT），审批时按这些数据更新汇总表
+@receiver(pre_save, sender=Absent)
+def prepare_summary_on_absent_create(sender, instance, **kwargs):
+    if instance._state.adding:
+        summary.prepare([instance])
+
+
+# 考勤创建：计入汇总表
+@receiver(post_save, sender=Absent)
+def update_summary_on_absent_create(sender, instance, created, **kwargs):
+    if created:
+        summary.record_created([instance])
+
+
+# 考勤审批：汇总表中审核中-1，通过/拒绝+1
+@receiver(absents_decided, sender=Absent)
+def update_summary_on_absents_decided(sender, absents, status, **kwargs):
+    summary.record_decided(absents, status)
+
+
+# 考勤审批：事务提交后推送给发起人（见app/home/events.py）
+@receiver(absents_decided, sender=Absent)
+def publish_event_on_absents_decided(sender, absents, status, **kwargs):
+    events.absents_decided(absents, status)
+
+
+# 部门的leader/manager/名称变化：事务提交后更新这个部门的路由信息（回滚时缓存中不会留下没有保存的数据）
+# 路由信息在保存时取出，提交前instance再被修改也不影响
+@receiver(post_save, sender=OAdepartment)
+def update_routing_on_department_save(sender, instance, **kwargs):
+    department_id, value = instance.id, routing.department_route(instance)
+    transaction.on_commit(lambda: routing.update_department(department_id, value))
+
+
+# 部门删除时，员工的部门会被数据库直接置空（不会触发员工的signal），所以在删除前把这些员工的路由信息删掉
+@receiver(pre_delete, sender=OAdepartment)
+def forget_routing_on_department_delete(sender, instance, **kwargs):
+    routing.forget_users(list(instance.staffs.values_list('uid', flat=True)))
+    routing.forget_departments([instance.id])
+
+
+# 部门删除：汇总行的部门会被置空，先并入没有部门的汇总行
+@receiver(pre_delete, sender=OAdepartment)
+def merge_summary_on_department_delete(sender, instance, **kwargs):
+    summary.merge_department(instance.id)
+
+
+# 员工换部门：事务提交后更新员工 -> 部门；只更新了其他字段（比如last_login）就跳过
+@receiver(post_save, sender=OAUser)
+def update_routing_on_user_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'department', 'department_id'}.intersection(update_fields):
+        return
+    uid, department_id = instance.uid, instance.department_id
+    transaction.on_commit(lambda: routing.update_user(uid, department_id))
+
+
+# 员工删除：如果是某个部门的leader/manager，部门的leader/manager会被数据库直接置空，部门的路由信息也要删掉
+@receiver(pre_delete, sender=OAUser)
+def forget_routing_on_user_delete(sender, instance, **kwargs):
+    routing.forget_users([instance.uid])
+    routing.forget_departments(list(
+        OAdepartment.objects.filter(Q(leader_id=instance.uid) | Q(manager_id=instance.uid)).values_list('id', flat=True)
+    ))
+
+
+# 节假日修改：事务提交后让各进程的工作日日历重新加载
+@receiver(post_save, sender=Holiday)
+@receiver(post_delete, sender=Holiday)
+def invalidate_work_calendar(sender, **kwargs):
+    transaction.on_commit(workdays.invalidate)
+
+
+# 考勤类型变化：考勤类型列表缓存失效（见utils/refdata.py）
+refdata.watch(refdata.ABSENT_TYPES, AbsentType)
@@ -0,0 +1,202 @@
+#考勤汇总表（AbsentSummary）的增量维护
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  创建考勤（审核中/直接通过） → 对应状态 次数+1、天数+N              │
+# │  审批（通过/拒绝）           → 审核中 -1，通过/拒绝 +1              │
+# │  部门、每个月的工作日天数在考勤创建时记在考勤上（prepare），        │
+# │  审批时减掉的正好是创建时加上的，不受换部门、修改节假日影响         │
+# │  同一批的变化先在内存中按 (员工, 部门, 类型, 月份) 合并，           │
+# │  再对每一行执行一次 UPDATE ... SET x = x + N（F表达式，并发安全）   │
+# │  工作日天数按月切分后，整批一次numpy调用计算（见workdays.py）        │
+# │  rebuild() 从考勤表全量重新计算                                   │
+# └─────────────────────────────────────────────────────────────────┘
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Absent, AbsentStatusChoices, AbsentSummary
+from .routing import MISSING, load_user_departments
+from .workdays import count_workdays
+
+# 考勤状态 -> 汇总表字段前缀
+STATUS_FIELDS = {
+    AbsentStatusChoices.AUDITING: 'auditing',
+    AbsentStatusChoices.PASS: 'pass',
+    AbsentStatusChoices.REJECT: 'reject',
+}
+# 汇总表中的计数字段
+COUNTER_FIELDS = [f'{prefix}_{name}' for prefix in STATUS_FIELDS.values() for name in ('count', 'days', 'workdays')]
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def month_segments(start_date, end_date):
+    """按月切分时间段（包含开始和结束日期）：[(每月1号, 段开始, 段结束), ...]"""
+    segments = []
+    day = start_date
+    while day <= end_date:
+        month = month_of(day)
+        next_month = month_of(month + timedelta(days=32))
+        last = min(end_date, next_month - timedelta(days=1))
+        segments.append((month, day, last))
+        day = next_month
+    return segments
+
+
+def _to_date(value):
+    # 直接用字符串创建的考勤，日期字段还是字符串
+    return Absent._meta.get_field('start_date').to_python(value)
+
+
+def plan_segments(periods):
+    """
+    periods：[(开始日期, 结束日期), ...]
+    返回每个时间段按月切分的结果 [[(每月1号, 天数, 工作日天数), ...], ...]，所有月份的工作日一次计算
+    """
+    all_segments = [month_segments(_to_date(start_date), _to_date(end_date)) for start_date, end_date in periods]
+    flat = [segment for segments in all_segments for segment in segments]
+    workdays = iter(count_workdays([first for _, first, _ in flat], [last for _, _, last in flat]))
+    return [
+        [(month, (last - first).days + 1, next(workdays)) for month, first, last in segments]
+        for segments in all_segments
+    ]
+
+
+def recorded_segments(absents):
+    """
+    按考勤创建时计入汇总表的数据切分：[[(每月1号, 天数, 工作日天数), ...], ...]
+    天数由日期决定；工作日天数用创建时保存的summary_workdays，没有保存的（旧数据、bulk_create）按当前节假日计算
+    """
+    plans = {}
+    legacy = [absent for absent in absents if not absent.summary_workdays]
+    for absent, segments in zip(legacy, plan_segments([(absent.start_date, absent.end_date) for absent in legacy])):
+        plans[id(absent)] = segments
+    for absent in absents:
+        if id(absent) not in plans:
+            segments = month_segments(_to_date(absent.start_date), _to_date(absent.end_date))
+            plans[id(absent)] = [
+                (month, (last - first).days + 1, workdays)
+                for (month, first, last), workdays in zip(segments, absent.summary_workdays)
+            ]
+    return [plans[id(absent)] for absent in absents]
+
+
+def add_deltas(deltas, user_id, department_id, absent_type_id, segments, status, sign):
+    """把一条考勤（plan_segments的结果）在某个状态下的次数、天数、工作日天数（sign为+1或-1）累加到deltas中"""
+    prefix = STATUS_FIELDS[status]
+    for index, (month, days, workdays) in enumerate(segments):
+        changes = deltas[(user_id, department_id, absent_type_id, month)]
+        if index == 0:
+            changes[f'{prefix}_count'] += sign
+        changes[f'{prefix}_days'] += sign * days
+        changes[f'{prefix}_workdays'] += sign * workdays
+
+
+def apply_deltas(deltas):
+    """把合并后的变化写入汇总表，每一行一次UPDATE，行不存在时插入"""
+    with transaction.atomic():
+        for (user_id, department_id, absent_type_id, month), changes in deltas.items():
+            changes = {field: value for field, value in changes.items() if value}
+            if not changes:
+                continue
+            filters = {'user_id': user_id, 'department_id': department_id, 'absent_type_id': absent_type_id, 'month': month}
+            updates = {field: F(field) + value for field, value in changes.items()}
+            if AbsentSummary.objects.filter(**filters).update(**updates):
+                continue
+            try:
+                # 保存点：并发时另一个请求已经插入了这一行，唯一约束冲突后改为UPDATE
+                with transaction.atomic():
+                    AbsentSummary.objects.create(**filters, **changes)
+            except IntegrityError:
+                AbsentSummary.objects.filter(**filters).update(**updates)
+
+
+def prepare(absents):
+    """
+    考勤保存（INSERT）前调用：记下计入汇总表的部门（申请人当前所在的部门）和每个月的工作日天数
+    部门从审批路由表中取（缓存），不需要再查用户表
+    """
+    absents = list(absents)
+    departments = load_user_departments({absent.requester_id for absent in absents if absent.department_id is None})
+    plans = plan_segments([(absent.start_date, absent.end_date) for absent in absents])
+    for absent, segments in zip(absents, plans):
+        if absent.department_id is None and departments.get(absent.requester_id) != MISSING:
+            absent.department_id = departments.get(absent.requester_id)
+        absent.summary_workdays = [workdays for _, _, workdays in segments]
+
+
+def record_created(absents):
+    """考勤创建后调用：按创建时的状态计数"""
+    absents = list(absents)
+    deltas = defaultdict(lambda: defaultdict(int))
+    for absent, segments in zip(absents, recorded_segments(absents)):
+        add_deltas(deltas, absent.requester_id, absent.department_id, absent.absent_type_id, segments, absent.status, 1)
+    apply_deltas(deltas)
+
+
+def record_decided(absents, status):
+    """
+    一批审核中的考勤被审批为status（通过/拒绝）后调用
+    审核中减掉的是创建时加上的（考勤上记的部门和工作日天数），不是现在重新计算的
+    """
+    absents = list(absents)
+    deltas = defaultdict(lambda: defaultdict(int))
+    for absent, segments in zip(absents, recorded_segments(absents)):
+        args = (absent.requester_id, absent.department_id, absent.absent_type_id, segments)
+        add_deltas(deltas, *args, AbsentStatusChoices.AUDITING, -1)
+        add_deltas(deltas, *args, status, 1)
+    apply_deltas(deltas)
+
+
+def merge_department(department_id):
+    """
+    部门删除前调用：部门删除后汇总行的部门会被置空，先把这个部门的汇总行并入没有部门的汇总行，
+    否则会和已有的没有部门的汇总行冲突（唯一约束）
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    rows = list(AbsentSummary.objects.filter(department_id=department_id))
+    for row in rows:
+        changes = deltas[(row.user_id, None, row.absent_type_id, row.month)]
+        for field in COUNTER_FIELDS:
+            changes[field] += getattr(row, field)
+    with transaction.atomic():
+        AbsentSummary.objects.filter(id__in=[row.id for row in rows]).delete()
+        apply_deltas(deltas)
+
+
+def rebuild(chunk_size=2000):
+    """
+    从考勤表全量重建汇总表（部门按考勤上记的部门），返回汇总行数
+    工作日天数按当前的节假日重新计算，并更新到考勤上（summary_workdays），之后审批时减掉的和重建后的一致
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    rows = Absent.objects.values_list('id', 'requester_id', 'department_id', 'absent_type_id', 'start_date', 'end_date', 'status')
+    chunk = []
+
+    def flush():
+        plans = plan_segments([(start_date, end_date) for _, _, _, _, start_date, end_date, _ in chunk])
+        for (_, user_id, department_id, absent_type_id, _, _, status), segments in zip(chunk, plans):
+            add_deltas(deltas, user_id, department_id, absent_type_id, segments, status, 1)
+        Absent.objects.bulk_update([
+            Absent(id=absent_id, summary_workdays=[workdays for _, _, workdays in segments])
+            for (absent_id, *_), segments in zip(chunk, plans)
+        ], ['summary_workdays'], batch_size=1000)
+        chunk.clear()
+
+    with transaction.atomic():
+        # 每chunk_size条考勤一次numpy调用计算工作日
+        for row in rows.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+        summaries = [
+            AbsentSummary(user_id=user_id, department_id=department_id, absent_type_id=absent_type_id, month=month, **changes)
+            for (user_id, department_id, absent_type_id, month), changes in deltas.items()
+        ]
+        AbsentSummary.objects.all().delete()
+        AbsentSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
@@ -1,3 +1,502 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import exceptions
+from rest_framework.test import APIClient
+
+from app.home.badges import get_badges
+from app.oaauth.authentications import generate_jwt
+from app.oaauth.models import OAUser, OAdepartment, UserStatusChoices
+from app.oaauth.principals import principal_cache
+from . import routing
+from .serializer import AbsentSerializer
+from .models import Absent, AbsentStatusChoices, AbsentSummary, AbsentType, Holiday
+from .summary import rebuild as rebuild_summary
+from . import workdays
+from .workdays import count_workdays, get_calendar
+
+# 测试不依赖Redis：principal、审批路由表等缓存使用进程内缓存
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AbsentTestCase(TestCase):
+    """
+    董事会：雷冥（leader）
+    销售部：琥珀（leader，由雷冥分管）、小明（普通员工）
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.board = OAdepartment.objects.create(name='董事会', intro='董事会')
+        cls.sales = OAdepartment.objects.create(name='销售部', intro='销售部')
+        cls.leiming = cls.create_user('leiming@qq.com', '雷冥', cls.board)
+        cls.hupo = cls.create_user('hupo@qq.com', '琥珀', cls.sales)
+        cls.xiaoming = cls.create_user('xiaoming@qq.com', '小明', cls.sales)
+        cls.board.leader = cls.leiming
+        cls.board.save()
+        cls.sales.leader = cls.hupo
+        cls.sales.manager = cls.leiming
+        cls.sales.save()
+        cls.absent_type = AbsentType.objects.create(name='事假')
+
+    @staticmethod
+    def create_user(email, realname, department):
+        return OAUser.objects.create(email=email, realname=realname, department=department, status=UserStatusChoices.ACTIVED)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.local.clear()
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + generate_jwt(user))
+        return client
+
+    def create_absents(self, count):
+        # 直接写入数据库（不经过接口、不计入汇总表），小明发起、琥珀审批
+        start = date(2024, 1, 1)
+        return Absent.objects.bulk_create([
+            Absent(title=f'请假{index}', request_content='请假', absent_type=self.absent_type, requester=self.xiaoming,
+                   responder=self.hupo, start_date=start + timedelta(days=index * 3), end_date=start + timedelta(days=index * 3 + 1))
+            for index in range(count)
+        ])
+
+    def create_absent(self, user=None, **kwargs):
+        # 通过接口发起请假（默认小明），返回考勤id
+        data = {'title': '请假', 'request_content': '请假', 'absent_type_id': self.absent_type.pk,
+                'start_date': '2024-03-04', 'end_date': '2024-03-08', **kwargs}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(user or self.xiaoming).post('/api/absent/absent', data, format='json')
+        self.assertEqual(response.status_code, 201, response.json())
+        return response.json()['id']
+
+
+class ResponderTests(AbsentTestCase):
+
+    def test_responder(self):
+        self.assertEqual(self.client_for(self.xiaoming).get('/api/absent/responder').json()['uid'], self.hupo.uid)
+        self.assertEqual(self.client_for(self.hupo).get('/api/absent/responder').json()['uid'], self.leiming.uid)
+        self.assertIsNone(self.client_for(self.leiming).get('/api/absent/responder').json().get('uid'))
+
+    def test_responder_query_count(self):
+        # 登录用户、审批路由表、审批人都在缓存中之后，获取审批人不查询数据库
+        client = self.client_for(self.xiaoming)
+        client.get('/api/absent/responder')
+        with self.assertNumQueries(0):
+            response = client.get('/api/absent/responder')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_routing_entry(self):
+        # 路由表中的审批人已经不存在（例如删除时没有触发signals）：重新从数据库解析，而不是报错
+        client = self.client_for(self.xiaoming)
+        client.get('/api/absent/responder')
+        cache.set(routing.DEPARTMENT_KEY.format(id=self.sales.id), ('deleted-uid', self.leiming.uid, False))
+        with self.assertLogs('app.absent.routing', 'WARNING'):
+            response = client.get('/api/absent/responder')
+        self.assertEqual(response.json()['uid'], self.hupo.uid)
+        self.assertEqual(routing.load_departments([self.sales.id])[self.sales.id], (self.hupo.uid, self.leiming.uid, False))
+
+
+    def test_department_without_leader(self):
+        # 部门没有leader：交给分管该部门的董事；也没有分管董事：不能发起考勤，而不是直接通过
+        research = OAdepartment.objects.create(name='研发部', intro='研发部', manager=self.leiming)
+        xiaohong = self.create_user('xiaohong@qq.com', '小红', research)
+        client = self.client_for(xiaohong)
+        self.assertEqual(client.get('/api/absent/responder').json()['uid'], self.leiming.uid)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            research.manager = None
+            research.save()
+        response = client.get('/api/absent/responder')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], '所在部门还没有设置审批人，请联系管理员！')
+        response = client.post('/api/absent/absent', {'title': '请假', 'request_content': '请假', 'absent_type_id': self.absent_type.pk,
+                                                       'start_date': '2024-03-04', 'end_date': '2024-03-08'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['non_field_errors'], ['所在部门还没有设置审批人，请联系管理员！'])
+        self.assertFalse(Absent.objects.exists())
+
+    def test_deleted_leader(self):
+        # 部门leader被删除（数据库置空leader）：普通员工交给分管董事，不会直接通过
+        client = self.client_for(self.xiaoming)
+        client.get('/api/absent/responder')
+        self.hupo.delete()
+        absent_id = self.create_absent()
+        absent = Absent.objects.get(pk=absent_id)
+        self.assertEqual((absent.status, absent.responder_id), (AbsentStatusChoices.AUDITING, self.leiming.uid))
+
+    def test_routing_updated_on_commit(self):
+        # 事务回滚时，路由表中不会留下没有保存成功的部门
+        client = self.client_for(self.xiaoming)
+        client.get('/api/absent/responder')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.xiaoming.department = self.board
+                    self.xiaoming.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(cache.get(routing.USER_KEY.format(uid=self.xiaoming.uid)), self.sales.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sales.leader = self.xiaoming
+            self.sales.save()
+            self.assertEqual(cache.get(routing.DEPARTMENT_KEY.format(id=self.sales.id)), (self.hupo.uid, self.leiming.uid, False))
+        self.assertEqual(cache.get(routing.DEPARTMENT_KEY.format(id=self.sales.id)), (self.xiaoming.uid, self.leiming.uid, False))
+
+
+class AbsentQueryCountTests(AbsentTestCase):
+    # 登录用户、审批路由表缓存好之后，接口的查询次数固定，和每页的数量无关（没有N+1）
+
+    def setUp(self):
+        super().setUp()
+        self.xiaoming_client = self.client_for(self.xiaoming)
+        self.hupo_client = self.client_for(self.hupo)
+        # 先请求一次，把登录用户、审批路由表、工作日日历加载到缓存中
+        self.xiaoming_client.get('/api/absent/responder')
+        self.hupo_client.get('/api/absent/responder')
+        get_calendar()
+
+    def assert_list_queries(self, client, params, count, num):
+        with self.assertNumQueries(num):
+            response = client.get('/api/absent/absent', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), count)
+
+    def test_list(self):
+        # 每页1条和每页10条（默认每页数量）的查询次数相同：COUNT(*) + 一次JOIN查询
+        self.create_absents(1)
+        self.assert_list_queries(self.xiaoming_client, {}, 1, 2)
+        self.assert_list_queries(self.hupo_client, {'who': 'sub'}, 1, 2)
+        self.create_absents(14)
+        self.assert_list_queries(self.xiaoming_client, {}, 10, 2)
+        self.assert_list_queries(self.xiaoming_client, {'page': 2}, 5, 2)
+        self.assert_list_queries(self.hupo_client, {'who': 'sub'}, 10, 2)
+
+    def test_list_cursor(self):
+        # keyset分页：不计算总数时只有一次查询
+        self.create_absents(1)
+        self.assert_list_queries(self.xiaoming_client, {'cursor': ''}, 1, 2)
+        self.assert_list_queries(self.xiaoming_client, {'cursor': '', 'count': 0}, 1, 1)
+        self.create_absents(14)
+        self.assert_list_queries(self.xiaoming_client, {'cursor': ''}, 10, 2)
+        self.assert_list_queries(self.xiaoming_client, {'cursor': '', 'count': 0}, 10, 1)
+
+    def test_create(self):
+        data = {'title': '请假', 'request_content': '请假', 'absent_type_id': self.absent_type.pk,
+                'start_date': '2024-03-04', 'end_date': '2024-03-08'}
+        # 考勤类型 + 锁住申请人 + 重叠检查 + INSERT + 汇总表（UPDATE，没有这一行时再INSERT），都在视图的事务（savepoint）中
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(12):
+                response = self.xiaoming_client.post('/api/absent/absent', data, format='json')
+        self.assertEqual(response.status_code, 201, response.json())
+        self.assertEqual(response.json()['responder']['uid'], self.hupo.uid)
+        self.assertEqual(response.json()['workdays'], 5)
+
+        # 时间重叠的请假不能再申请
+        response = self.xiaoming_client.post('/api/absent/absent', dict(data, start_date='2024-03-08', end_date='2024-03-11'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['non_field_errors'], ['该时间段内已经有请假申请！'])
+        self.assertEqual(Absent.objects.count(), 1)
+
+    def test_update(self):
+        absent = self.create_absents(1)[0]
+        # 考勤（JOIN类型、申请人、审批人） + 锁住审核中的考勤 + 带条件的UPDATE + 汇总表，都在同一个事务（savepoint）中
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(11):
+                response = self.hupo_client.put(f'/api/absent/absent/{absent.pk}', {'status': AbsentStatusChoices.PASS, 'response_content': '同意'}, format='json')
+        self.assertEqual(response.status_code, 200, response.json())
+        self.assertEqual(Absent.objects.get(pk=absent.pk).status, AbsentStatusChoices.PASS)
+
+
+class SparseFieldsTests(AbsentTestCase):
+    # ?fields=&expand= 同时裁剪返回的字段和查询的列（见utils/serializers.py）
+
+    def setUp(self):
+        super().setUp()
+        self.xiaoming_client = self.client_for(self.xiaoming)
+        self.xiaoming_client.get('/api/absent/responder')
+        get_calendar()
+
+    def list(self, params, num=2):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.xiaoming_client.get('/api/absent/absent', params)
+        self.assertEqual(response.status_code, 200)
+        # COUNT(*) + 一次查询，延迟加载的字段没有产生N+1查询
+        self.assertEqual(len(queries), num, [query['sql'] for query in queries])
+        return response.json()['results'], queries[-1]['sql']
+
+    def test_fields(self):
+        self.create_absents(5)
+        results, sql = self.list({'fields': 'id,title'})
+        self.assertEqual(len(results), 5)
+        self.assertEqual(set(results[0]), {'id', 'title'})
+        self.assertNotIn('request_content', sql)
+        self.assertNotIn('oaauth_oauser', sql)
+
+        # 没有展开的嵌套对象只返回主键，不JOIN
+        results, sql = self.list({'fields': 'id,requester'})
+        self.assertEqual(results[0], {'id': results[0]['id'], 'requester': self.xiaoming.uid})
+        self.assertNotIn('oaauth_oauser', sql)
+
+    def test_nested_fields(self):
+        self.create_absents(5)
+        results, sql = self.list({'fields': 'id,requester.realname,requester.department.name'})
+        self.assertEqual(results[0]['requester'], {'realname': '小明', 'department': {'name': '销售部'}})
+        # select_related还在，只查询需要的列
+        self.assertIn('oaauth_oadepartment', sql)
+        self.assertIn('"oaauth_oauser"."realname"', sql)
+        self.assertNotIn('"oaauth_oauser"."email"', sql)
+        self.assertNotIn('"absent_absent"."title"', sql)
+
+    def test_expand(self):
+        self.create_absents(5)
+        results, sql = self.list({'fields': 'id,responder', 'expand': 'responder'})
+        self.assertEqual(results[0]['responder']['uid'], self.hupo.uid)
+        self.assertEqual(results[0]['responder']['department']['name'], '销售部')
+        self.assertNotIn('absent_absenttype', sql)
+
+    def test_method_field(self):
+        # SerializerMethodField不知道会用到哪些列，不使用only()，也不会产生额外查询
+        self.create_absents(5)
+        results, sql = self.list({'fields': 'id,workdays'})
+        self.assertEqual(set(results[0]), {'id', 'workdays'})
+        # 1月1~2日、4~5日、7~8日（周日、周一）、10~11日、13~14日（周末）
+        self.assertEqual(sorted(result['workdays'] for result in results), [0, 1, 2, 2, 2])
+
+
+class WorkCalendarTests(AbsentTestCase):
+    WEEK = ([date(2024, 3, 4)], [date(2024, 3, 10)])
+
+    def setUp(self):
+        super().setUp()
+        get_calendar()
+
+    def test_cached(self):
+        # 版本号不变时不查询节假日表
+        with self.assertNumQueries(0):
+            self.assertIs(get_calendar(), get_calendar())
+            self.assertEqual(count_workdays(*self.WEEK), [5])
+
+    def test_invalidate_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(date=date(2024, 3, 5), name='假期')
+        self.assertEqual(count_workdays(*self.WEEK), [4])
+        # 调休上班的周六计入工作日
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(date=date(2024, 3, 9), name='调休', is_workday=True)
+        self.assertEqual(count_workdays(*self.WEEK), [5])
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.filter(date=date(2024, 3, 5)).get().delete()
+        self.assertEqual(count_workdays(*self.WEEK), [6])
+
+    def test_rollback_keeps_calendar(self):
+        calendar = get_calendar()
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    Holiday.objects.create(date=date(2024, 3, 5), name='假期')
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(cache.get(workdays.VERSION_KEY))
+        self.assertIs(get_calendar(), calendar)
+        self.assertEqual(count_workdays(*self.WEEK), [5])
+
+    def test_other_process_invalidate(self):
+        # 其他进程修改节假日后递增版本号，本进程下次使用时重新加载一次
+        calendar = get_calendar()
+        Holiday.objects.create(date=date(2024, 3, 5), name='假期')
+        self.assertEqual(count_workdays(*self.WEEK), [5])
+        cache.set(workdays.VERSION_KEY, 1)
+        with self.assertNumQueries(1):
+            self.assertIsNot(get_calendar(), calendar)
+            self.assertEqual(count_workdays(*self.WEEK), [4])
+
+
+class AbsentSummaryTests(AbsentTestCase):
+
+    def test_decide_reverts_what_was_recorded(self):
+        # 创建后员工换了部门、修改了节假日，审批时从审核中减掉的还是创建时加上的
+        data = {'title': '请假', 'request_content': '请假', 'absent_type_id': self.absent_type.pk,
+                'start_date': '2024-03-04', 'end_date': '2024-03-08'}
+        with self.captureOnCommitCallbacks(execute=True):
+            absent_id = self.client_for(self.xiaoming).post('/api/absent/absent', data, format='json').json()['id']
+        self.assertEqual(Absent.objects.get(pk=absent_id).department_id, self.sales.id)
+
+        self.xiaoming.department = self.board
+        self.xiaoming.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Holiday.objects.create(date=date(2024, 3, 5), name='假期')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.hupo).put(f'/api/absent/absent/{absent_id}', {'status': AbsentStatusChoices.PASS, 'response_content': '同意'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        summary = AbsentSummary.objects.get()
+        self.assertEqual(summary.department_id, self.sales.id)
+        self.assertEqual((summary.auditing_count, summary.auditing_days, summary.auditing_workdays), (0, 0, 0))
+        self.assertEqual((summary.pass_count, summary.pass_days, summary.pass_workdays), (1, 5, 5))
+
+        # 重建后按新的节假日计算，考勤上记的工作日天数也一起更新
+        rebuild_summary()
+        self.assertEqual(AbsentSummary.objects.get().pass_workdays, 4)
+        self.assertEqual(Absent.objects.get(pk=absent_id).summary_workdays, [4])
+
+    def test_unique_without_department(self):
+        month = date(2024, 3, 1)
+        AbsentSummary.objects.create(user=self.xiaoming, department=None, absent_type=self.absent_type, month=month)
+        with self.assertRaises(IntegrityError):
+            AbsentSummary.objects.create(user=self.xiaoming, department=None, absent_type=self.absent_type, month=month)
+
+    def test_delete_department_merges_summaries(self):
+        month = date(2024, 3, 1)
+        AbsentSummary.objects.create(user=self.xiaoming, department=None, absent_type=self.absent_type, month=month, pass_count=1, pass_days=2)
+        AbsentSummary.objects.create(user=self.xiaoming, department=self.sales, absent_type=self.absent_type, month=month, pass_count=1, pass_days=3)
+        self.sales.delete()
+        summary = AbsentSummary.objects.get()
+        self.assertIsNone(summary.department_id)
+        self.assertEqual((summary.pass_count, summary.pass_days), (2, 5))
+
+
+class DecideTests(AbsentTestCase):
+
+    def decide(self, absent_id, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(self.hupo).put(f'/api/absent/absent/{absent_id}', {'status': status, 'response_content': '同意'}, format='json')
+
+    def test_status_must_be_pass_or_reject(self):
+        get_badges(self.hupo)
+        absent_id = self.create_absent()
+        for status in (AbsentStatusChoices.AUDITING, 9, None):
+            response = self.decide(absent_id, status)
+            self.assertEqual(response.status_code, 400)
+        response = self.client_for(self.hupo).put(f'/api/absent/absent/{absent_id}', {'response_content': '同意'}, format='json')
+        self.assertEqual(response.json()['status'], ['审批状态错误！'])
+        self.assertEqual(Absent.objects.get(pk=absent_id).status, AbsentStatusChoices.AUDITING)
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 1)
+        self.assertEqual(AbsentSummary.objects.get().auditing_count, 1)
+
+    def test_decide_once(self):
+        get_badges(self.hupo)
+        absent_id = self.create_absent()
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 1)
+        self.assertEqual(self.decide(absent_id, AbsentStatusChoices.PASS).status_code, 200)
+        # 重复提交：不再修改，汇总表和待审批数量也不变
+        response = self.decide(absent_id, AbsentStatusChoices.REJECT)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['detail'], '不能修改已经确定的请假数据！')
+        self.assertEqual(Absent.objects.get(pk=absent_id).status, AbsentStatusChoices.PASS)
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 0)
+        summary = AbsentSummary.objects.get()
+        self.assertEqual((summary.auditing_count, summary.pass_count, summary.reject_count), (0, 1, 0))
+
+    def test_concurrent_decide(self):
+        # 读出考勤之后、审批之前，已经被另一个请求审批了：读出来的instance还是审核中，UPDATE的条件不满足
+        get_badges(self.hupo)
+        absent_id = self.create_absent()
+        stale = Absent.objects.get(pk=absent_id)
+        self.assertEqual(self.decide(absent_id, AbsentStatusChoices.PASS).status_code, 200)
+
+        request = mock.Mock(user=self.hupo)
+        serializer = AbsentSerializer(stale, data={'status': AbsentStatusChoices.REJECT}, partial=True, context={'request': request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(exceptions.APIException):
+                serializer.save()
+        self.assertEqual(Absent.objects.get(pk=absent_id).status, AbsentStatusChoices.PASS)
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 0)
+        summary = AbsentSummary.objects.get()
+        self.assertEqual((summary.auditing_count, summary.pass_count, summary.reject_count), (0, 1, 0))
+
+    def test_not_responder(self):
+        absent_id = self.create_absent()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.leiming).put(f'/api/absent/absent/{absent_id}', {'status': AbsentStatusChoices.PASS}, format='json')
+        self.assertEqual(response.json()['detail'], '您无权处理该考勤！')
+        self.assertEqual(Absent.objects.get(pk=absent_id).status, AbsentStatusChoices.AUDITING)
+
+
+class ReportParamTests(AbsentTestCase):
+
+    def test_calendar(self):
+        absent_id = self.create_absent()
+        client = self.client_for(self.leiming)
+        params = {'start_date': '2024-03-01', 'end_date': '2024-03-31'}
+        response = client.get('/api/absent/calendar', dict(params, department_id=self.sales.id))
+        self.assertEqual([item['id'] for item in response.json()], [absent_id])
+        response = client.get('/api/absent/calendar', dict(params, user_ids=self.xiaoming.uid))
+        self.assertEqual([item['id'] for item in response.json()], [absent_id])
+
+        # 不是整数的部门id返回400，而不是500
+        response = client.get('/api/absent/calendar', dict(params, department_id='abc'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], 'department_id格式错误！')
+        response = client.get('/api/absent/calendar', dict(params, user_ids=','.join(str(index) for index in range(201))))
+        self.assertEqual(response.status_code, 400)
+
+    def test_summary(self):
+        self.create_absent()
+        client = self.client_for(self.leiming)
+        response = client.get('/api/absent/summary', {'department_id': self.sales.id, 'absent_type_id': self.absent_type.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['auditing_count'], 1)
+        for name in ('department_id', 'absent_type_id'):
+            response = client.get('/api/absent/summary', {name: '1.5'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['detail'], f'{name}格式错误！')
+
+
+class BulkDecideTests(AbsentTestCase):
+
+    def bulk(self, ids, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.hupo).post('/api/absent/absent/bulk', {'ids': ids, 'status': status}, format='json')
+        self.assertEqual(response.status_code, 200, response.json())
+        return response.json()
+
+    def test_bulk_decide(self):
+        get_badges(self.hupo)
+        ids = [self.create_absent(start_date=f'2024-03-{day:02d}', end_date=f'2024-03-{day + 1:02d}') for day in (4, 11, 18)]
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 3)
+
+        result = self.bulk(ids[:2] + [0], AbsentStatusChoices.PASS)
+        self.assertEqual(result['updated'], 2)
+        self.assertEqual([item['result'] for item in result['results']], ['updated', 'updated', 'not_found'])
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 1)
+
+        # 已经审批过的不会再改，也不会重复计数
+        result = self.bulk(ids, AbsentStatusChoices.REJECT)
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual([item['result'] for item in result['results']], ['decided', 'decided', 'updated'])
+        self.assertEqual(get_badges(self.hupo)['pending_absents'], 0)
+
+        summary = AbsentSummary.objects.get()
+        self.assertEqual((summary.auditing_count, summary.auditing_days), (0, 0))
+        self.assertEqual((summary.pass_count, summary.pass_days), (2, 4))
+        self.assertEqual((summary.reject_count, summary.reject_days), (1, 2))
+        self.assertEqual(list(Absent.objects.order_by('id').values_list('status', flat=True)),
+                         [AbsentStatusChoices.PASS, AbsentStatusChoices.PASS, AbsentStatusChoices.REJECT])
+
+        # 不是审批人
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.leiming).post('/api/absent/absent/bulk', {'ids': ids, 'status': AbsentStatusChoices.PASS}, format='json')
+        self.assertEqual(response.json()['updated'], 0)
+        self.assertEqual({item['result'] for item in response.json()['results']}, {'forbidden'})
+
+    def test_invalid_ids(self):
+        # ListField子元素的错误是 {下标: [错误]}，返回的还是一条错误信息
+        client = self.client_for(self.hupo)
+        response = client.post('/api/absent/absent/bulk', {'ids': [1, 'x'], 'status': AbsentStatusChoices.PASS}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], '请填写合法的整数值。')
+        response = client.post('/api/absent/absent/bulk', {'status': AbsentStatusChoices.PASS}, format='json')
+        self.assertEqual(response.json()['detail'], '请选择要审批的考勤！')
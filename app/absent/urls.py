@@ -43,11 +43,14 @@ app_name='absent'
 router=DefaultRouter(trailing_slash=False)#无尾部斜杠
 
 router.register('absent',views.AbsentViewSet,basename='absent')
+router.register('holiday',views.HolidayViewSet,basename='holiday') #节假日、调休上班日
 
 
 #router.urls 为路由对象生成的路由列表;生成的完整路由列表为：
 urlpatterns=[
     path('type',views.AbsentTypeView.as_view(),name='absenttype'),
-    path('responder',views.ResponderView.as_view(),name='getresponder') #as_view()将类转换为函数视图
+    path('responder',views.ResponderView.as_view(),name='getresponder'), #as_view()将类转换为函数视图
+    path('summary',views.AbsentSummaryView.as_view(),name='absent_summary'), #考勤月报（读汇总表）
+    path('calendar',views.AbsentCalendarView.as_view(),name='absent_calendar') #团队日历
 ]+router.urls
 
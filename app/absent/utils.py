@@ -1,23 +1,17 @@
+from django.db.models import Q
+
+
 def get_responder(request): # 获取审批人
-    user = request.user
-    # 如果当前用户是部门领导且是董事会成员，也就是董事会的头头，没有审批者；是部门领导但不是董事会主席，那么哪个部门提交申请就由负责哪个部门的董事会领导审批
-    if user.department.leader.uid == user.uid: #当前用户的uid等于外键引用的部门leader的uid
-        """
-         # 访问路径分解：
-         user.department.leader.uid == user.uid
+    # 审批人随访问范围（request.access_scope）解析，一个请求只解析一次，规则见routing.py：
+    # 没有部门、董事会的leader -> 没有审批人；其他部门的leader -> 分管该部门的董事（manager）；普通员工 -> 部门leader（没有leader时交给manager）
+    # 部门没有可以审批的人时抛出routing.ResponderUnassigned
+    # 审批人uid来自审批路由表（缓存），用户对象从principal缓存中获取（部门已经预先加载），缓存命中时不查询数据库
+    return request.access_scope.responder
+
 
-        # 分解步骤：
-        1. user → OAUser实例
-        2. user.department → 用户所在的部门 (OAdepartment实例)
-        3. user.department.leader → 该部门的领导 (OAUser实例)
-        4. user.department.leader.uid → 部门领导的uid (字符串)
-        5. user.uid → 当前用户的uid (字符串)
-        """
-        if user.department.name == '董事会':
-            responder = None  # 是董事会主席，没有审批者
-        else:
-            responder = user.department.manager  # 是部门领导但不是董事会主席，那么哪个部门提交申请就由负责哪个部门的董事会领导审批
-    # 如果不是部门leader
-    else:
-        responder = user.department.leader  # 审批者为部门leader
-    return responder
\ No newline at end of file
+def overlap_q(start_date, end_date, prefix=''):
+    """
+    和 [start_date, end_date] 有重叠的考勤：开始日期 <= end_date 并且 结束日期 >= start_date
+    可以走 (requester, end_date, start_date) 和 (end_date, start_date) 索引：在end_date上范围扫描，start_date在索引中过滤
+    """
+    return Q(**{f'{prefix}start_date__lte': end_date, f'{prefix}end_date__gte': start_date})
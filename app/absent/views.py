@@ -1,11 +1,21 @@
 from rest_framework import viewsets
 from rest_framework import mixins   #mixins翻译成中文是混入，组件的意思。在DRF中，针对获取列表，检索，创建等操作，都有相应的mixin
 from rest_framework.response import Response #响应对象
-from .models import Absent, AbsentType #导入模型
-from .serializer import AbsentSerializer,AbsentTypeSerializer #导入序列化器
+from .models import Absent, AbsentType, AbsentSummary, AbsentStatusChoices, Holiday #导入模型
+from .serializer import AbsentSerializer,AbsentTypeSerializer,AbsentSummarySerializer,BulkDecideAbsentSerializer,AbsentCalendarSerializer,HolidaySerializer #导入序列化器
+from rest_framework.decorators import action
+from rest_framework import status
+from rest_framework import generics
+from rest_framework import exceptions
+from datetime import datetime
 from rest_framework.views import APIView #API视图
-from .utils import get_responder #获取审批者
+from rest_framework.permissions import SAFE_METHODS
+from django.db import transaction
+from .utils import get_responder, overlap_q #获取审批者、时间段重叠条件
+from .routing import ResponderUnassigned #部门没有可以审批的人
 from app.oaauth.serializer import UserSerializer #用户序列化器
+from utils.serializers import SparseFieldsViewMixin, first_error #稀疏字段、第一条错误信息
+from utils import refdata #基础数据缓存 + ETag
 
 
 # # 视图集（ViewSet）是REST framework提供的一个概念，它将多个相关操作组合在一起，提供一种更简洁的方式来处理URL路由。
@@ -59,6 +69,7 @@ from app.oaauth.serializer import UserSerializer #用户序列化器
 
 
 class AbsentViewSet(
+    SparseFieldsViewMixin,   #支持 ?fields=&expand= 裁剪字段和查询
     mixins.CreateModelMixin, #创建
     mixins.UpdateModelMixin, #更新
     mixins.ListModelMixin,   #列表
@@ -70,6 +81,18 @@ class AbsentViewSet(
 
     serializer_class = AbsentSerializer # 告诉DRF使用哪个序列化器来转换数据
 
+    # keyset分页（?cursor=）的排序，id保证排序唯一
+    cursor_ordering = ('-create_time', '-id')
+
+    def get_queryset(self):
+        # 序列化时要用到考勤类型、申请人和审批人（以及他们的部门），一次JOIN查出来，避免每条数据再查4~6次（N+1）
+        return super().get_queryset().select_related('absent_type', 'requester__department', 'responder__department')
+
+    # 发起请假：重叠检查（AbsentSerializer.validate中锁住申请人）和创建在同一个事务中
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().create(request, *args, **kwargs)
+
     #重写update方法，这一段代码表示重写update方法，使得可以只修改部分数据
     def update(self, request, *args, **kwargs):
         #默认情况下，如果想修改某一条数据，那么要把这个数据的序列化中指定的字段都上传
@@ -77,6 +100,16 @@ class AbsentViewSet(
         kwargs['partial'] = True#告诉DRF只修改部分数据，将PUT请求转换为PATCH请求，支持部分更新
         return super().update(request, *args, **kwargs)#继续执行update方法
 
+    # 批量审批：POST /absent/absent/bulk  {"ids": [1, 2, 3], "status": 2, "response_content": "同意"}
+    # 返回每条考勤的处理结果：updated（成功）、not_found（不存在）、forbidden（不是审批人）、decided（已经审批过）
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_decide(self, request):
+        serializer = BulkDecideAbsentSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response({'detail': first_error(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+        updated, results = serializer.decide()
+        return Response({'updated': updated, 'results': results})
+
     # # 本项目的业务场景：审批请假
     # # 审批时只需要修改状态字段，不需要提交全部字段
     # # 不重写的情况：
@@ -94,7 +127,7 @@ class AbsentViewSet(
 
     #重写list方法，这一段代码表示重写list方法，使得可以按who参数查询下属或自己的考勤
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()#获取所有考勤数据，和queryset = Absent.objects.all()等价
+        queryset = self.filter_queryset(self.get_queryset())#获取所有考勤数据，和queryset = Absent.objects.all()等价（filter_queryset会根据?fields=裁剪查询）
         who=request.query_params.get('who') #获取who参数，用于查询下属或自己的考勤 # query_params是Django REST Framework对Django request.GET的封装
         # get()方法安全地获取参数，如果参数不存在则返回None
         if who and who=='sub':#检查who参数是否存在且值是否为'sub'
@@ -156,18 +189,133 @@ class AbsentViewSet(
     # 返回考勤类型列表
 class AbsentTypeView(APIView):
     def get(self,request):
-        queryset=AbsentType.objects.all() # 获取所有考勤类型数据
-        serializer=AbsentTypeSerializer(queryset,many=True) # 序列化所有考勤类型数据，many=True表示要序列化的是查询集（多个对象），而不是单个对象
-        return Response(data=serializer.data) # 返回序列化后的数据
+        def build():
+            queryset=AbsentType.objects.all() # 获取所有考勤类型数据
+            serializer=AbsentTypeSerializer(queryset,many=True) # 序列化所有考勤类型数据，many=True表示要序列化的是查询集（多个对象），而不是单个对象
+            return list(serializer.data)
+        # 序列化后的数据缓存起来，带ETag返回；客户端带If-None-Match并且考勤类型没有变化时返回304（见utils/refdata.py）
+        return refdata.cached_response(request, refdata.ABSENT_TYPES, build, params=())
 
 #显示审批者
 class ResponderView(APIView):
     def get(self,request):
-        responder=get_responder(request)
+        try:
+            responder=get_responder(request)
+        except ResponderUnassigned:
+            return Response({'detail': '所在部门还没有设置审批人，请联系管理员！'}, status=status.HTTP_400_BAD_REQUEST)
         #Serializer:如果序列化的对象是一个None，那么不会报错，而是返回一个包含除了主键之外的所有字段的空字典
         serializer=UserSerializer(responder)
         return Response(data=serializer.data)
 
 
+# 查询参数中的整数id：没有传返回None，不是整数时返回400（而不是传给ORM抛出ValueError变成500）
+def parse_id(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise exceptions.ParseError(f'{name}格式错误！')
+
+
+#考勤月报：只读汇总表（AbsentSummary），不扫描考勤表
+# /absent/summary?start_month=2024-01&end_month=2024-06&department_id=2&user_id=xxx
+# 董事会可以看所有部门，部门leader只能看本部门，普通员工只能看自己
+class AbsentSummaryView(generics.ListAPIView):
+    serializer_class = AbsentSummarySerializer
+
+    @staticmethod
+    def parse_month(value):
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError('月份格式错误，应为YYYY-MM！')
+
+    def get_queryset(self):
+        params = self.request.query_params
+        scope = self.request.access_scope
+        queryset = AbsentSummary.objects.select_related('user', 'department', 'absent_type')
+        department_id = parse_id(params, 'department_id')
+        absent_type_id = parse_id(params, 'absent_type_id')
+        if scope.is_board:
+            if department_id:
+                queryset = queryset.filter(department_id=department_id)
+        elif scope.is_leader:
+            queryset = queryset.filter(department_id=scope.department_id)
+        else:
+            queryset = queryset.filter(user_id=scope.user_id)
+        if params.get('user_id'):
+            queryset = queryset.filter(user_id=params['user_id'])
+        if params.get('month'):
+            queryset = queryset.filter(month=self.parse_month(params['month']))
+        if params.get('start_month'):
+            queryset = queryset.filter(month__gte=self.parse_month(params['start_month']))
+        if params.get('end_month'):
+            queryset = queryset.filter(month__lte=self.parse_month(params['end_month']))
+        if absent_type_id:
+            queryset = queryset.filter(absent_type_id=absent_type_id)
+        return queryset.order_by('-month', 'department_id', 'user_id', 'absent_type_id')
+
+
+#团队日历：某个时间段内，部门（或指定员工）已通过和审核中的请假
+# /absent/calendar?start_date=2024-01-01&end_date=2024-01-31&department_id=2&user_ids=uid1,uid2
+# 董事会可以查看任意部门，其他人只能查看本部门
+class AbsentCalendarView(APIView):
+    # 一次最多查询的天数
+    max_days = 366
+    # 一次最多指定的员工数量
+    max_users = 200
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            start_date = datetime.strptime(params.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(params.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'detail': '日期格式错误，应为YYYY-MM-DD！'}, status=status.HTTP_400_BAD_REQUEST)
+        if start_date > end_date or (end_date - start_date).days >= self.max_days:
+            return Response({'detail': f'日期范围错误，最多查询{self.max_days}天！'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = request.access_scope
+        if not scope.is_board and scope.department_id is None:
+            return Response([])
+        department_id = parse_id(params, 'department_id') if scope.is_board else scope.department_id
+        user_ids = [uid for uid in params.get('user_ids', '').split(',') if uid]
+        if len(user_ids) > self.max_users:
+            return Response({'detail': f'最多指定{self.max_users}个员工！'}, status=status.HTTP_400_BAD_REQUEST)
+        if not department_id and not user_ids:
+            return Response({'detail': '请指定部门或员工！'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Absent.objects.filter(
+            overlap_q(start_date, end_date),
+            status__in=[AbsentStatusChoices.AUDITING, AbsentStatusChoices.PASS],
+        )
+        if department_id:
+            queryset = queryset.filter(requester__department_id=department_id)
+        if user_ids:
+            queryset = queryset.filter(requester_id__in=user_ids)
+        queryset = queryset.select_related('requester', 'absent_type').order_by('start_date', 'id')
+        return Response(AbsentCalendarSerializer(queryset, many=True).data)
+
+
+#节假日、调休上班日：所有人可以查看，只有董事会可以修改
+# /absent/holiday?year=2024
+# 修改后工作日日历自动重新加载（见signals.py），考勤汇总表中的工作日天数需要执行 rebuildabsentsummary
+class HolidayViewSet(viewsets.ModelViewSet):
+    serializer_class = HolidaySerializer
+    pagination_class = None # 一年只有几十条，不分页
 
+    def check_permissions(self, request):
+        super().check_permissions(request)
+        if request.method not in SAFE_METHODS and not request.access_scope.is_board:
+            self.permission_denied(request, message='您没有权限修改节假日！')
 
+    def get_queryset(self):
+        queryset = Holiday.objects.all()
+        year = self.request.query_params.get('year')
+        if year:
+            if not year.isdigit():
+                raise exceptions.ValidationError('年份格式错误！')
+            queryset = queryset.filter(date__year=int(year))
+        return queryset
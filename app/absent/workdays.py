@@ -0,0 +1,92 @@
+#工作日计算：节假日表加载一次，转成NumPy的工作日日历，一次调用计算一批请假的工作日天数
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  工作日 = numpy.busday_count(开始, 结束+1, 周一~周五, 节假日)     │
+# │         + 这段时间内调休上班的周末天数                            │
+# │  一页考勤、整个汇总表都是一次向量化调用，和行数无关                 │
+# │  节假日修改后递增缓存中的版本号，各进程下次使用时重新加载            │
+# └─────────────────────────────────────────────────────────────────┘
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Holiday
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'workcalendar:version'
+
+
+class WorkCalendar:
+    def __init__(self, holidays, makeup_workdays, weekmask):
+        self.weekmask = weekmask
+        self.busdaycalendar = np.busdaycalendar(weekmask=weekmask, holidays=np.array(sorted(holidays), dtype='datetime64[D]'))
+        # 调休上班日只统计本来不上班的日子（周末），否则会和busday_count重复计算
+        makeup = np.array(sorted(makeup_workdays), dtype='datetime64[D]')
+        self.makeup = makeup[~np.is_busday(makeup, weekmask=weekmask)] if len(makeup) else makeup
+
+    @classmethod
+    def load(cls):
+        holidays, makeup = [], []
+        for date, is_workday in Holiday.objects.values_list('date', 'is_workday'):
+            (makeup if is_workday else holidays).append(date)
+        return cls(holidays, makeup, getattr(settings, 'WORK_WEEKMASK', '1111100'))
+
+    def count(self, start_dates, end_dates):
+        """
+        start_dates、end_dates：日期列表（或numpy数组），一一对应，包含开始和结束日期
+        返回每一段的工作日天数（numpy int数组）
+        """
+        starts = np.asarray(start_dates, dtype='datetime64[D]')
+        ends = np.asarray(end_dates, dtype='datetime64[D]') + np.timedelta64(1, 'D')
+        counts = np.busday_count(starts, ends, busdaycal=self.busdaycalendar)
+        if len(self.makeup):
+            # 每一段时间内调休上班的天数：在有序数组中二分查找
+            counts = counts + np.searchsorted(self.makeup, ends) - np.searchsorted(self.makeup, starts)
+        return np.maximum(counts, 0)
+
+    def count_one(self, start_date, end_date):
+        return int(self.count([start_date], [end_date])[0])
+
+
+_lock = threading.Lock()
+_calendar = None
+_version = None
+
+
+def get_calendar():
+    """当前进程的工作日日历，节假日版本号变化后重新加载"""
+    global _calendar, _version
+    try:
+        version = cache.get(VERSION_KEY, 0)
+    except Exception as e:
+        # 缓存不可用时继续使用已经加载的日历
+        logger.warning('work calendar cache unavailable: %s', e)
+        version = _version
+    with _lock:
+        if _calendar is None or version != _version:
+            _calendar = WorkCalendar.load()
+            _version = version
+        return _calendar
+
+
+def invalidate():
+    """节假日修改后调用"""
+    global _calendar
+    try:
+        if not cache.add(VERSION_KEY, 1, timeout=None):
+            cache.incr(VERSION_KEY)
+    except Exception as e:
+        logger.warning('work calendar cache unavailable: %s', e)
+    with _lock:
+        _calendar = None
+
+
+def count_workdays(start_dates, end_dates):
+    """批量计算工作日天数，返回int列表"""
+    if not len(start_dates):
+        return []
+    return get_calendar().count(start_dates, end_dates).tolist()
+
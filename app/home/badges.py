@@ -0,0 +1,250 @@
+#首页角标计数：待我审批的考勤数量、未读通知数量，保存在缓存中，数据变化时原子地加减
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  badge:pending:{uid}          -> 待uid审批的考勤数量              │
+# │  badge:inform:public          -> 公开通知数量                     │
+# │  badge:inform:dept:{id}       -> 发给部门id的（非公开）通知数量     │
+# │  badge:read:{uid}:{dept_id}   -> uid在dept_id部门时读过的、         │
+# │                                  公开或发给该部门的通知数量         │
+# │                                                                 │
+# │  未读通知 = 公开 + 本部门 - 已读（员工换部门后使用新的已读key）      │
+# │  加减：事务提交后cache.incr，key不存在就跳过，下次读取时COUNT一次    │
+# │  定时任务 reconcile() 全量重新计算，和缓存不一致的key删除，          │
+# │  下次读取时重新COUNT（不覆盖写入，不会冲掉并发的加减）               │
+# └─────────────────────────────────────────────────────────────────┘
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from app.absent.models import Absent, AbsentStatusChoices
+from app.absent.routing import MISSING, load_user_departments
+from app.inform.models import Inform, InformRead
+from app.oaauth.models import OAdepartment
+
+logger = logging.getLogger(__name__)
+
+OAUser = get_user_model()
+
+PENDING_KEY = 'badge:pending:{uid}'
+INFORM_PUBLIC_KEY = 'badge:inform:public'
+INFORM_DEPARTMENT_KEY = 'badge:inform:dept:{id}'
+READ_KEY = 'badge:read:{uid}:{department_id}'
+
+
+def get_timeout():
+    return getattr(settings, 'BADGE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def read_key(uid, department_id):
+    return READ_KEY.format(uid=uid, department_id=department_id or 0)
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # key不存在（过期或从未读取过），下次读取时重新COUNT
+        pass
+    except Exception as e:
+        logger.warning('badge cache unavailable: %s', e)
+
+
+def _incr_on_commit(keys, delta):
+    """事务提交后再加减，回滚的数据不会计入"""
+    keys = [key for key in keys if key]
+    if keys and delta:
+        transaction.on_commit(lambda: [_incr(key, delta) for key in keys])
+
+
+def _delete_on_commit(keys):
+    def delete():
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning('badge cache unavailable: %s', e)
+    if keys:
+        transaction.on_commit(delete)
+
+
+# ---------------------------------- 数据变化时调用 ----------------------------------
+
+def absent_created(absent):
+    """发起考勤：审核中的考勤，审批人待审批数量+1"""
+    if absent.status == AbsentStatusChoices.AUDITING and absent.responder_id:
+        _incr_on_commit([PENDING_KEY.format(uid=absent.responder_id)], 1)
+
+
+def absents_decided(responder_id, count):
+    """审批了count条考勤：审批人待审批数量-count"""
+    if responder_id and count:
+        _incr_on_commit([PENDING_KEY.format(uid=responder_id)], -count)
+
+
+def inform_created(inform, department_ids=()):
+    """发布通知：公开通知数量+1，或者每个接收部门的通知数量+1"""
+    if inform.public:
+        _incr_on_commit([INFORM_PUBLIC_KEY], 1)
+    else:
+        _incr_on_commit([INFORM_DEPARTMENT_KEY.format(id=department_id) for department_id in department_ids], 1)
+
+
+def inform_deleted(inform):
+    """删除通知：在通知删除之前调用"""
+    if inform.public:
+        _incr_on_commit([INFORM_PUBLIC_KEY], -1)
+    else:
+        _incr_on_commit([INFORM_DEPARTMENT_KEY.format(id=department_id)
+                         for department_id in inform.departments.values_list('id', flat=True)], -1)
+    # 读过这条通知的员工，已读数量下次读取时重新计算
+    _delete_on_commit([
+        read_key(uid, department_id)
+        for uid, department_id in InformRead.objects.filter(inform=inform).values_list('user_id', 'user__department_id')
+    ])
+
+
+def informs_read(receipts):
+    """
+    一批新写入的已读记录 [(inform_id, uid), ...]：公开或发给读者所在部门的通知，读者的已读数量+1
+    读者的部门从审批路由表缓存中取，通知的可见部门一次查询
+    """
+    receipts = list(receipts)
+    if not receipts:
+        return
+    inform_ids = {inform_id for inform_id, _ in receipts}
+    departments = load_user_departments({uid for _, uid in receipts})
+    public = set(Inform.objects.filter(id__in=inform_ids, public=True).values_list('id', flat=True))
+    targets = set(Inform.departments.through.objects.filter(inform_id__in=inform_ids).values_list('inform_id', 'oadepartment_id'))
+    deltas = Counter()
+    for inform_id, uid in receipts:
+        department_id = departments.get(uid)
+        department_id = None if department_id == MISSING else department_id
+        if inform_id in public or (inform_id, department_id) in targets:
+            deltas[read_key(uid, department_id)] += 1
+    for key, delta in deltas.items():
+        _incr_on_commit([key], delta)
+
+
+# ---------------------------------- 读取 ----------------------------------
+
+def _count_pending(uid):
+    return Absent.objects.filter(responder_id=uid, status=AbsentStatusChoices.AUDITING).count()
+
+
+def _count_public():
+    return Inform.objects.filter(public=True).count()
+
+
+def _count_department(department_id):
+    return Inform.objects.filter(public=False, departments=department_id).count() if department_id else 0
+
+
+def _visible_reads(queryset, department_field):
+    # 公开的，或者发给读者当时所在部门的通知
+    return queryset.filter(Q(inform__public=True) | Q(inform__departments=department_field))
+
+
+def _count_read(uid, department_id):
+    queryset = InformRead.objects.filter(user_id=uid)
+    if department_id:
+        queryset = _visible_reads(queryset, department_id)
+    else:
+        queryset = queryset.filter(inform__public=True)
+    return queryset.values('inform_id').distinct().count()
+
+
+def get_badges(user):
+    """
+    当前用户的角标：{'pending_absents': 待审批考勤数量, 'unread_informs': 未读通知数量}
+    一次get_many，缓存都命中时不查询数据库
+    """
+    keys = {
+        'pending': PENDING_KEY.format(uid=user.uid),
+        'public': INFORM_PUBLIC_KEY,
+        'department': INFORM_DEPARTMENT_KEY.format(id=user.department_id or 0),
+        'read': read_key(user.uid, user.department_id),
+    }
+    counters = {
+        'pending': lambda: _count_pending(user.uid),
+        'public': _count_public,
+        'department': lambda: _count_department(user.department_id),
+        'read': lambda: _count_read(user.uid, user.department_id),
+    }
+    try:
+        cached = cache.get_many(keys.values())
+    except Exception as e:
+        logger.warning('badge cache unavailable: %s', e)
+        cached = None
+    values = {}
+    for name, key in keys.items():
+        if cached is not None and key in cached:
+            # 计数出现偏差时不返回负数，reconcile()会修正
+            values[name] = max(cached[key], 0)
+            continue
+        values[name] = counters[name]()
+        if cached is not None:
+            # add：并发时以先写入的为准，不覆盖其他请求已经加减过的值
+            try:
+                cache.add(key, values[name], get_timeout())
+            except Exception as e:
+                logger.warning('badge cache unavailable: %s', e)
+    return {
+        'pending_absents': values['pending'],
+        'unread_informs': max(values['public'] + values['department'] - values['read'], 0),
+    }
+
+
+# ---------------------------------- 对账 ----------------------------------
+
+def _delete_stale(expected):
+    """
+    和缓存中的值比较，不一致的key删除（下次读取时重新COUNT），返回删除的数量
+    不用set覆盖：COUNT之后其他请求可能已经加减过，覆盖会冲掉这些加减；删除之后重新COUNT总是正确的
+    缓存中没有的key跳过，读取时本来就会COUNT
+    """
+    cached = cache.get_many(expected.keys())
+    stale = [key for key, value in cached.items() if value != expected[key]]
+    if stale:
+        cache.delete_many(stale)
+    return len(stale)
+
+
+def reconcile(chunk_size=2000):
+    """全量重新计算所有计数并和缓存比较（定时任务），返回删除的（不一致的）key数量"""
+    pending = dict(
+        Absent.objects.filter(status=AbsentStatusChoices.AUDITING).values('responder_id')
+        .annotate(count=Count('id')).values_list('responder_id', 'count')
+    )
+    departments = dict(
+        Inform.objects.filter(public=False).values('departments')
+        .annotate(count=Count('id')).values_list('departments', 'count')
+    )
+    reads = dict(
+        _visible_reads(InformRead.objects.filter(user__department__isnull=False), F('user__department'))
+        .values('user_id').annotate(count=Count('inform_id', distinct=True)).values_list('user_id', 'count')
+    )
+    reads_without_department = dict(
+        InformRead.objects.filter(user__department__isnull=True, inform__public=True)
+        .values('user_id').annotate(count=Count('inform_id', distinct=True)).values_list('user_id', 'count')
+    )
+    reads.update(reads_without_department)
+
+    expected = {INFORM_PUBLIC_KEY: _count_public()}
+    expected.update({
+        INFORM_DEPARTMENT_KEY.format(id=department_id): departments.get(department_id, 0)
+        for department_id in OAdepartment.objects.values_list('id', flat=True)
+    })
+    count = 0
+    # 没有待审批、没有已读的员工应该是0，缓存中的值不是0也要修正
+    for uid, department_id in OAUser.objects.values_list('uid', 'department_id').iterator(chunk_size=chunk_size):
+        expected[PENDING_KEY.format(uid=uid)] = pending.get(uid, 0)
+        expected[read_key(uid, department_id)] = reads.get(uid, 0)
+        if len(expected) >= chunk_size:
+            count += _delete_stale(expected)
+            expected = {}
+    if expected:
+        count += _delete_stale(expected)
+    return count
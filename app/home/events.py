@@ -0,0 +1,290 @@
+#服务端推送事件流（SSE）：新通知、考勤审批结果，前端不再需要定时轮询最新通知和考勤列表
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  GET /api/home/events（只在ASGI下提供，见OA_back/asgi.py）         │
+# │      JWT：Authorization: JWT xxx，或者 ?token=xxx（EventSource    │
+# │      不能设置请求头）                                             │
+# │                                                                 │
+# │  频道和通知可见范围表相同（见app/inform/visibility.py）：           │
+# │      'd{部门id}'（没有部门为'p'）+ 'u{uid}'                        │
+# │  发布：通知发布 -> 通知的每个audience；考勤审批 -> 'u{发起人uid}'    │
+# │        事务提交后发布，只序列化一次（发布的就是SSE帧）               │
+# │  Redis：PUBLISH events:{audience}；每个进程一个PSUBSCRIBE连接，      │
+# │        收到后分发给本进程中订阅了这个频道的连接                     │
+# │  缓存不是Redis时（开发环境）直接在进程内分发                        │
+# └─────────────────────────────────────────────────────────────────┘
+import asyncio
+import json
+import logging
+import threading
+from urllib.parse import parse_qs
+
+import jwt
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+
+from app.inform.visibility import user_audience, viewer_audiences
+from app.oaauth.principals import principal_cache
+
+logger = logging.getLogger(__name__)
+
+OAUser = get_user_model()
+
+EVENTS_PATH = '/api/home/events'
+CHANNEL = 'events:{audience}'
+
+# 事件类型
+INFORM_CREATED = 'inform.created'
+ABSENT_DECIDED = 'absent.decided'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _redis():
+    """缓存后端是Redis时返回redis客户端，否则返回None（进程内分发）"""
+    if isinstance(cache, RedisCache):
+        return cache._cache.get_client(write=True)
+    return None
+
+
+def _channel(audience):
+    return cache.make_and_validate_key(CHANNEL.format(audience=audience))
+
+
+def _frame(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n'
+
+
+# ---------------------------------- 进程内分发 ----------------------------------
+
+class Subscription:
+    """一个事件流连接：订阅若干audience，收到的SSE帧放入队列"""
+
+    def __init__(self, audiences):
+        self.audiences = list(dict.fromkeys(audiences))
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=_setting('EVENTS_QUEUE_SIZE', 100))
+
+    def offer(self, frame):
+        # 客户端太慢，队列满了就丢弃，客户端重连后重新拉取列表
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            logger.warning('event queue full, dropped: %s', self.audiences)
+
+    def __enter__(self):
+        with _lock:
+            for audience in self.audiences:
+                _subscribers.setdefault(audience, set()).add(self)
+        return self
+
+    def __exit__(self, *args):
+        with _lock:
+            for audience in self.audiences:
+                subscribers = _subscribers.get(audience)
+                if subscribers is not None:
+                    subscribers.discard(self)
+                    if not subscribers:
+                        del _subscribers[audience]
+
+
+_subscribers = {}  # audience -> {Subscription}
+_lock = threading.Lock()
+
+
+def _dispatch(audience, frame):
+    """把一帧分发给本进程中订阅了audience的连接，可以在任意线程中调用"""
+    with _lock:
+        subscribers = list(_subscribers.get(audience, ()))
+    for subscription in subscribers:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.offer, frame)
+        except RuntimeError:
+            # 事件循环已经关闭
+            pass
+
+
+# ---------------------------------- Redis订阅 ----------------------------------
+
+_listener = None
+
+
+def _redis_url():
+    location = settings.CACHES['default']['LOCATION']
+    if isinstance(location, str):
+        location = location.split(',')
+    return location[0]
+
+
+async def _listen():
+    """每个进程一个PSUBSCRIBE连接，断开后重连"""
+    import redis.asyncio as aioredis
+    prefix = _channel('')
+    while True:
+        client = aioredis.Redis.from_url(_redis_url())
+        try:
+            pubsub = client.pubsub()
+            await pubsub.psubscribe(prefix + '*')
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                audience = message['channel'].decode()[len(prefix):]
+                _dispatch(audience, message['data'].decode())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning('event listener disconnected: %s', e)
+        finally:
+            await client.aclose()
+        await asyncio.sleep(1)
+
+
+def _ensure_listener():
+    global _listener
+    if _redis() is None:
+        return
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(_listen())
+
+
+# ---------------------------------- 发布 ----------------------------------
+
+def publish(audiences, event_type, data):
+    """事务提交后把事件发布给audiences"""
+    frame = _frame(event_type, data)
+    audiences = list(dict.fromkeys(audiences))
+
+    def send():
+        client = _redis()
+        try:
+            if client is None:
+                for audience in audiences:
+                    _dispatch(audience, frame)
+            else:
+                pipeline = client.pipeline(transaction=False)
+                for audience in audiences:
+                    pipeline.publish(_channel(audience), frame)
+                pipeline.execute()
+        except Exception as e:
+            logger.warning('event publish failed: %s', e)
+
+    if audiences:
+        transaction.on_commit(send)
+
+
+def inform_created(inform, audiences):
+    """发布通知：audiences是visibility.fan_out()返回的可见范围"""
+    publish(audiences, INFORM_CREATED, {
+        'id': inform.id,
+        'title': inform.title,
+        'excerpt': inform.excerpt,
+        'create_time': inform.create_time,
+        'public': inform.public,
+        'author_id': inform.author_id,
+        'author_name': inform.author.realname,
+    })
+
+
+def absents_decided(absents, status):
+    """一批考勤被审批：通知每个发起人"""
+    for absent in absents:
+        publish([user_audience(absent.requester_id)], ABSENT_DECIDED, {
+            'id': absent.id,
+            'title': absent.title,
+            'status': status,
+            'response_content': absent.response_content,
+            'responder_id': absent.responder_id,
+        })
+
+
+# ---------------------------------- 事件流 ----------------------------------
+
+def _token(scope):
+    headers = dict(scope.get('headers', ()))
+    auth = headers.get(b'authorization', b'').split()
+    if len(auth) == 2 and auth[0].lower() == b'jwt':
+        return auth[1].decode()
+    return parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+
+
+def _connect(scope):
+    """JWT认证，返回 (用户, 订阅的audience列表)，认证失败返回 (None, None)"""
+    close_old_connections()
+    try:
+        token = _token(scope)
+        if not token:
+            return None, None
+        try:
+            userid = jwt.decode(token, settings.SECRET_KEY, algorithms="HS256").get('userid')
+            user = principal_cache.get(userid)
+        except (jwt.PyJWTError, OAUser.DoesNotExist):
+            # token无效、过期，或者用户已经被删除；数据库等其他错误不当作认证失败，直接抛出
+            return None, None
+        if user is None:
+            return None, None
+        # 自己的频道总是订阅（考勤审批结果）
+        return user, viewer_audiences(user) + [user_audience(user.uid)]
+    finally:
+        close_old_connections()
+
+
+async def _forbidden(send):
+    body = json.dumps({'message': '请先登录！'}, ensure_ascii=False).encode()
+    await send({'type': 'http.response.start', 'status': 403, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def stream(scope, receive, send):
+    """
+    ASGI应用：SSE事件流
+    每隔EVENTS_HEARTBEAT秒发送一次注释帧保持连接；连接超过EVENTS_MAX_AGE秒后结束，
+    客户端（EventSource）自动重连时重新认证、重新计算订阅范围（例如换了部门）
+    """
+    user, audiences = await sync_to_async(_connect)(scope)
+    if user is None:
+        await _forbidden(send)
+        return
+    headers = [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),  # nginx不要缓冲
+    ]
+    if _setting('CORS_ALLOW_ALL_ORIGINS', False):
+        headers.append((b'access-control-allow-origin', b'*'))
+    heartbeat = _setting('EVENTS_HEARTBEAT', 15)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _setting('EVENTS_MAX_AGE', 60 * 30)
+    with Subscription(audiences) as subscription:
+        _ensure_listener()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while not disconnected.done() and loop.time() < deadline:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    frame = ': ping\n\n'
+                await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+        finally:
+            gone = disconnected.done()
+            disconnected.cancel()
+    if not gone:
+        # 超过EVENTS_MAX_AGE，正常结束响应
+        await send({'type': 'http.response.body', 'body': b''})
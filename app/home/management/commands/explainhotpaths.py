@@ -0,0 +1,94 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.absent.models import Absent
+from app.inform.models import Inform, InformRead
+from app.inform.serializer import InformSummarySerializer
+from app.inform.visibility import visible_informs
+from app.oaauth.models import OAUser
+from app.oaauth.scopes import AccessScope
+
+#对视图中的热点查询执行EXPLAIN，找出全表扫描和额外排序（filesort）
+# python manage.py explainhotpaths --email shanshan@qq.com --strict
+# 注意：表中数据很少时，数据库可能认为全表扫描更快而不走索引，应该在数据量接近线上的库中执行
+
+# 各数据库执行计划中表示全表扫描、额外排序的关键字
+PLAN_PATTERNS = {
+    'mysql': [
+        (re.compile(r'\bALL\b'), '全表扫描'),
+        (re.compile(r'Using filesort'), '额外排序（filesort）'),
+    ],
+    'sqlite': [
+        (re.compile(r'\bSCAN \w+(?! USING)(\s|$)'), '全表扫描'),
+        (re.compile(r'USE TEMP B-TREE FOR ORDER BY'), '额外排序（filesort）'),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan'), '全表扫描'),
+        (re.compile(r'\bSort\b'), '额外排序（filesort）'),
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = '对热点查询执行EXPLAIN，标记全表扫描和额外排序'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='以哪个用户的身份构造查询，默认第一个有部门的用户')
+        parser.add_argument('--verbose-plan', action='store_true', help='输出完整的执行计划')
+        parser.add_argument('--strict', action='store_true', help='有问题的查询时返回非0退出码，可以在CI中使用')
+
+    def hot_querysets(self, user):
+        """和视图中的查询保持一致"""
+        scope = AccessScope(user)
+        inform_ids = list(Inform.objects.values_list('id', flat=True)[:10]) or [0]
+        return {
+            # AbsentViewSet.list
+            '我的考勤': Absent.objects.filter(requester=user).order_by('-create_time')[:10],
+            '下属的考勤': Absent.objects.filter(responder=user).order_by('-create_time')[:10],
+            # LatestAbsentView
+            '部门最新考勤': scope.filter(Absent.objects, 'requester__department_id').order_by('-create_time')[:10],
+            # StaffViewSet.list（部门leader）
+            '部门员工列表': OAUser.objects.filter(department_id=user.department_id).order_by('-date_joined')[:10],
+            # InformViewSet.get_queryset、LatestInformView（通知可见范围表）
+            '公开通知': Inform.objects.filter(public=True).order_by('-create_time')[:10],
+            '我发布的通知': Inform.objects.filter(author=user).order_by('-create_time')[:10],
+            '可见通知列表': visible_informs(Inform.objects.all(), user)[:10],
+            # 通知列表摘要（不查询正文，作者姓名、是否已读在同一条SQL中）
+            '通知列表摘要': InformSummarySerializer.setup_queryset(visible_informs(Inform.objects.all(), user), user)[:10],
+            # Prefetch("reads", queryset=InformRead.objects.filter(user_id=...))
+            '通知已读记录': InformRead.objects.filter(user_id=user.uid, inform_id__in=inform_ids),
+            # ReadInformView
+            '是否已读': InformRead.objects.filter(user_id=user.uid, inform_id=inform_ids[0]),
+        }
+
+    def handle(self, *args, **options):
+        users = OAUser.objects.select_related('department__leader', 'department__manager')
+        if options['email']:
+            user = users.filter(email=options['email']).first()
+        else:
+            user = users.filter(department__isnull=False).first()
+        if user is None:
+            raise CommandError('没有可用的用户，请先初始化数据或者指定--email')
+
+        patterns = PLAN_PATTERNS.get(connection.vendor, [])
+        if not patterns:
+            self.stdout.write(self.style.WARNING(f'不支持识别{connection.vendor}的执行计划，只输出EXPLAIN结果'))
+
+        flagged = 0
+        for name, queryset in self.hot_querysets(user).items():
+            plan = queryset.explain()
+            problems = sorted({label for pattern, label in patterns for line in plan.splitlines() if pattern.search(line)})
+            if problems:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'[有问题] {name}：{"、".join(problems)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'[OK] {name}'))
+            if problems or options['verbose_plan']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        self.stdout.write(f'共{flagged}个查询有全表扫描或额外排序')
+        if flagged and options['strict']:
+            raise CommandError('存在未走索引的热点查询')
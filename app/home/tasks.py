@@ -0,0 +1,8 @@
+from OA_back import celery_app
+from .badges import reconcile
+
+
+# 定时重新计算首页角标计数，修正缓存中的偏差（配置在CELERY_BEAT_SCHEDULE中）
+@celery_app.task(name='reconcile_badges_task', ignore_result=True)
+def reconcile_badges_task():
+    return reconcile()
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import re
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from app.absent.models import AbsentStatusChoices, AbsentType
+from app.inform.visibility import department_audience, user_audience
+from app.oaauth.authentications import generate_jwt
+from app.oaauth.models import OAUser, OAdepartment, UserStatusChoices
+from app.oaauth.principals import principal_cache
+from . import badges, events
+from .management.commands.explainhotpaths import PLAN_PATTERNS
+
+# 测试不依赖Redis：principal、角标等缓存使用进程内缓存
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HomeTestCase(TestCase):
+    """
+    董事会：雷冥（leader）
+    销售部：琥珀（leader，由雷冥分管）、小明（普通员工）
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.board = OAdepartment.objects.create(name='董事会', intro='董事会')
+        cls.sales = OAdepartment.objects.create(name='销售部', intro='销售部')
+        cls.leiming = cls.create_user('leiming@qq.com', '雷冥', cls.board)
+        cls.hupo = cls.create_user('hupo@qq.com', '琥珀', cls.sales)
+        cls.xiaoming = cls.create_user('xiaoming@qq.com', '小明', cls.sales)
+        cls.board.leader = cls.leiming
+        cls.board.save()
+        cls.sales.leader = cls.hupo
+        cls.sales.manager = cls.leiming
+        cls.sales.save()
+        cls.absent_type = AbsentType.objects.create(name='事假')
+
+    @staticmethod
+    def create_user(email, realname, department):
+        return OAUser.objects.create(email=email, realname=realname, department=department, status=UserStatusChoices.ACTIVED)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.local.clear()
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + generate_jwt(user))
+        return client
+
+
+class BadgeTests(HomeTestCase):
+
+    def badges(self, user):
+        response = self.client_for(user).get('/api/home/badges')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def request(self, user, method, path, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client_for(user), method)(path, data, format='json')
+
+    def create_absent(self, day):
+        data = {'title': '请假', 'request_content': '请假', 'absent_type_id': self.absent_type.pk,
+                'start_date': f'2024-03-{day:02d}', 'end_date': f'2024-03-{day:02d}'}
+        response = self.request(self.xiaoming, 'post', '/api/absent/absent', data)
+        self.assertEqual(response.status_code, 201, response.json())
+        return response.json()['id']
+
+    def create_inform(self, author, department_ids):
+        response = self.request(author, 'post', '/api/inform/inform', {'title': '通知', 'content': '通知内容', 'department_ids': department_ids})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def test_pending_absents(self):
+        # 先读取一次，计数写入缓存；之后的加减都在缓存上
+        self.assertEqual(self.badges(self.hupo)['pending_absents'], 0)
+        ids = [self.create_absent(day) for day in (4, 5, 6, 7)]
+        self.assertEqual(self.badges(self.hupo)['pending_absents'], 4)
+
+        response = self.request(self.hupo, 'put', f'/api/absent/absent/{ids[0]}', {'status': AbsentStatusChoices.PASS})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.badges(self.hupo)['pending_absents'], 3)
+
+        response = self.request(self.hupo, 'post', '/api/absent/absent/bulk', {'ids': ids, 'status': AbsentStatusChoices.REJECT})
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(self.badges(self.hupo)['pending_absents'], 0)
+        self.assertEqual(cache.get(badges.PENDING_KEY.format(uid=self.hupo.uid)), 0)
+
+    def test_unread_informs(self):
+        self.assertEqual(self.badges(self.xiaoming)['unread_informs'], 0)
+        self.assertEqual(self.badges(self.leiming)['unread_informs'], 0)
+        public_id = self.create_inform(self.leiming, [0])
+        sales_id = self.create_inform(self.leiming, [self.sales.id])
+        self.assertEqual(self.badges(self.xiaoming)['unread_informs'], 2)
+        # 发给销售部的通知，董事会看不到
+        self.assertEqual(self.badges(self.leiming)['unread_informs'], 1)
+
+        response = self.request(self.xiaoming, 'post', '/api/inform/inform/read', {'inform_pk': public_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.badges(self.xiaoming)['unread_informs'], 1)
+
+        self.assertEqual(self.request(self.leiming, 'delete', f'/api/inform/inform/{sales_id}').status_code, 204)
+        self.assertEqual(self.badges(self.xiaoming)['unread_informs'], 0)
+        self.assertEqual(self.request(self.leiming, 'delete', f'/api/inform/inform/{public_id}').status_code, 204)
+        self.assertEqual(self.badges(self.xiaoming)['unread_informs'], 0)
+        self.assertEqual(self.badges(self.leiming)['unread_informs'], 0)
+        self.assertEqual(cache.get(badges.INFORM_PUBLIC_KEY), 0)
+
+    def test_negative_counts(self):
+        # 缓存中的计数有偏差时不返回负数
+        cache.set(badges.PENDING_KEY.format(uid=self.hupo.uid), -2)
+        cache.set(badges.INFORM_PUBLIC_KEY, -5)
+        cache.set(badges.INFORM_DEPARTMENT_KEY.format(id=self.sales.id), 1)
+        self.assertEqual(self.badges(self.hupo), {'pending_absents': 0, 'unread_informs': 1})
+
+    def test_reconcile(self):
+        self.create_absent(4)
+        self.create_inform(self.leiming, [0])
+        self.badges(self.hupo)
+        self.badges(self.xiaoming)
+        pending_key = badges.PENDING_KEY.format(uid=self.hupo.uid)
+        read_key = badges.read_key(self.xiaoming.uid, self.sales.id)
+
+        # 一致的计数不动，不一致的删除，下次读取时重新COUNT
+        cache.set(pending_key, 7)
+        self.assertEqual(badges.reconcile(), 1)
+        self.assertIsNone(cache.get(pending_key))
+        self.assertEqual(cache.get(badges.INFORM_PUBLIC_KEY), 1)
+        self.assertEqual(cache.get(read_key), 0)
+        self.assertEqual(self.badges(self.hupo)['pending_absents'], 1)
+        self.assertEqual(badges.reconcile(), 0)
+
+    def test_reconcile_keeps_concurrent_changes(self):
+        # 重新计算之后、比较之前，另一个请求已经+1：缓存中的值和计算结果不一致，删除后重新COUNT，而不是用旧的计算结果覆盖
+        self.badges(self.hupo)
+        pending_key = badges.PENDING_KEY.format(uid=self.hupo.uid)
+        count_public = badges._count_public
+
+        def create_absent_then_count():
+            # 待审批数量已经计算好了，这时发起一条考勤
+            self.create_absent(4)
+            return count_public()
+
+        with mock.patch.object(badges, '_count_public', side_effect=create_absent_then_count):
+            self.assertEqual(badges.reconcile(), 1)
+        self.assertEqual(self.badges(self.hupo)['pending_absents'], 1)
+        self.assertEqual(cache.get(pending_key), 1)
+
+
+class ExplainHotPathsTests(HomeTestCase):
+
+    def explain(self, *args):
+        stdout = StringIO()
+        call_command('explainhotpaths', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_report(self):
+        output = self.explain('--email', self.xiaoming.email, '--verbose-plan')
+        lines = [line for line in output.splitlines() if line.startswith('[')]
+        self.assertEqual(len(lines), 10)
+        self.assertTrue(all(line.startswith(('[OK] ', '[有问题] ')) for line in lines))
+        self.assertRegex(output, r'\[(OK|有问题)\] 我的考勤')
+        self.assertRegex(output, r'共\d+个查询有全表扫描或额外排序')
+
+    def test_strict(self):
+        # 每一行执行计划都当作全表扫描
+        with mock.patch.dict(PLAN_PATTERNS, {'sqlite': [(re.compile('.'), '全表扫描')]}):
+            output = self.explain()
+            self.assertIn('[有问题] 我的考勤：全表扫描', output)
+            self.assertIn('共10个查询有全表扫描或额外排序', output)
+            with self.assertRaisesMessage(CommandError, '存在未走索引的热点查询'):
+                self.explain('--strict')
+        # 没有匹配的关键字
+        with mock.patch.dict(PLAN_PATTERNS, {'sqlite': [(re.compile('^$'), '全表扫描')]}):
+            output = self.explain('--strict')
+        self.assertNotIn('[有问题]', output)
+        self.assertIn('共0个查询有全表扫描或额外排序', output)
+
+    def test_no_user(self):
+        with self.assertRaisesMessage(CommandError, '没有可用的用户'):
+            self.explain('--email', 'nobody@qq.com')
+        OAUser.objects.update(department=None)
+        with self.assertRaisesMessage(CommandError, '没有可用的用户'):
+            self.explain()
+
+
+@override_settings(EVENTS_HEARTBEAT=0.05, EVENTS_MAX_AGE=0.3)
+class EventStreamTests(HomeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 测试在事务中运行，不能让事件流关闭数据库连接
+        patcher = mock.patch('app.home.events.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def scope_for(token=None):
+        return {'type': 'http', 'path': events.EVENTS_PATH, 'headers': [],
+                'query_string': f'token={token}'.encode() if token else b''}
+
+    def run_stream(self, scope, while_open=None):
+        """运行事件流直到EVENTS_MAX_AGE，连接建立后调用while_open()，返回发送的所有消息"""
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def run():
+            task = asyncio.ensure_future(events.stream(scope, receive, send))
+            while while_open and not messages and not task.done():
+                await asyncio.sleep(0.01)
+            if while_open and not task.done():
+                while_open()
+            await task
+
+        async_to_sync(run)()
+        return messages
+
+    def test_rejects_invalid_token(self):
+        user = self.create_user('temp@qq.com', '临时', self.sales)
+        token = generate_jwt(user)
+        user.delete()
+        for scope in (self.scope_for(), self.scope_for('invalid'), self.scope_for(token)):
+            messages = self.run_stream(scope)
+            self.assertEqual(messages[0]['status'], 403)
+            self.assertEqual(json.loads(messages[1]['body']), {'message': '请先登录！'})
+
+    def test_unexpected_error_is_raised(self):
+        # 数据库、缓存等错误不当作认证失败
+        with mock.patch.object(principal_cache, 'get', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                self.run_stream(self.scope_for(generate_jwt(self.xiaoming)))
+
+    def test_dispatch_in_process(self):
+        frame = events._frame(events.ABSENT_DECIDED, {'id': 1})
+
+        def while_open():
+            events._dispatch(user_audience(self.xiaoming.uid), frame)
+            events._dispatch(user_audience(self.hupo.uid), events._frame(events.ABSENT_DECIDED, {'id': 2}))
+
+        messages = self.run_stream(self.scope_for(generate_jwt(self.xiaoming)), while_open)
+        self.assertEqual(messages[0]['status'], 200)
+        bodies = [message['body'].decode() for message in messages[1:]]
+        self.assertEqual(bodies[0], 'retry: 5000\n\n')
+        self.assertIn(frame, bodies)
+        self.assertNotIn(events._frame(events.ABSENT_DECIDED, {'id': 2}), bodies)
+        self.assertIn(': ping\n\n', bodies)
+        # 连接结束后取消订阅
+        self.assertEqual(events._subscribers, {})
+
+    def test_publish_on_commit(self):
+        with mock.patch('app.home.events._dispatch') as dispatch:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client_for(self.leiming).post('/api/inform/inform', {'title': '通知', 'content': '通知内容', 'department_ids': [self.sales.id]}, format='json')
+            self.assertEqual(response.status_code, 201)
+            # 事务提交之前不发布
+            dispatch.assert_not_called()
+            for callback in callbacks:
+                callback()
+            audiences = [call.args[0] for call in dispatch.call_args_list if events.INFORM_CREATED in call.args[1]]
+            self.assertIn(department_audience(self.sales.id), audiences)
+
+            dispatch.reset_mock()
+            data = {'title': '请假', 'request_content': '请假', 'absent_type_id': self.absent_type.pk,
+                    'start_date': '2024-03-04', 'end_date': '2024-03-04'}
+            with self.captureOnCommitCallbacks(execute=True):
+                absent_id = self.client_for(self.xiaoming).post('/api/absent/absent', data, format='json').json()['id']
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client_for(self.hupo).put(f'/api/absent/absent/{absent_id}', {'status': AbsentStatusChoices.PASS}, format='json')
+            dispatch.assert_not_called()
+            for callback in callbacks:
+                callback()
+            dispatch.assert_called_once()
+            audience, frame = dispatch.call_args.args
+            self.assertEqual(audience, user_audience(self.xiaoming.uid))
+            self.assertTrue(frame.startswith(f'event: {events.ABSENT_DECIDED}\n'))
+            self.assertEqual(json.loads(frame.split('data: ', 1)[1])['id'], absent_id)
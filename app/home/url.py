@@ -7,4 +7,5 @@ urlpatterns = [
     path('latest/inform',views.LatestInformView.as_view(),name='latest_inform'),
     path('latest/absent',views.LatestAbsentView.as_view(),name='latest_absent'),
     path('department/staff/count',views.DepartmentStaffCountView.as_view(),name='department_staff_count'),
+    path('badges',views.BadgeView.as_view(),name='badges'), #待审批考勤、未读通知数量
 ]
\ No newline at end of file
@@ -1,6 +1,7 @@
 from rest_framework.views import APIView
 from app.inform.models import Inform, InformRead
-from app.inform.serializer import InformSerializer
+from app.inform.serializer import InformSummarySerializer
+from app.inform.visibility import visible_informs
 from django.db.models import Q #构建复杂的OR/AND逻辑条件
 from django.db.models import Prefetch #优化数据库查询，预加载相关数据（比JOIN更灵活）
 from rest_framework. response import Response
@@ -10,6 +11,8 @@ from app.oaauth.models import OAdepartment
 from django.db.models import Count #聚合计数
 from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
+from .badges import get_badges
+from utils import refdata
 
 
 # @cache_page(60*15)
@@ -25,8 +28,11 @@ class LatestInformView(APIView):
     def get(self, request):
         current_user = request.user
         # 返回公共的，或者是我所在的部门能看到的通知
-        informs = Inform.objects.prefetch_related(Prefetch("reads", queryset=InformRead.objects.filter(user_id=current_user.uid)), 'departments').filter(Q(public=True) | Q(departments=current_user.department))[:10]
-        serializer = InformSerializer(informs, many=True)
+        # 可见范围表（见app/inform/visibility.py）：按部门的audience一次索引范围扫描，不需要OR和DISTINCT
+        # 和原来一样不包括自己发布、自己部门看不到的通知（'u{uid}'行），这些只在通知列表中显示
+        # 只返回摘要（InformSummarySerializer）：不查询正文，作者姓名、是否已读在同一条SQL中查出
+        informs = InformSummarySerializer.setup_queryset(visible_informs(Inform.objects.all(), current_user, include_own=False), current_user)[:10]
+        serializer = InformSummarySerializer(informs, many=True)
         return Response(serializer.data)
 
 
@@ -50,10 +56,7 @@ class LatestAbsentView(APIView):
     #@method_decorator(cache_page(30))#缓存设置为30秒
     def get(self, request):
         # 董事会的人，可以看到所有人的考勤信息，非董事会的人，只能看到自己部门的考勤信息
-        current_user = request.user
-        queryset = Absent.objects
-        if current_user.department.name != '董事会':
-            queryset = queryset.filter(requester__department_id=current_user.department_id)
+        queryset = request.access_scope.filter(Absent.objects, 'requester__department_id')
         queryset = queryset.all()[:10]
         serializer = AbsentSerializer(queryset, many=True)
         return Response(serializer.data)
@@ -64,6 +67,11 @@ class LatestAbsentView(APIView):
 class DepartmentStaffCountView(APIView):
     #@method_decorator(cache_page(30))#缓存设置为30秒
     def get(self, request):
+        # 统计结果缓存起来，员工换部门、部门变化时失效；带ETag返回，没有变化时返回304（见utils/refdata.py）
+        return refdata.cached_response(request, refdata.DEPARTMENT_STAFF_COUNT, self.build, params=())
+
+    @staticmethod
+    def build():
         rows = OAdepartment.objects.annotate(staff_count=Count("staffs")).values("name", "staff_count")
         # 执行步骤：
         # annotate(staff_count=Count("staffs"))
@@ -76,8 +84,12 @@ class DepartmentStaffCountView(APIView):
         # SQL等价：SELECT
         # department.name, staff_count FROM department
         # print(rows)
-        print('='*10)
-        return Response(rows)
+        return list(rows)
+
+#首页角标：待我审批的考勤数量、未读通知数量，从缓存中读取计数（见badges.py），不执行COUNT查询
+class BadgeView(APIView):
+    def get(self, request):
+        return Response(get_badges(request.user))
 
 #健康检查
 class HealthCheckView(APIView):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InformConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.inform'
+
+    def ready(self):
+        # 注册信号处理函数（通知可见范围表的补写）
+        from . import signals  # noqa: F401
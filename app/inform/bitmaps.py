@@ -0,0 +1,185 @@
+#通知已读位图：每条通知一个位图，第index位（员工的位图下标，见UserBitIndex）为1表示该员工已读
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  inform:bits:{inform_id}  -> Redis字符串（SETBIT/BITCOUNT）        │
+# │                                                                 │
+# │  已读回执写入数据库后 SETBIT（O(1)），位图不存在时跳过，             │
+# │  下次查询时从InformRead重新生成                                   │
+# │  已读人数：BITCOUNT                                              │
+# │  部门未读：部门员工的下标数组 → numpy unpackbits 后按下标取值，      │
+# │          值为0的就是未读的员工，不需要对员工表做反连接               │
+# │  缓存不是Redis时（开发环境）使用进程内的bytearray                   │
+# └─────────────────────────────────────────────────────────────────┘
+import threading
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db import IntegrityError, transaction
+
+from .models import Inform, InformRead, UserBitIndex
+
+OAUser = get_user_model()
+
+BITMAP_KEY = 'inform:bits:{inform_id}'
+
+_local_bitmaps = {}
+_local_lock = threading.Lock()
+
+
+def _redis():
+    """缓存后端是Redis时返回redis客户端，否则返回None（使用进程内位图）"""
+    if isinstance(cache, RedisCache):
+        return cache._cache.get_client(write=True)
+    return None
+
+
+def _key(inform_id):
+    return cache.make_and_validate_key(BITMAP_KEY.format(inform_id=inform_id))
+
+
+# ---------------------------------- 员工下标 ----------------------------------
+
+def ensure_indexes(uids):
+    """{uid: 位图下标}，没有下标的员工（例如bulk_create导入的）一次分配"""
+    uids = set(uids)
+    indexes = dict(UserBitIndex.objects.filter(user_id__in=uids).values_list('user_id', 'index'))
+    missing = uids - indexes.keys()
+    if missing:
+        existing = set(OAUser.objects.filter(uid__in=missing).values_list('uid', flat=True))
+        try:
+            with transaction.atomic():
+                UserBitIndex.objects.bulk_create([UserBitIndex(user_id=uid) for uid in existing], ignore_conflicts=True)
+        except IntegrityError:
+            # 员工在这期间被删除了
+            pass
+        indexes.update(UserBitIndex.objects.filter(user_id__in=missing).values_list('user_id', 'index'))
+    return indexes
+
+
+def department_indexes(department_id):
+    """部门所有员工：(下标数组, uid列表)，顺序一致"""
+    rows = list(UserBitIndex.objects.filter(user__department_id=department_id).values_list('index', 'user_id'))
+    missing = list(OAUser.objects.filter(department_id=department_id, bit_index__isnull=True).values_list('uid', flat=True))
+    if missing:
+        rows.extend((index, uid) for uid, index in ensure_indexes(missing).items())
+    return np.array([index for index, _ in rows], dtype=np.int64), [uid for _, uid in rows]
+
+
+# ---------------------------------- 位图读写 ----------------------------------
+
+def _pack(indexes):
+    """下标数组 -> 位图bytes（高位在前，和Redis SETBIT的位序一致）"""
+    indexes = np.asarray(indexes, dtype=np.int64)
+    if not len(indexes):
+        return b''
+    bits = np.zeros(int(indexes.max()) + 1, dtype=np.uint8)
+    bits[indexes] = 1
+    return np.packbits(bits).tobytes()
+
+
+def _unpack(data):
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8)) if data else np.zeros(0, dtype=np.uint8)
+
+
+def build(inform_id):
+    """从InformRead生成一条通知的位图并保存，返回位图bytes"""
+    uids = list(InformRead.objects.filter(inform_id=inform_id).values_list('user_id', flat=True))
+    data = _pack(list(ensure_indexes(uids).values()))
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            _local_bitmaps[inform_id] = bytearray(data)
+    else:
+        # 空位图也要保存，表示"已经生成过"；SET会覆盖生成期间SETBIT写入的位，由mark()之后的下一次读取或rebuild修正
+        client.set(_key(inform_id), data)
+    return data
+
+
+def load(inform_id):
+    """一条通知的位图bytes，不存在时从数据库生成"""
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            data = _local_bitmaps.get(inform_id)
+        return bytes(data) if data is not None else build(inform_id)
+    data = client.get(_key(inform_id))
+    return data if data is not None else build(inform_id)
+
+
+def mark(receipts):
+    """新写入的已读记录 [(inform_id, uid), ...]：对应的位设为1，位图还没有生成的通知跳过"""
+    receipts = list(receipts)
+    if not receipts:
+        return
+    indexes = ensure_indexes({uid for _, uid in receipts})
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            for inform_id, uid in receipts:
+                bitmap = _local_bitmaps.get(inform_id)
+                if bitmap is None or uid not in indexes:
+                    continue
+                byte, bit = divmod(indexes[uid], 8)
+                if len(bitmap) <= byte:
+                    bitmap.extend(b'\x00' * (byte + 1 - len(bitmap)))
+                bitmap[byte] |= 0x80 >> bit
+        return
+    inform_ids = sorted({inform_id for inform_id, _ in receipts})
+    pipeline = client.pipeline(transaction=False)
+    for inform_id in inform_ids:
+        pipeline.exists(_key(inform_id))
+    exists = dict(zip(inform_ids, pipeline.execute()))
+    pipeline = client.pipeline(transaction=False)
+    for inform_id, uid in receipts:
+        if exists[inform_id] and uid in indexes:
+            pipeline.setbit(_key(inform_id), indexes[uid], 1)
+    pipeline.execute()
+
+
+def forget(inform_id):
+    """通知删除后删除位图"""
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            _local_bitmaps.pop(inform_id, None)
+    else:
+        client.delete(_key(inform_id))
+
+
+def read_count(inform_id):
+    """已读人数（popcount）"""
+    client = _redis()
+    if client is None or not client.exists(_key(inform_id)):
+        return int(_unpack(load(inform_id)).sum())
+    return client.bitcount(_key(inform_id))
+
+
+def split_department(inform_id, department_id, data=None):
+    """部门员工中 (已读uid列表, 未读uid列表)"""
+    bits = _unpack(load(inform_id) if data is None else data)
+    indexes, uids = department_indexes(department_id)
+    read = np.zeros(len(indexes), dtype=bool)
+    inside = indexes < len(bits)
+    read[inside] = bits[indexes[inside]].astype(bool)
+    return [uid for uid, flag in zip(uids, read) if flag], [uid for uid, flag in zip(uids, read) if not flag]
+
+
+def rebuild(chunk_size=500):
+    """给所有员工分配下标，并从InformRead重新生成所有通知的位图，返回生成的位图数量"""
+    ensure_indexes(OAUser.objects.values_list('uid', flat=True))
+    indexes = dict(UserBitIndex.objects.values_list('user_id', 'index'))
+    readers = {}
+    for inform_id, uid in InformRead.objects.values_list('inform_id', 'user_id').iterator(chunk_size=chunk_size):
+        readers.setdefault(inform_id, []).append(indexes[uid])
+    client = _redis()
+    count = 0
+    for inform_id in Inform.objects.values_list('id', flat=True).iterator(chunk_size=chunk_size):
+        data = _pack(readers.get(inform_id, []))
+        if client is None:
+            with _local_lock:
+                _local_bitmaps[inform_id] = bytearray(data)
+        else:
+            client.set(_key(inform_id), data)
+        count += 1
+    return count
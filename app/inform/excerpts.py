@@ -0,0 +1,28 @@
+#通知摘要：从Markdown/HTML正文中提取纯文本的前N个字，保存通知时写入Inform.excerpt，列表接口只返回摘要
+import html
+import re
+
+# 摘要最多多少个字
+EXCERPT_LENGTH = 120
+
+_PATTERNS = [
+    (re.compile(r'```.*?```', re.S), ' '),                  # 代码块
+    (re.compile(r'!\[[^\]]*\]\([^)]*\)'), ' '),             # 图片 ![alt](url)，包括base64内嵌的图片
+    (re.compile(r'<img\b[^>]*>', re.I), ' '),               # HTML图片
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),          # 链接 [文字](url) 只保留文字
+    (re.compile(r'<[^>]+>'), ' '),                          # 其他HTML标签
+    (re.compile(r'^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+', re.M), ''),  # 标题、引用、列表的标记
+    (re.compile(r'(\*\*|__|\*|_|~~|`)'), ''),               # 加粗、斜体、删除线、行内代码
+]
+_WHITESPACE = re.compile(r'\s+')
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    text = content or ''
+    for pattern, replacement in _PATTERNS:
+        text = pattern.sub(replacement, text)
+    # 先还原&nbsp;等HTML实体，再合并连续的空白
+    text = _WHITESPACE.sub(' ', html.unescape(text)).strip()
+    if len(text) > length:
+        text = text[:length].rstrip() + '…'
+    return text
@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from app.inform.visibility import rebuild
+
+
+#从通知表全量重建通知可见范围表（上线可见范围表、或者直接改过数据库之后执行）
+# python manage.py rebuildinformvisibility
+class Command(BaseCommand):
+    help = '重建通知可见范围表（公开、部门、作者）'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild()
+        self.stdout.write(f'通知可见范围表重建完成：{count}行，耗时{time.perf_counter() - start:.2f}秒')
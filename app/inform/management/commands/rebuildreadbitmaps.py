@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from app.inform.bitmaps import rebuild
+
+
+#给所有员工分配位图下标，并从已读记录重新生成所有通知的已读位图（缓存被清空、或者直接改过数据库之后执行）
+# python manage.py rebuildreadbitmaps
+class Command(BaseCommand):
+    help = '重建通知已读位图'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild()
+        self.stdout.write(f'通知已读位图重建完成：{count}条通知，耗时{time.perf_counter() - start:.2f}秒')
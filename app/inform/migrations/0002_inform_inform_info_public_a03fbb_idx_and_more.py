@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inform', '0001_initial'),
+        ('oaauth', '0002_oadepartment_oauser_department'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inform',
+            index=models.Index(fields=['public', '-create_time'], name='inform_info_public_a03fbb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inform',
+            index=models.Index(fields=['author', '-create_time'], name='inform_info_author__d32569_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='informread',
+            index=models.Index(fields=['user', 'inform'], name='inform_info_user_id_1c6b4e_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # 已有通知的可见范围，规则和 app/inform/visibility.py 相同（迁移中不能使用真实的模型）
+    Inform = apps.get_model('inform', 'Inform')
+    InformVisibility = apps.get_model('inform', 'InformVisibility')
+    OAdepartment = apps.get_model('oaauth', 'OAdepartment')
+    department_ids = list(OAdepartment.objects.values_list('id', flat=True))
+    rows = []
+    for inform in Inform.objects.select_related('author').prefetch_related('departments').iterator(chunk_size=500):
+        targets = department_ids if inform.public else [department.id for department in inform.departments.all()]
+        audiences = (['p'] if inform.public else []) + [f'd{department_id}' for department_id in targets]
+        author_department_id = inform.author.department_id
+        if ('p' if author_department_id is None else f'd{author_department_id}') not in audiences:
+            audiences.append(f'u{inform.author_id}')
+        rows.extend(InformVisibility(inform_id=inform.id, audience=audience, create_time=inform.create_time) for audience in audiences)
+        if len(rows) >= 1000:
+            InformVisibility.objects.bulk_create(rows)
+            rows = []
+    InformVisibility.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inform', '0002_inform_inform_info_public_a03fbb_idx_and_more'),
+        ('oaauth', '0003_oauser_oaauth_oaus_departm_daa723_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InformVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audience', models.CharField(max_length=40)),
+                ('create_time', models.DateTimeField()),
+                ('inform', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', related_query_name='visibility', to='inform.inform')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['audience', '-create_time', '-inform'], name='inform_info_audienc_fe8a19_idx')],
+                'unique_together': {('inform', 'audience')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    # 已有通知的已读人数：一条UPDATE ... SET read_count = (SELECT COUNT(*) ...)
+    Inform = apps.get_model('inform', 'Inform')
+    InformRead = apps.get_model('inform', 'InformRead')
+    reads = InformRead.objects.filter(inform=OuterRef('pk')).values('inform').annotate(count=Count('id')).values('count')
+    Inform.objects.update(read_count=Coalesce(Subquery(reads), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inform', '0003_informvisibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inform',
+            name='read_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # 已有员工按入职时间分配位图下标
+    OAUser = apps.get_model('oaauth', 'OAUser')
+    UserBitIndex = apps.get_model('inform', 'UserBitIndex')
+    uids = OAUser.objects.order_by('date_joined', 'uid').values_list('uid', flat=True)
+    UserBitIndex.objects.bulk_create([UserBitIndex(user_id=uid) for uid in uids], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inform', '0004_inform_read_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBitIndex',
+            fields=[
+                ('index', models.AutoField(primary_key=True, serialize=False)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bit_index', related_query_name='bit_index', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
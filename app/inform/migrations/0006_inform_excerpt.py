@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-19 00:15
+
+from django.db import migrations, models
+
+from app.inform.excerpts import make_excerpt
+
+
+def backfill(apps, schema_editor):
+    # 已有通知生成摘要：分批读取正文，每批一次bulk_update
+    Inform = apps.get_model('inform', 'Inform')
+    informs = []
+    for inform in Inform.objects.only('id', 'content').iterator(chunk_size=200):
+        inform.excerpt = make_excerpt(inform.content)
+        informs.append(inform)
+        if len(informs) >= 200:
+            Inform.objects.bulk_update(informs, ['excerpt'])
+            informs = []
+    Inform.objects.bulk_update(informs, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inform', '0005_userbitindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inform',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
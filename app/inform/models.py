@@ -1,5 +1,6 @@
 from django.db import models
 from app.oaauth.models import OAUser, OAdepartment
+from .excerpts import make_excerpt
 
 # 通知
 class Inform(models.Model):
@@ -11,8 +12,25 @@ class Inform(models.Model):
     author = models.ForeignKey(OAUser, on_delete=models.CASCADE, related_name='informs', related_query_name='informs')
     # departments：序列化的时候用，前端上传部门id，我们通过department_ids来获取
     departments = models.ManyToManyField(OAdepartment, related_name='informs', related_query_name='informs')#可以被那些部门看到
+    # 已读人数：已读回执批量写入时累加（见receipts.py），查看详情时不需要再COUNT
+    read_count = models.PositiveIntegerField(default=0)
+    # 正文的纯文本摘要，保存时生成（见excerpts.py），列表只返回摘要，不查询正文
+    excerpt = models.CharField(max_length=200, blank=True, default='')
     class Meta:
         ordering = ('-create_time', )
+        indexes = [
+            # 公开通知 / 我发布的通知，按时间倒序
+            models.Index(fields=['public', '-create_time']),
+            models.Index(fields=['author', '-create_time']),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.excerpt = make_excerpt(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        super().save(*args, **kwargs)
 
 # 什么人什么时间查看过某条通知
 class InformRead(models.Model):
@@ -23,4 +41,32 @@ class InformRead(models.Model):
     class Meta:
         # inform和user组合的数据，必须是唯一的
         unique_together = ('inform', 'user')
+        # 查询某个用户读过哪些通知（user在前），unique_together的索引是inform在前，用不上
+        indexes = [
+            models.Index(fields=['user', 'inform']),
+        ]
+
+
+# 通知的可见范围（发布时展开写入，见visibility.py），查询"部门D能看到的最新N条通知"时走 (audience, create_time) 索引，
+# 不需要再对 公开 | 部门多对多 | 作者 做OR查询和DISTINCT
+class InformVisibility(models.Model):
+    # audience：'p' 公开（给没有部门的员工用）；'d{部门id}' 部门；'u{作者uid}' 作者自己（作者所在部门看不到时才有）
+    PUBLIC = 'p'
+
+    inform = models.ForeignKey(Inform, on_delete=models.CASCADE, related_name='visibility', related_query_name='visibility')
+    audience = models.CharField(max_length=40)
+    # 冗余通知的发布时间，按时间倒序取最新的通知直接走索引
+    create_time = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('inform', 'audience')
+        indexes = [
+            models.Index(fields=['audience', '-create_time', '-inform']),
+        ]
+
 
+# 员工的位图下标：每个员工一个从1开始、基本连续的整数（自增主键），通知的已读状态用位图保存（见bitmaps.py），
+# 第index位为1表示该员工已读
+class UserBitIndex(models.Model):
+    index = models.AutoField(primary_key=True)
+    user = models.OneToOneField(OAUser, on_delete=models.CASCADE, related_name='bit_index', related_query_name='bit_index')
@@ -0,0 +1,229 @@
+#通知已读回执：先写入缓冲区，由Celery任务批量写入数据库
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  ReadInformView ──→ 已读标记存在（读过）直接返回                   │
+# │                 ──→ 校验通知存在、当前员工能看到                    │
+# │                 ──→ cache.add 已读标记（去重，写入缓冲区失败时删除）  │
+# │                 ──→ RPUSH 到Redis列表 inform:receipts             │
+# │                 ──→ 每秒最多投递一次 flush_receipts_task            │
+# │                                                                 │
+# │  worker ──→ 一次取出一批回执（LRANGE + LTRIM）                     │
+# │         ──→ 过滤掉已经存在的、通知/员工已删除的                      │
+# │         ──→ bulk_create(ignore_conflicts=True)                   │
+# │         ──→ 每条通知的 read_count += N（相同N的通知一次UPDATE）      │
+# │         ──→ 已读位图 SETBIT（见bitmaps.py）                        │
+# │                                                                 │
+# │  缓存不是Redis时（开发环境）使用进程内缓冲区，写入后立即在本进程刷新  │
+# └─────────────────────────────────────────────────────────────────┘
+import logging
+import threading
+import uuid
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+from django.db.models import F
+
+from app.home import badges
+from .models import Inform, InformRead
+from . import bitmaps
+
+logger = logging.getLogger(__name__)
+
+OAUser = get_user_model()
+
+BUFFER_KEY = 'inform:receipts'
+MARKER_KEY = 'inform:read:{inform_id}:{uid}'
+SCHEDULED_KEY = 'inform:receipts:scheduled'
+FLUSHING_KEY = 'inform:receipts:flushing'
+
+# 释放flush锁：只有值还是自己的token才删除（锁超时后可能已经被另一个worker拿到了）
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_local_buffer = deque()
+_local_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _redis():
+    """缓存后端是Redis时返回redis客户端，否则返回None（使用进程内缓冲区）"""
+    if isinstance(cache, RedisCache):
+        return cache._cache.get_client(write=True)
+    return None
+
+
+def _encode(inform_id, uid):
+    return f'{inform_id}:{uid}'
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        value = value.decode()
+    inform_id, uid = value.split(':', 1)
+    return int(inform_id), uid
+
+
+def push(inform_id, uid):
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            _local_buffer.append(_encode(inform_id, uid))
+        return
+    client.rpush(cache.make_and_validate_key(BUFFER_KEY), _encode(inform_id, uid))
+
+
+def pop_batch(batch_size):
+    """取出最早的batch_size条回执：[(inform_id, uid), ...]"""
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            values = [_local_buffer.popleft() for _ in range(min(batch_size, len(_local_buffer)))]
+    else:
+        key = cache.make_and_validate_key(BUFFER_KEY)
+        # MULTI/EXEC：取出和删除是原子的，多个worker不会取到同一批
+        pipeline = client.pipeline(transaction=True)
+        pipeline.lrange(key, 0, batch_size - 1)
+        pipeline.ltrim(key, batch_size, -1)
+        values = pipeline.execute()[0]
+    return [_decode(value) for value in values]
+
+
+def push_back(receipts):
+    """写入失败时放回缓冲区，下次再写"""
+    values = [_encode(inform_id, uid) for inform_id, uid in receipts]
+    if not values:
+        return
+    client = _redis()
+    if client is None:
+        with _local_lock:
+            _local_buffer.extendleft(reversed(values))
+    else:
+        client.lpush(cache.make_and_validate_key(BUFFER_KEY), *reversed(values))
+
+
+def pending_count():
+    client = _redis()
+    if client is None:
+        return len(_local_buffer)
+    return client.llen(cache.make_and_validate_key(BUFFER_KEY))
+
+
+def has_read(inform_id, uid):
+    """已读标记是否存在（已经记录过），调用方可以据此跳过校验通知的查询"""
+    return cache.get(MARKER_KEY.format(inform_id=inform_id, uid=uid)) is not None
+
+
+def record_read(inform_id, uid):
+    """
+    员工阅读通知：返回False表示之前已经记录过
+    调用前要先校验通知存在、员工能看到（见ReadInformView），这里不再查询数据库
+    已读标记用cache.add去重，同一个员工反复点击只有第一次写入缓冲区
+    """
+    marker = MARKER_KEY.format(inform_id=inform_id, uid=uid)
+    if not cache.add(marker, 1, timeout=_setting('INFORM_READ_MARKER_TIMEOUT', 60 * 60 * 24 * 7)):
+        return False
+    try:
+        push(inform_id, uid)
+    except Exception:
+        # 没有写入缓冲区：删除已读标记，否则这次阅读永远不会被记录
+        cache.delete(marker)
+        raise
+    if _redis() is None:
+        # 进程内缓冲区只有本进程能取到，直接刷新
+        flush()
+    else:
+        schedule_flush()
+    return True
+
+
+def schedule_flush():
+    # 短时间内大量阅读时每秒只投递一次任务，由worker一次性批量写入
+    from .tasks import flush_receipts_task
+    if cache.add(SCHEDULED_KEY, 1, timeout=1):
+        flush_receipts_task.apply_async(countdown=1)
+
+
+def write_receipts(receipts):
+    """把一批回执写入数据库，返回新写入的数量"""
+    receipts = list(dict.fromkeys(receipts))
+    inform_ids = {inform_id for inform_id, _ in receipts}
+    uids = {uid for _, uid in receipts}
+    informs = set(Inform.objects.filter(id__in=inform_ids).values_list('id', flat=True))
+    users = set(OAUser.objects.filter(uid__in=uids).values_list('uid', flat=True))
+    existing = set(InformRead.objects.filter(inform_id__in=inform_ids, user_id__in=uids).values_list('inform_id', 'user_id'))
+    new = [
+        (inform_id, uid) for inform_id, uid in receipts
+        if inform_id in informs and uid in users and (inform_id, uid) not in existing
+    ]
+    if not new:
+        return 0
+
+    # 新增的已读数量相同的通知放在一次UPDATE中
+    counts = defaultdict(list)
+    for inform_id, count in Counter(inform_id for inform_id, _ in new).items():
+        counts[count].append(inform_id)
+    with transaction.atomic():
+        InformRead.objects.bulk_create([InformRead(inform_id=inform_id, user_id=uid) for inform_id, uid in new], ignore_conflicts=True)
+        for count, ids in counts.items():
+            Inform.objects.filter(id__in=ids).update(read_count=F('read_count') + count)
+        badges.informs_read(new)
+        # 已读位图在事务提交后再置位
+        transaction.on_commit(lambda: bitmaps.mark(new))
+    return len(new)
+
+
+def _acquire_flush_lock(timeout):
+    """获取flush锁，返回token，没有获取到返回None"""
+    token = uuid.uuid4().hex
+    client = _redis()
+    if client is None:
+        return token if cache.add(FLUSHING_KEY, token, timeout=timeout) else None
+    return token if client.set(cache.make_and_validate_key(FLUSHING_KEY), token, nx=True, ex=timeout) else None
+
+
+def _release_flush_lock(token):
+    client = _redis()
+    if client is None:
+        # 进程内缓存只在开发环境使用，不需要原子操作
+        if cache.get(FLUSHING_KEY) == token:
+            cache.delete(FLUSHING_KEY)
+        return
+    client.eval(RELEASE_LOCK_SCRIPT, 1, cache.make_and_validate_key(FLUSHING_KEY), token)
+
+
+def flush(max_batches=None):
+    """把缓冲区中的回执批量写入数据库，返回新写入的数量；同一时间只有一个worker在写"""
+    token = _acquire_flush_lock(_setting('INFORM_RECEIPT_LOCK_TIMEOUT', 60))
+    if token is None:
+        return 0
+    batch_size = _setting('INFORM_RECEIPT_BATCH_SIZE', 1000)
+    max_batches = max_batches or _setting('INFORM_RECEIPT_MAX_BATCHES', 20)
+    written = 0
+    try:
+        for _ in range(max_batches):
+            receipts = pop_batch(batch_size)
+            if not receipts:
+                break
+            try:
+                written += write_receipts(receipts)
+            except Exception:
+                push_back(receipts)
+                raise
+    finally:
+        _release_flush_lock(token)
+    if pending_count():
+        # 这次没有写完，继续投递
+        cache.delete(SCHEDULED_KEY)
+        if _redis() is not None:
+            schedule_flush()
+    return written
@@ -1,18 +1,24 @@
 from rest_framework import serializers
+from utils.serializers import SparseFieldsMixin  # 支持 ?fields=&expand= 裁剪返回的字段
 from .models import Inform, InformRead
 from app.oaauth.serializer import UserSerializer, DepartmentSerializer
 from app.oaauth.models import OAdepartment
+from app.home import badges # 首页角标计数
+from app.home import events # 服务端推送事件流
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from . import visibility # 通知可见范围表
 
 
 
-class InformReadSerializer(serializers.ModelSerializer):
+class InformReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = InformRead
         fields = "__all__"
 
 
 # 通知序列化
-class InformSerializer(serializers.ModelSerializer):
+class InformSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     departments = DepartmentSerializer(many=True, read_only=True)
     # department_ids：是一个包含了部门id的列表
@@ -24,7 +30,7 @@ class InformSerializer(serializers.ModelSerializer):
     class Meta:
         model = Inform
         fields = "__all__"
-        read_only_fields = ('public', ) # 只读字段
+        read_only_fields = ('public', 'read_count') # 只读字段
 
 
     # 重写保存Inform对象的create方法
@@ -37,16 +43,24 @@ class InformSerializer(serializers.ModelSerializer):
         # [ 0, 1, 2 ]  (整数列表)
         department_ids = list(map(lambda value: int(value), department_ids))
         # 判断部门ID列表中是否包含0，如果包含0，则表示该通知是公开的，否则是部门可见的
-        if 0 in department_ids:
-            # 创建公开通知（public=True）
-            inform = Inform.objects.create(public=True, author=request.user, **validated_data)
-        else:
-            # 创建部门可见通知（public=False）
-            # id__in是Django ORM中用于查询主键在给定列表中的对象的查询条件，这里用于查询部门ID在给定列表中的部门对象
-            departments = OAdepartment.objects.filter(id__in=department_ids).all()
-            inform = Inform.objects.create(public=False, author=request.user, **validated_data)
-            inform.departments.set(departments) # 设置通知的部门
-            inform.save() # 保存通知对象
+        # 通知和可见范围表在同一个事务中写入
+        with transaction.atomic():
+            if 0 in department_ids:
+                # 创建公开通知（public=True）
+                inform = Inform.objects.create(public=True, author=request.user, **validated_data)
+                audiences = visibility.fan_out(inform, author_department_id=request.user.department_id) # 公开 + 所有部门
+                badges.inform_created(inform) # 公开通知数量+1
+            else:
+                # 创建部门可见通知（public=False）
+                # id__in是Django ORM中用于查询主键在给定列表中的对象的查询条件，这里用于查询部门ID在给定列表中的部门对象
+                departments = OAdepartment.objects.filter(id__in=department_ids).all()
+                inform = Inform.objects.create(public=False, author=request.user, **validated_data)
+                inform.departments.set(departments) # 设置通知的部门
+                inform.save() # 保存通知对象
+                department_ids = [department.id for department in departments]
+                audiences = visibility.fan_out(inform, department_ids, request.user.department_id) # 每个接收部门一行
+                badges.inform_created(inform, department_ids) # 每个接收部门的通知数量+1
+            events.inform_created(inform, audiences) # 提交后推送给能看到这条通知的员工
         return inform 
 
 
@@ -84,6 +98,25 @@ class InformSerializer(serializers.ModelSerializer):
 #     "departments": [...]
 # }
 
+# 通知列表（摘要）：不返回正文content，作者只返回id和姓名，已读状态只返回is_read
+# 查询需要先经过setup_queryset处理：SQL中不查询content，作者姓名和是否已读在同一条SQL中查出
+class InformSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author_id = serializers.CharField(read_only=True)
+    author_name = serializers.CharField(read_only=True)
+    is_read = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Inform
+        fields = ('id', 'title', 'excerpt', 'create_time', 'public', 'read_count', 'author_id', 'author_name', 'is_read')
+
+    @staticmethod
+    def setup_queryset(queryset, user):
+        return queryset.only('id', 'title', 'excerpt', 'create_time', 'public', 'read_count', 'author').annotate(
+            author_name=F('author__realname'),
+            is_read=Exists(InformRead.objects.filter(inform=OuterRef('pk'), user_id=user.uid)),
+        )
+
+
 # 标记通知为已读序列化
 class ReadInformSerializer(serializers.Serializer):
     inform_pk=serializers.IntegerField(error_messages={"required":"请传入inform的id！"})
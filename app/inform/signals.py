@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from app.oaauth.models import OAdepartment
+from . import bitmaps, visibility
+from .models import Inform, UserBitIndex
+
+OAUser = get_user_model()
+
+
+# 新建部门：补写所有公开通知的可见范围
+@receiver(post_save, sender=OAdepartment)
+def add_visibility_on_department_create(sender, instance, created, **kwargs):
+    if created:
+        visibility.add_department(instance)
+
+
+# 员工换部门：保存前记下数据库中原来的部门（一次主键查询），保存后部门真的变了才重新计算
+# 只更新了其他字段（比如last_login）、新建员工就跳过
+@receiver(pre_save, sender=OAUser)
+def remember_department_on_user_save(sender, instance, update_fields=None, **kwargs):
+    instance._previous_department_id = None
+    if instance._state.adding or (update_fields is not None and not {'department', 'department_id'}.intersection(update_fields)):
+        return
+    instance._previous_department_id = OAUser.objects.filter(pk=instance.pk).values_list('department_id', flat=True).first()
+
+
+# 员工换部门：TA发布的通知是否还需要作者行
+@receiver(post_save, sender=OAUser)
+def refresh_visibility_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'department', 'department_id'}.intersection(update_fields)):
+        return
+    if instance._previous_department_id == instance.department_id:
+        return
+    visibility.refresh_author(instance)
+
+
+# 新员工：分配已读位图的下标（bulk_create导入的员工在第一次用到时分配，见bitmaps.ensure_indexes）
+@receiver(post_save, sender=OAUser)
+def assign_bit_index_on_user_create(sender, instance, created, **kwargs):
+    if created:
+        UserBitIndex.objects.get_or_create(user=instance)
+
+
+# 通知删除：删除已读位图；删除后instance.id会被置为None，先取出来
+@receiver(post_delete, sender=Inform)
+def forget_bitmap_on_inform_delete(sender, instance, **kwargs):
+    inform_id = instance.id
+    transaction.on_commit(lambda: bitmaps.forget(inform_id))
@@ -0,0 +1,8 @@
+from OA_back import celery_app
+from .receipts import flush
+
+
+# 把缓冲区中的已读回执批量写入数据库：阅读通知时每秒最多投递一次，定时任务也会定期触发
+@celery_app.task(name='flush_receipts_task', ignore_result=True)
+def flush_receipts_task():
+    return flush()
@@ -1,3 +1,206 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from app.oaauth.authentications import generate_jwt
+from app.oaauth.models import OAUser, OAdepartment, UserStatusChoices
+from app.oaauth.principals import principal_cache
+from . import bitmaps, receipts
+from .models import Inform, InformRead, UserBitIndex
+
+# 测试不依赖Redis：principal、角标等缓存使用进程内缓存
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class InformTestCase(TestCase):
+    """
+    董事会：雷冥（leader）
+    销售部：琥珀（leader）、小明
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.board = OAdepartment.objects.create(name='董事会', intro='董事会')
+        cls.sales = OAdepartment.objects.create(name='销售部', intro='销售部')
+        cls.leiming = cls.create_user('leiming@qq.com', '雷冥', cls.board)
+        cls.hupo = cls.create_user('hupo@qq.com', '琥珀', cls.sales)
+        cls.xiaoming = cls.create_user('xiaoming@qq.com', '小明', cls.sales)
+        cls.board.leader = cls.leiming
+        cls.board.save()
+        cls.sales.leader = cls.hupo
+        cls.sales.manager = cls.leiming
+        cls.sales.save()
+
+    @staticmethod
+    def create_user(email, realname, department):
+        return OAUser.objects.create(email=email, realname=realname, department=department, status=UserStatusChoices.ACTIVED)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.local.clear()
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + generate_jwt(user))
+        return client
+
+    def create_inform(self, author, department_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(author).post('/api/inform/inform', {'title': '通知', 'content': '通知内容', 'department_ids': department_ids}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+
+class VisibilityTests(InformTestCase):
+
+    @staticmethod
+    def ids(response):
+        data = response.json()
+        return [inform['id'] for inform in (data['results'] if isinstance(data, dict) else data)]
+
+    def test_latest_excludes_own_only_informs(self):
+        # 琥珀发给董事会的通知：琥珀只通过作者行（'u{uid}'）能看到，通知列表中有，首页最新通知中没有（和原来一样）
+        inform_id = self.create_inform(self.hupo, [self.board.id])
+        self.assertIn(inform_id, self.ids(self.client_for(self.hupo).get('/api/inform/inform')))
+        self.assertNotIn(inform_id, self.ids(self.client_for(self.hupo).get('/api/home/latest/inform')))
+        self.assertIn(inform_id, self.ids(self.client_for(self.leiming).get('/api/home/latest/inform')))
+        self.assertNotIn(inform_id, self.ids(self.client_for(self.xiaoming).get('/api/home/latest/inform')))
+
+    def test_refresh_author_only_on_department_change(self):
+        with mock.patch('app.inform.visibility.refresh_author') as refresh_author:
+            self.hupo.realname = '琥珀2'
+            self.hupo.save()
+            refresh_author.assert_not_called()
+            self.hupo.department = self.board
+            self.hupo.save()
+            refresh_author.assert_called_once_with(self.hupo)
+
+
+class ReadInformTests(InformTestCase):
+
+    def read(self, user, inform_pk):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client_for(user).post('/api/inform/inform/read', {'inform_pk': inform_pk}, format='json')
+
+    def test_read(self):
+        inform_id = self.create_inform(self.leiming, [0])
+        self.assertEqual(self.read(self.xiaoming, inform_id).status_code, 200)
+        self.assertEqual(self.read(self.xiaoming, inform_id).status_code, 200)
+        self.assertEqual(InformRead.objects.filter(inform_id=inform_id).count(), 1)
+        self.assertEqual(Inform.objects.get(pk=inform_id).read_count, 1)
+
+    def test_read_missing_or_invisible_inform(self):
+        # 通知不存在、看不到：返回400，不写入已读标记
+        self.assertEqual(self.read(self.xiaoming, 999).status_code, 400)
+        self.assertFalse(receipts.has_read(999, self.xiaoming.uid))
+        inform_id = self.create_inform(self.leiming, [self.board.id])
+        self.assertEqual(self.read(self.xiaoming, inform_id).status_code, 400)
+        self.assertFalse(receipts.has_read(inform_id, self.xiaoming.uid))
+
+    def test_push_failure_clears_marker(self):
+        inform_id = self.create_inform(self.leiming, [0])
+        with mock.patch('app.inform.receipts.push', side_effect=ConnectionError('redis down')):
+            with self.assertRaises(ConnectionError):
+                receipts.record_read(inform_id, self.xiaoming.uid)
+        self.assertFalse(receipts.has_read(inform_id, self.xiaoming.uid))
+        self.assertTrue(receipts.record_read(inform_id, self.xiaoming.uid))
+
+    def test_release_only_own_flush_lock(self):
+        token = receipts._acquire_flush_lock(60)
+        self.assertIsNone(receipts._acquire_flush_lock(60))
+        # 锁超时后被另一个worker拿到：原来的worker不能删除别人的锁
+        cache.set(receipts.FLUSHING_KEY, 'other')
+        receipts._release_flush_lock(token)
+        self.assertEqual(cache.get(receipts.FLUSHING_KEY), 'other')
+        receipts._release_flush_lock('other')
+        self.assertIsNotNone(receipts._acquire_flush_lock(60))
+
+
+class ReadBitmapTests(InformTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 开发环境（缓存不是Redis）的位图在进程内，测试之间清空
+        bitmaps._local_bitmaps.clear()
+        self.addCleanup(bitmaps._local_bitmaps.clear)
+
+    def read(self, user, inform_pk):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(user).post('/api/inform/inform/read', {'inform_pk': inform_pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def unread(self, user, inform_id, **params):
+        return self.client_for(user).get(f'/api/inform/inform/{inform_id}/unread', params)
+
+    def test_pack(self):
+        # 高位在前，和Redis SETBIT的位序一致
+        self.assertEqual(bitmaps._pack([0, 9]), bytes([0x80, 0x40]))
+        self.assertEqual(list(np.flatnonzero(bitmaps._unpack(bitmaps._pack([3, 17])))), [3, 17])
+        self.assertEqual(bitmaps._pack([]), b'')
+
+    def test_unread(self):
+        inform_id = self.create_inform(self.leiming, [0])
+        self.read(self.xiaoming, inform_id)
+        response = self.unread(self.leiming, inform_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['read_count'], 1)
+        departments = {department['department_name']: department for department in response.json()['departments']}
+        self.assertEqual((departments['销售部']['total'], departments['销售部']['read']), (2, 1))
+        self.assertEqual(departments['销售部']['unread'], [{'uid': self.hupo.uid, 'realname': '琥珀'}])
+        self.assertEqual([user['uid'] for user in departments['董事会']['unread']], [self.leiming.uid])
+
+        # 部门leader只能看本部门，普通员工不能看
+        response = self.unread(self.hupo, inform_id)
+        self.assertEqual([department['department_name'] for department in response.json()['departments']], ['销售部'])
+        self.assertEqual(self.unread(self.xiaoming, inform_id).status_code, 403)
+
+    def test_mark_existing_bitmap(self):
+        # 位图已经生成：新的已读回执直接SETBIT，不重新生成
+        inform_id = self.create_inform(self.leiming, [self.sales.id])
+        self.assertEqual(bitmaps.read_count(inform_id), 0)
+        self.read(self.xiaoming, inform_id)
+        self.read(self.hupo, inform_id)
+        with mock.patch.object(bitmaps, 'build') as build:
+            self.assertEqual(bitmaps.read_count(inform_id), 2)
+            read, unread = bitmaps.split_department(inform_id, self.sales.id)
+            self.assertEqual((set(read), unread), ({self.xiaoming.uid, self.hupo.uid}, []))
+            build.assert_not_called()
+
+    def test_build_from_receipts(self):
+        # 位图还没有生成时跳过SETBIT，第一次读取时从InformRead生成；通知删除后位图也删除
+        inform_id = self.create_inform(self.leiming, [self.sales.id])
+        self.read(self.xiaoming, inform_id)
+        self.assertNotIn(inform_id, bitmaps._local_bitmaps)
+        self.assertEqual(bitmaps.split_department(inform_id, self.sales.id), ([self.xiaoming.uid], [self.hupo.uid]))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_for(self.leiming).delete(f'/api/inform/inform/{inform_id}')
+        self.assertNotIn(inform_id, bitmaps._local_bitmaps)
+
+    def test_users_without_index(self):
+        # bulk_create导入的员工没有下标，第一次用到时分配
+        users = OAUser.objects.bulk_create([
+            OAUser(email=f'staff{index}@qq.com', realname=f'员工{index}', department=self.sales, status=UserStatusChoices.ACTIVED)
+            for index in range(3)
+        ])
+        inform_id = self.create_inform(self.leiming, [self.sales.id])
+        InformRead.objects.create(inform_id=inform_id, user=users[1])
+        read, unread = bitmaps.split_department(inform_id, self.sales.id)
+        self.assertEqual(read, [users[1].uid])
+        self.assertEqual(set(unread), {self.hupo.uid, self.xiaoming.uid, users[0].uid, users[2].uid})
+        self.assertEqual(UserBitIndex.objects.filter(user__department=self.sales).count(), 5)
+
+    def test_rebuild(self):
+        first = self.create_inform(self.leiming, [0])
+        second = self.create_inform(self.leiming, [self.sales.id])
+        InformRead.objects.create(inform_id=first, user=self.xiaoming)
+        InformRead.objects.create(inform_id=first, user=self.hupo)
+        bitmaps._local_bitmaps[first] = bytearray(b'\xff')
+        self.assertEqual(bitmaps.rebuild(), 2)
+        self.assertEqual(bitmaps.read_count(first), 2)
+        self.assertEqual(bitmaps.read_count(second), 0)
@@ -1,55 +1,104 @@
 from rest_framework import viewsets
 from .models import Inform, InformRead
-from .serializer import InformSerializer,ReadInformSerializer
+from .serializer import InformSerializer,InformSummarySerializer,ReadInformSerializer
 from django.db.models import Q # 用于多个条件的并查
 from rest_framework.response import Response 
 from rest_framework import status # HTTP状态码
 from rest_framework.views import APIView # API视图
 from django.db.models import Prefetch # 预查询优化
+from utils.serializers import SparseFieldsViewMixin # 支持 ?fields=&expand= 裁剪字段和查询
+from django.db import transaction
+from app.home import badges # 首页角标计数
+from .visibility import visible_informs # 通知可见范围表
+from .receipts import has_read, record_read # 已读回执缓冲区
+from . import bitmaps # 已读位图
+from rest_framework.decorators import action
+from app.oaauth.models import OAdepartment, OAUser
 
 
-class InformViewSet(viewsets.ModelViewSet):  # 提供完整的 CRUD 接口（列表、详情、创建、更新、删除）。
+class InformViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):  # 提供完整的 CRUD 接口（列表、详情、创建、更新、删除）。
     queryset = Inform.objects.all()  # 获取所有通知
     serializer_class = InformSerializer  # 序列化器
+    cursor_ordering = ('-create_time', '-id')  # keyset分页（?cursor=）的排序，id保证排序唯一
 
     # 重写get_queryset方法，实现通知列表的过滤
     def get_queryset(self): 
+        if self.action == 'list':
+            # 列表只返回摘要：不查询正文content，作者姓名、是否已读在同一条SQL中查出（见InformSummarySerializer）
+            return InformSummarySerializer.setup_queryset(visible_informs(self.queryset, self.request.user), self.request.user)
         # 如果多个条件的并查，那么就需要用到Q函数
-        queryset = self.queryset.select_related('author').prefetch_related(Prefetch("reads", queryset=InformRead.objects.filter(user_id=self.request.user.uid)), 'departments').filter(Q(public=True) | Q(departments=self.request.user.department) | Q(author=self.request.user)).distinct()
-        #逻辑分析：
-        #使用 Q 对象实现 OR 逻辑（ | 表示 OR），三种条件满足其一即可显示。
-        # public = True	公开通知（所有人可见）
-        # departments = 用户部门	发送给特定部门的通知
-        # author = 当前用户	用户自己创建的通知
+        queryset = self.queryset.select_related('author__department').prefetch_related(Prefetch("reads", queryset=InformRead.objects.filter(user_id=self.request.user.uid)), 'departments')
+        # 可见范围：公开通知、发送给用户部门的通知、用户自己创建的通知
+        # 发布时已经展开写入可见范围表（见visibility.py），这里只按audience过滤，每条通知最多匹配一行，不需要OR和distinct()
+        queryset = visible_informs(queryset, self.request.user)
         
         # 性能优化：
         #select_related('author') - 预加载作者信息（避免 N+1 查询）
         #prefetch_related('departments') - 预加载部门信息
         #Prefetch("reads", ...) - 自定义预加载已读记录，只加载当前用户已读状态
-        # distinct() - 去重
 
         return queryset
         # for inform in queryset:
         #     inform.is_read = InformRead.objects.filter(inform=inform, user=self.request.user).exsits()
         # return queryset
 
+    def get_serializer_class(self):
+        # 列表返回摘要，详情、创建等返回完整的通知
+        if self.action == 'list':
+            return InformSummarySerializer
+        return super().get_serializer_class()
+
     # 重写检索方法，实现通知详情的扩展，返回通知详情时，额外添加已读人数 read_count。
     def retrieve(self, request, *args, **kwargs):
             instance = self.get_object() # 获取通知实例
             serializer = self.get_serializer(instance) # 获取序列化器
-            data=serializer.data # 获取序列化数据
-            data['read_count']=InformRead.objects.filter(inform_id=instance.id).count() # 获取已读记录数
-            return Response(data=data) # 返回数据
+            # 已读人数read_count是通知表中的字段（已读回执批量写入时累加），不需要再COUNT已读记录
+            return Response(data=serializer.data) # 返回数据
 
     # 只有通知的创建者才能删除自己的通知，其他用户无权限删除
     def destroy(self, request, *args, **kwargs):# 删除通知
         instance = self.get_object() # 获取通知实例
         if instance.author.uid == request.user.uid: # 判断当前用户是否是通知的创建者
-            self.perform_destroy(instance) # 删除通知实例
+            with transaction.atomic(): # 删除成功提交后再修改角标计数
+                badges.inform_deleted(instance)
+                self.perform_destroy(instance) # 删除通知实例
             return Response(status=status.HTTP_204_NO_CONTENT) # 返回204状态码
         else:
             return Response(status=status.HTTP_401_FORBIDDEN) # 返回401状态码
 
+    # 谁还没有读：GET /inform/inform/{id}/unread?department_id=2
+    # 按接收部门统计已读人数、未读员工（已读位图，见bitmaps.py）；通知作者和董事会可以看所有接收部门，部门leader只能看本部门
+    @action(detail=True, methods=['get'], url_path='unread')
+    def unread(self, request, pk=None):
+        inform = Inform.objects.filter(pk=pk).first()
+        if inform is None:
+            return Response({'detail': '通知不存在！'}, status=status.HTTP_404_NOT_FOUND)
+        scope = request.access_scope
+        if inform.public:
+            department_ids = list(OAdepartment.objects.values_list('id', flat=True))
+        else:
+            department_ids = list(inform.departments.values_list('id', flat=True))
+        if inform.author_id != request.user.uid and not scope.is_board:
+            if not scope.is_leader or scope.department_id not in department_ids:
+                return Response({'detail': '您没有权限查看！'}, status=status.HTTP_403_FORBIDDEN)
+            department_ids = [scope.department_id]
+        if request.query_params.get('department_id'):
+            department_ids = [department_id for department_id in department_ids if str(department_id) == request.query_params['department_id']]
+
+        data = bitmaps.load(inform.id)
+        departments = []
+        unread_uids = []
+        for department_id in department_ids:
+            read, unread = bitmaps.split_department(inform.id, department_id, data)
+            departments.append({'department_id': department_id, 'total': len(read) + len(unread), 'read': len(read), 'unread': unread})
+            unread_uids.extend(unread)
+        names = dict(OAdepartment.objects.filter(id__in=department_ids).values_list('id', 'name'))
+        realnames = dict(OAUser.objects.filter(uid__in=unread_uids).values_list('uid', 'realname'))
+        for department in departments:
+            department['department_name'] = names.get(department['department_id'])
+            department['unread'] = [{'uid': uid, 'realname': realnames.get(uid)} for uid in department['unread']]
+        return Response({'inform_id': inform.id, 'read_count': bitmaps.read_count(inform.id), 'departments': departments})
+
 # 用于用户标记通知为已读，已读则直接返回，未读则创建已读记录
 class ReadInformView(APIView):
     def post(self, request):
@@ -57,16 +106,14 @@ class ReadInformView(APIView):
         serializer = ReadInformSerializer(data=request.data)
         if serializer.is_valid():
             inform_pk = serializer.validated_data.get('inform_pk') # 获取通知的id
-            # 判断当前用户是否已读过该通知
-            if InformRead.objects.filter(inform_id=inform_pk, user_id=request.user.uid).exists():
-                return Response() #已读则直接返回
-            else:
-                try:
-                    # 创建已读记录
-                    InformRead.objects.create(inform_id=inform_pk, user_id=request.user.uid)
-                except Exception as e:
-                    print(e)
-                    return Response(status=status.HTTP_400_BAD_REQUEST)
+            # 已读标记去重后写入缓冲区，由Celery任务批量写入已读记录、累加已读人数（见receipts.py）
+            # 不再每次点击都插入一次；已经读过的直接返回，不查询数据库
+            if has_read(inform_pk, request.user.uid):
                 return Response()
+            # 第一次阅读：通知不存在或者看不到时和原来一样返回400，不写入已读标记
+            if not visible_informs(Inform.objects.filter(pk=inform_pk), request.user).exists():
+                return Response(data={'detail': '通知不存在！'}, status=status.HTTP_400_BAD_REQUEST)
+            record_read(inform_pk, request.user.uid)
+            return Response()
         else:
             return Response(data={'detail': list(serializer.errors.values())[0][0]}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
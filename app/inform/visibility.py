@@ -0,0 +1,127 @@
+#通知可见范围表（InformVisibility）：发布通知时按接收范围展开写入（fan-out on write）
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  公开通知   -> 'p' + 每个部门一行 'd{部门id}'                      │
+# │  部门通知   -> 每个接收部门一行 'd{部门id}'                        │
+# │  作者       -> 作者所在部门看不到这条通知时，再加一行 'u{作者uid}'   │
+# │                                                                 │
+# │  查询：audience = 'd{我的部门}'（没有部门用'p'），我发布过需要单独  │
+# │  可见的通知时再加上 'u{我的uid}'；每条通知对同一个员工最多匹配一行， │
+# │  不需要DISTINCT                                                  │
+# │  新建部门、作者换部门时由signals补写（见signals.py）                │
+# └─────────────────────────────────────────────────────────────────┘
+from django.db import transaction
+
+from app.oaauth.models import OAdepartment
+from .models import Inform, InformVisibility
+
+PUBLIC = InformVisibility.PUBLIC
+
+
+def department_audience(department_id):
+    return f'd{department_id}'
+
+
+def user_audience(uid):
+    return f'u{uid}'
+
+
+def _audiences(inform, department_ids, author_department_id):
+    """通知的所有audience；department_ids：部门通知为接收部门，公开通知为全部部门"""
+    audiences = [PUBLIC] if inform.public else []
+    audiences.extend(department_audience(department_id) for department_id in department_ids)
+    # 作者通过自己的部门（没有部门时通过'p'）已经能看到，就不需要作者行，避免查询时同一条通知匹配两行
+    visible = (PUBLIC if author_department_id is None else department_audience(author_department_id)) in audiences
+    if not visible:
+        audiences.append(user_audience(inform.author_id))
+    return audiences
+
+
+def _rows(inform, audiences):
+    return [InformVisibility(inform=inform, audience=audience, create_time=inform.create_time) for audience in audiences]
+
+
+def fan_out(inform, department_ids=(), author_department_id=None):
+    """发布通知后调用，返回通知的audience列表"""
+    if inform.public:
+        department_ids = OAdepartment.objects.values_list('id', flat=True)
+    audiences = _audiences(inform, department_ids, author_department_id)
+    InformVisibility.objects.bulk_create(_rows(inform, audiences), ignore_conflicts=True)
+    return audiences
+
+
+def viewer_audiences(user, include_own=True):
+    """当前员工能看到的audience；include_own=False时不包括只有自己能看到的（自己发布、自己部门看不到的）通知"""
+    audiences = [department_audience(user.department_id) if user.department_id else PUBLIC]
+    if not include_own:
+        return audiences
+    own = user_audience(user.uid)
+    # 一次索引查找：只有发布过"自己部门看不到"的通知的员工才需要多查一个audience
+    if InformVisibility.objects.filter(audience=own).exists():
+        audiences.append(own)
+    return audiences
+
+
+def visible_informs(queryset, user, include_own=True):
+    """
+    过滤出员工能看到的通知，按可见范围表中的发布时间倒序
+    只有一个audience时是 (audience, create_time) 索引上的一次范围扫描，LIMIT取到够数就停
+    """
+    audiences = viewer_audiences(user, include_own)
+    if len(audiences) == 1:
+        queryset = queryset.filter(visibility__audience=audiences[0])
+    else:
+        queryset = queryset.filter(visibility__audience__in=audiences)
+    return queryset.order_by('-visibility__create_time', '-visibility__inform_id')
+
+
+def add_department(department, chunk_size=1000):
+    """新建部门：能看到所有公开通知"""
+    audience = department_audience(department.id)
+    rows = []
+    for inform_id, create_time in Inform.objects.filter(public=True).values_list('id', 'create_time').iterator(chunk_size=chunk_size):
+        rows.append(InformVisibility(inform_id=inform_id, audience=audience, create_time=create_time))
+        if len(rows) >= chunk_size:
+            InformVisibility.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    InformVisibility.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def refresh_author(user):
+    """员工换部门：重新计算TA发布的通知是否需要作者行"""
+    informs = list(Inform.objects.filter(author_id=user.uid).prefetch_related('visibility'))
+    if not informs:
+        return
+    own = user_audience(user.uid)
+    mine = PUBLIC if user.department_id is None else department_audience(user.department_id)
+    add, remove = [], []
+    for inform in informs:
+        audiences = {row.audience for row in inform.visibility.all()}
+        needed = mine not in audiences
+        if needed and own not in audiences:
+            add.append(InformVisibility(inform=inform, audience=own, create_time=inform.create_time))
+        elif not needed and own in audiences:
+            remove.append(inform.id)
+    with transaction.atomic():
+        if remove:
+            InformVisibility.objects.filter(inform_id__in=remove, audience=own).delete()
+        InformVisibility.objects.bulk_create(add, ignore_conflicts=True)
+
+
+def rebuild(chunk_size=500):
+    """从通知表全量重建可见范围表，返回写入的行数"""
+    department_ids = list(OAdepartment.objects.values_list('id', flat=True))
+    count = 0
+    with transaction.atomic():
+        InformVisibility.objects.all().delete()
+        queryset = Inform.objects.select_related('author').prefetch_related('departments').order_by('id')
+        rows = []
+        for inform in queryset.iterator(chunk_size=chunk_size):
+            targets = department_ids if inform.public else [department.id for department in inform.departments.all()]
+            rows.extend(_rows(inform, _audiences(inform, targets, inform.author.department_id)))
+            if len(rows) >= chunk_size:
+                InformVisibility.objects.bulk_create(rows)
+                count += len(rows)
+                rows = []
+        InformVisibility.objects.bulk_create(rows)
+        count += len(rows)
+    return count
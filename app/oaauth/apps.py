@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OaauthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.oaauth'
+
+    def ready(self):
+        # 注册信号处理函数（缓存失效等）
+        from . import signals  # noqa: F401
@@ -5,6 +5,7 @@ from rest_framework.authentication import BaseAuthentication,get_authorization_h
 from rest_framework import exceptions#导入DRF的异常模块
 from jwt.exceptions import ExpiredSignatureError#导入JWT的过期签名异常
 from .models import OAUser#导入自定义用户模型
+from .principals import principal_cache#登录用户两级缓存
 
 def generate_jwt(user):#生成JWT token
     expire_time = time.time() + 60*60*24*7#设置过期时间为7天
@@ -55,7 +56,7 @@ class JWTAuthentication(BaseAuthentication):#JWT认证类，继承自DRF的BaseA
             userid = jwt_info.get('userid')#获取用户ID
             try:
                 #绑定当前user到request对象上
-                user = OAUser.objects.get(pk=userid)#根据用户ID获取用户对象
+                user = principal_cache.get(userid)#根据用户ID获取用户对象（优先走缓存）
                 setattr(request, 'user', user)#将用户对象绑定到请求对象上，语法为setattr(object, name, value)，其中object是要设置属性的对象，name是属性名，value是属性值
                 #等价于request.uer=user
                 return user, jwt_token#返回用户对象和token
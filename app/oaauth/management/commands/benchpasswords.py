@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from app.oaauth.passwords import make_passwords, get_workers
+
+
+#密码哈希基准测试：对比串行和进程池并行的吞吐量
+# python manage.py benchpasswords --count 500 --workers 8
+class Command(BaseCommand):
+    help = '对比串行和并行计算密码哈希的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='计算的密码数量')
+        parser.add_argument('--workers', type=int, default=None, help='并行的进程数，默认使用CPU核数')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        workers = options['workers'] or get_workers()
+        passwords = ['111111'] * count
+
+        start = time.perf_counter()
+        for password in passwords:
+            make_password(password)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hashed = make_passwords(passwords, workers=workers)
+        parallel = time.perf_counter() - start
+        assert len(set(hashed)) == count  # 每个哈希的盐都不一样
+
+        self.stdout.write(f'串行：{count}个密码 {serial:.2f}秒，{count / serial:.1f}个/秒')
+        self.stdout.write(f'并行（{workers}个进程）：{count}个密码 {parallel:.2f}秒，{count / parallel:.1f}个/秒')
+        self.stdout.write(f'加速比：{serial / parallel:.2f}x')
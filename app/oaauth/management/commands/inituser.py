@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from app.oaauth.models import OAUser,OAdepartment
+from app.oaauth.models import OAUser,OAdepartment,UserStatusChoices
+from app.staff.search import index_users
+from utils import refdata
 
 class Command(BaseCommand):
     def handle(self, *args, **options):
@@ -9,20 +11,36 @@ class Command(BaseCommand):
         saler = OAdepartment.objects.get(name='销售部')
         hr = OAdepartment.objects.get(name='人事部')
         finance = OAdepartment.objects.get(name='财务部')
-        #1.雷冥，属于董事会的leader,董事会的员工都为超级用户
-        leiming=OAUser.objects.create_superuser(email='leiming@qq.com',realname='雷冥',password='111111',department= boarder)
-        #2.雷夫，董事会的成员
-        leifu=OAUser.objects.create_superuser(email='leifu@qq.com',realname='雷夫',password='111111',department= boarder)
-        #3.闪闪，产品开发部的leader
-        shanshan=OAUser.objects.create_user(email='shanshan@qq.com',realname='闪闪',password='111111',department=developer)
-        #4.牢大，运营部的leader
-        laoda=OAUser.objects.create_user(email='laoda@qq.com',realname='牢大',password='111111',department=operator)
-        #5.冲田，人事部的leader
-        huanhuan=OAUser.objects.create_user(email='huanhuan@qq.com',realname='冲田',password='111111',department=hr)
-        #6.夏夏，财务部的leader
-        xiaxia=OAUser.objects.create_user(email='xiaxia@qq.com',realname='夏夏',password='111111',department=finance)
-        #7.琥珀，销售部的leader
-        hupo = OAUser.objects.create_user(email='hupo@qq.com', realname='琥珀', password='111111',department=saler)
+        #董事会的员工都为超级用户（已激活），其他员工和create_user一样默认未激活
+        def superuser(email, realname, department):
+            return OAUser(email=email, realname=realname, department=department, is_superuser=True, status=UserStatusChoices.ACTIVED)
+
+        def user(email, realname, department):
+            return OAUser(email=email, realname=realname, department=department)
+
+        users = [
+            #1.雷冥，属于董事会的leader
+            superuser('leiming@qq.com', '雷冥', boarder),
+            #2.雷夫，董事会的成员
+            superuser('leifu@qq.com', '雷夫', boarder),
+            #3.闪闪，产品开发部的leader
+            user('shanshan@qq.com', '闪闪', developer),
+            #4.牢大，运营部的leader
+            user('laoda@qq.com', '牢大', operator),
+            #5.冲田，人事部的leader
+            user('huanhuan@qq.com', '冲田', hr),
+            #6.夏夏，财务部的leader
+            user('xiaxia@qq.com', '夏夏', finance),
+            #7.琥珀，销售部的leader
+            user('hupo@qq.com', '琥珀', saler),
+        ]
+        #密码哈希批量计算（用户多时会用进程池并行），再一次性插入数据库
+        OAUser.objects.set_passwords(users, '111111')
+        OAUser.objects.bulk_create(users)
+        #bulk_create不会触发signal，手动建立员工搜索索引
+        index_users(users)
+        refdata.bump(refdata.DEPARTMENT_STAFF_COUNT)
+        leiming, leifu, shanshan, laoda, huanhuan, xiaxia, hupo = users
 
         #给部门制定leader和manager，雷冥分管产品开发部、运营部、销售部，而雷夫分管人事部和财务部。
         #董事会
@@ -1,4 +1,5 @@
 #全局登录检查中间件，用于在每个请求到达视图之前验证用户的登录状态：
+import logging
 from django.contrib.auth.models import AnonymousUser # 匿名用户类，用于表示未认证的用户
 from django.http import JsonResponse #返回JSON格式的Http响应
 from django.utils.deprecation import MiddlewareMixin
@@ -10,6 +11,8 @@ from django.conf import settings # Django设置模块
 from django.contrib.auth import get_user_model # 获取用户模型
 from rest_framework.status import HTTP_403_FORBIDDEN # HTTP 403状态码
 from django.shortcuts import reverse # 反向解析URL
+from .principals import principal_cache # 登录用户两级缓存
+from .scopes import AccessScope # 请求级别的访问范围
 # ┌─────────────────────────────────────────────────────────────────┐
 # │                       中间件职责                                  │
 # │                                                                 │
@@ -22,6 +25,8 @@ from django.shortcuts import reverse # 反向解析URL
 # └─────────────────────────────────────────────────────────────────┘
 
 
+logger = logging.getLogger(__name__)
+
 # 获取用户模型，这里重命名为 OAUser
 OAUser = get_user_model()
 
@@ -40,6 +45,7 @@ class LoginCheckMiddleware(MiddlewareMixin):
         if request.path in self.white_list or request.path.startswith('/api'+ settings.MEDIA_URL):
             request.user = AnonymousUser() #设置为匿名用户
             request.auth = None #无认证信息
+            request.access_scope = None #无访问范围
             return None #返回None，继续执行视图
         try:
             auth = get_authorization_header(request).split()  # 获取请求头中的授权信息并拆分
@@ -60,16 +66,17 @@ class LoginCheckMiddleware(MiddlewareMixin):
                 userid = jwt_info.get('userid')  # 获取用户ID
                 try:
                     # 绑定当前user到request对象上
-                    user = OAUser.objects.get(pk=userid)  # 根据用户ID获取用户对象
+                    user = principal_cache.get(userid)  # 根据用户ID获取用户对象（优先走缓存，已关联部门及leader/manager）
                     setattr(request, 'user', user)  # 将用户对象绑定到请求对象上，语法为setattr(object, name, value)，其中object是要设置属性的对象，name是属性名，value是属性值
                     request.user= user
                     request.auth= jwt_token
+                    request.access_scope = AccessScope(user)  # 认证通过后计算一次访问范围，视图中通过request.access_scope使用
                 except Exception:
                     msg = '用户不存在！'  # 用户不存在异常处理
                     raise exceptions.AuthenticationFailed(msg)  # 抛出认证失败异常
             except ExpiredSignatureError:
                 msg = "JWT Token已过期！"
                 raise exceptions.AuthenticationFailed(msg)
-        except Exception as e:
-            print(e)
+        except Exception:
+            logger.exception('login check failed: %s', request.path)
             return JsonResponse({'message': '请先登录！'}, status=HTTP_403_FORBIDDEN)
\ No newline at end of file
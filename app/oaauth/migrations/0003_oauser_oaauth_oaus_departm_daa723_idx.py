@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('oaauth', '0002_oadepartment_oauser_department'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='oauser',
+            index=models.Index(fields=['department', '-date_joined'], name='oaauth_oaus_departm_daa723_idx'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.contrib.auth.models import User, AbstractBaseUser,PermissionsMixin,
 # PermissionsMixin: 权限混合类，提供权限相关功能
 # BaseUserManager: 用户管理器基类
 from django.contrib.auth.hashers import make_password #密码加密相关的函数
+from .passwords import make_passwords #批量（多进程并行）计算密码哈希
 from shortuuidfield import ShortUUIDField #短UUID字段，全球唯一，用来当做主键替
 
 """
@@ -77,6 +78,17 @@ class OAUserManager(BaseUserManager):
 
         return self._create_user(realname, email, password, **extra_fields)
 
+    def set_passwords(self, users, password):
+        """
+        批量设置密码（还未保存的用户对象），多进程并行计算哈希
+        password可以是一个密码（所有用户相同），也可以是和users一一对应的密码列表
+        """
+        if isinstance(password, str):
+            password = [password] * len(users)
+        for user, hashed in zip(users, make_passwords(password)):
+            user.password = hashed
+        return users
+
 
 
 #重写User模型，改为OAUser
@@ -101,6 +113,12 @@ class OAUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email" #默认 USERNAME_FIELD = "username"；但我们项目中 email 才是唯一的，所以需要改为 USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["realname",'password']#定义创建用户时的必填字段；完整必填字段列表 = [USERNAME_FIELD] + REQUIRED_FIELDS= = ["email", "realname", "password"]
 
+    class Meta:
+        indexes = [
+            # 部门员工列表：按部门过滤，按加入时间倒序
+            models.Index(fields=['department', '-date_joined']),
+        ]
+
     def clean(self):#clean方法用于在保存模型之前对数据进行清理和验证
         super().clean()#调用父类的clean方法
         self.email = self.__class__.objects.normalize_email(self.email)#规范化邮箱
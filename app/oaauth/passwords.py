@@ -0,0 +1,85 @@
+#批量计算密码哈希：PBKDF2每次要几十毫秒CPU，批量创建用户时用进程池在多个CPU核上并行计算
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+logger = logging.getLogger(__name__)
+
+# 进程池在第一次需要并行计算时创建，之后整个进程共用同一个，不会每个请求都启动一批子进程
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    # 子进程是全新的Python进程（forkserver/spawn），需要重新初始化Django
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _get_context():
+    # 不能用fork：uWSGI的worker有多个线程，fork多线程的进程时，子进程可能卡死在其他线程持有的锁上（日志、数据库驱动、import锁）
+    # forkserver由一个干净的单线程服务进程fork出子进程；不支持forkserver的平台（Windows）用spawn
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def get_workers():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def _create_executor(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=_get_context(), initializer=_init_worker)
+
+
+def get_executor():
+    """进程内共用的进程池（进程退出时由concurrent.futures关闭）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _create_executor(get_workers())
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def make_passwords(raw_passwords, workers=None):
+    """
+    对一批明文密码计算哈希，返回的列表和传入的顺序一一对应
+    每个哈希都有自己的随机盐，即使明文相同也要分别计算
+    数量少于PASSWORD_HASH_PARALLEL_THRESHOLD时直接串行计算，避免进程间通信的开销
+    workers和PASSWORD_HASH_WORKERS不同时（例如benchpasswords）使用临时的进程池
+    """
+    raw_passwords = list(raw_passwords)
+    workers = workers or get_workers()
+    threshold = getattr(settings, 'PASSWORD_HASH_PARALLEL_THRESHOLD', 32)
+    if workers <= 1 or len(raw_passwords) < threshold:
+        return [make_password(password) for password in raw_passwords]
+
+    # 每个子进程一次领取一批，减少进程间通信的次数
+    chunksize = max(1, len(raw_passwords) // (workers * 4))
+    if workers != get_workers():
+        with _create_executor(workers) as executor:
+            return list(executor.map(make_password, raw_passwords, chunksize=chunksize))
+    executor = get_executor()
+    try:
+        return list(executor.map(make_password, raw_passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # 子进程异常退出：丢掉这个进程池（下次重新创建），这一批串行计算
+        logger.warning('password hash pool broken, hashing serially')
+        _reset_executor(executor)
+        return [make_password(password) for password in raw_passwords]
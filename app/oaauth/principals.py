@@ -0,0 +1,176 @@
+#登录用户（principal）两级缓存：进程内LRU + Redis(CACHES['default'])
+# ┌─────────────────────────────────────────────────────────────────┐
+# │   LoginCheckMiddleware ──→ principal_cache.get(userid)          │
+# │                               │                                 │
+# │                 ① 进程内LRU（带TTL）命中 ──→ 直接返回            │
+# │                               ↓ 未命中                          │
+# │                 ② Redis命中（key中带版本号）──→ 回填LRU并返回    │
+# │                               ↓ 未命中                          │
+# │                 ③ 查询数据库（一次性关联department/leader/manager）│
+# │                                                                 │
+# │   OAUser/OAdepartment保存时，通过signals递增版本号使缓存失效      │
+# │   每PRINCIPAL_CACHE_STATS_INTERVAL次读取输出一次命中率日志        │
+# └─────────────────────────────────────────────────────────────────┘
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+OAUser = get_user_model()
+
+# 用户对象需要一并加载的关联对象，视图中访问 user.department.leader 等不再触发额外查询
+PRINCIPAL_RELATED = (
+    'department__leader__department',
+    'department__manager__department',
+)
+
+
+class LocalLRUCache:
+    """进程内的LRU缓存，条目超过ttl秒后失效，线程安全"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)  # 最近使用的移到末尾
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)  # 淘汰最久未使用的条目
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class PrincipalCache:
+    """
+    登录用户缓存
+    - 全局版本号：部门（及部门leader/manager）变化时递增，所有用户缓存失效
+    - 用户版本号：某个用户自身变化时递增，只有该用户的缓存失效
+    """
+    global_version_key = 'principal:version'
+    user_version_key = 'principal:version:{uid}'
+    data_key = 'principal:{global_version}:{user_version}:{uid}'
+
+    def __init__(self):
+        self.local = LocalLRUCache(
+            maxsize=getattr(settings, 'PRINCIPAL_CACHE_LOCAL_SIZE', 2048),
+            ttl=getattr(settings, 'PRINCIPAL_CACHE_LOCAL_TTL', 10),
+        )
+        self.timeout = getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', 60 * 30)
+        self.stats_interval = getattr(settings, 'PRINCIPAL_CACHE_STATS_INTERVAL', 10000)
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            total = self.local_hits + self.remote_hits + self.misses
+        if self.stats_interval and total % self.stats_interval == 0:
+            logger.info('principal cache stats: %s', self.stats())
+
+    def _remote_key(self, uid):
+        user_version_key = self.user_version_key.format(uid=uid)
+        versions = cache.get_many([self.global_version_key, user_version_key])
+        return self.data_key.format(
+            global_version=versions.get(self.global_version_key, 0),
+            user_version=versions.get(user_version_key, 0),
+            uid=uid,
+        )
+
+    def get(self, uid):
+        """根据uid获取用户，用户不存在时抛出OAUser.DoesNotExist"""
+        # 1. 进程内缓存，存的是pickle后的字节，每次反序列化出新对象，避免多个线程共享同一个实例
+        payload = self.local.get(uid)
+        if payload is not None:
+            self._count('local_hits')
+            return pickle.loads(payload)
+
+        # 2. Redis缓存，Redis不可用时直接降级到数据库
+        remote_key = None
+        try:
+            remote_key = self._remote_key(uid)
+            payload = cache.get(remote_key)
+        except Exception as e:
+            logger.warning('principal cache unavailable: %s', e)
+        if payload is not None:
+            self._count('remote_hits')
+            self.local.set(uid, payload)
+            return pickle.loads(payload)
+
+        # 3. 数据库
+        self._count('misses')
+        user = OAUser.objects.select_related(*PRINCIPAL_RELATED).get(pk=uid)
+        payload = pickle.dumps(user)
+        if remote_key is not None:
+            try:
+                cache.set(remote_key, payload, self.timeout)
+            except Exception as e:
+                logger.warning('principal cache unavailable: %s', e)
+        self.local.set(uid, payload)
+        return user
+
+    def _bump(self, key):
+        try:
+            # add只在key不存在时生效，不存在等价于版本0，所以add成功也算一次递增
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+        except Exception as e:
+            logger.warning('principal cache unavailable: %s', e)
+
+    def invalidate_user(self, uid):
+        """某个用户变化：递增该用户的版本号"""
+        self._bump(self.user_version_key.format(uid=uid))
+        self.local.delete(uid)
+
+    def invalidate_all(self):
+        """部门变化：递增全局版本号"""
+        self._bump(self.global_version_key)
+        self.local.clear()
+
+    def stats(self):
+        """命中/未命中计数（当前进程）"""
+        with self._lock:
+            total = self.local_hits + self.remote_hits + self.misses
+            return {
+                'local_hits': self.local_hits,
+                'remote_hits': self.remote_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.local_hits + self.remote_hits) / total if total else 0.0,
+                'local_size': len(self.local),
+            }
+
+
+principal_cache = PrincipalCache()
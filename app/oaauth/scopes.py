@@ -0,0 +1,51 @@
+#请求级别的访问范围（access scope），登录检查中间件认证通过后计算一次，挂在 request.access_scope 上
+# 视图中不再重复写 user.department.name != "董事会"、user.department.leader.uid == user.uid 之类的判断
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# 董事会部门名称
+BOARD_DEPARTMENT_NAME = '董事会'
+
+
+class AccessScope:
+    """
+    当前用户的访问范围
+    - is_board：是否是董事会成员，董事会可以看到所有部门的数据
+    - is_leader：是否是所在部门的leader
+    - department_id：所在部门的id
+    - responder / responder_id：考勤审批人（董事会leader没有审批人），第一次使用时由审批路由表解析（app/absent/routing.py），
+      部门没有可以审批的人时抛出ResponderUnassigned
+    """
+
+    def __init__(self, user):
+        # user来自principal缓存，department/leader/manager都已经加载好了，这里不会产生查询
+        department = user.department
+        self.user_id = user.uid
+        self.department_id = user.department_id
+        self.is_board = department is not None and department.name == BOARD_DEPARTMENT_NAME
+        self.is_leader = department is not None and department.leader_id == user.uid
+
+    @cached_property
+    def responder(self):
+        # 路由表依赖本模块（董事会部门名称），这里再导入
+        from app.absent.routing import get_responder
+        return get_responder(self.user_id)
+
+    @cached_property
+    def responder_id(self):
+        return self.responder.uid if self.responder is not None else None
+
+    @property
+    def can_manage_staff(self):
+        """董事会成员或者部门leader才能管理员工"""
+        return self.is_board or self.is_leader
+
+    def q(self, field='department_id'):
+        """返回限定数据范围的Q对象，董事会不限制，其他人只能看到本部门的数据"""
+        if self.is_board:
+            return Q()
+        return Q(**{field: self.department_id})
+
+    def filter(self, queryset, field='department_id'):
+        """把访问范围应用到queryset上，field是queryset中表示部门id的字段"""
+        return queryset.filter(self.q(field))
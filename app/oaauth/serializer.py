@@ -1,4 +1,5 @@
 from rest_framework import serializers  # 导入序列化器模块
+from utils.serializers import SparseFieldsMixin  # 支持 ?fields=&expand= 裁剪返回的字段
 from .models import OAUser, UserStatusChoices, OAdepartment
 from rest_framework import exceptions  # 导入异常模块
 
@@ -39,7 +40,7 @@ class LoginSerializer(serializers.Serializer):
         return attrs  # 返回验证后的数据
 
 
-class DepartmentSerializer(serializers.ModelSerializer):#自动将OAdepartment模型转换为JSON
+class DepartmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):#自动将OAdepartment模型转换为JSON
     class Meta:  #告诉序列化器使用哪个模型、包含哪些字段
         model = OAdepartment  # 指定序列化器对应的模型类
         fields = "__all__"  # 指定要序列化的字段为所有字段
@@ -55,7 +56,7 @@ class DepartmentSerializer(serializers.ModelSerializer):#自动将OAdepartment
         
 
 
-class UserSerializer(serializers.ModelSerializer): 
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer): 
     department = DepartmentSerializer()  # 嵌套部门序列化器，在用户数据中包含部门详细信息
 
     class Meta:  # 元类，定义序列化器的元信息
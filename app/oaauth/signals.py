@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import OAUser, OAdepartment
+from .principals import principal_cache
+from utils import refdata
+
+# 登录用户缓存（见principals.py）只在缓存的数据真正变化时失效，版本号在事务提交后递增：
+# 回滚时不失效；提交前递增的话，其他请求会用还没提交的旧数据填充新版本的缓存
+# 用户的last_login每次登录都会更新，缓存的用户不使用这个字段，不算变化
+PRINCIPAL_IGNORED_FIELDS = ('last_login',)
+
+
+def principal_state(instance, ignored=()):
+    # 只取已经加载的字段（__dict__中），延迟加载的字段不会因此查询数据库
+    return {field.attname: instance.__dict__[field.attname]
+            for field in instance._meta.concrete_fields
+            if field.attname not in ignored and field.attname in instance.__dict__}
+
+
+def changed_fields(instance, ignored=()):
+    """和从数据库读出（或上次保存）时相比变化了的字段"""
+    old = getattr(instance, '_principal_state', None)
+    new = principal_state(instance, ignored)
+    instance._principal_state = new
+    if old is None:
+        return set(new)
+    return {name for name, value in new.items() if name not in old or old[name] != value}
+
+
+# 记下读出来时的字段值，保存时比较哪些字段变化了
+@receiver(post_init, sender=OAUser)
+def remember_user_state(sender, instance, **kwargs):
+    instance._principal_state = principal_state(instance, PRINCIPAL_IGNORED_FIELDS)
+
+
+@receiver(post_init, sender=OAdepartment)
+def remember_department_state(sender, instance, **kwargs):
+    instance._principal_state = principal_state(instance)
+
+
+# 用户保存：只有这个用户的缓存失效；如果是某个部门的leader或manager，其他用户缓存里的 department.leader/manager 也要失效
+# 新建的用户不会在缓存中，也不会是leader/manager；没有变化（比如只更新了last_login）就跳过，不查询部门表
+@receiver(post_save, sender=OAUser)
+def invalidate_principal_on_user_save(sender, instance, created, **kwargs):
+    changed = changed_fields(instance, PRINCIPAL_IGNORED_FIELDS)
+    if created or not changed:
+        return
+    uid = instance.uid
+    if OAdepartment.objects.filter(Q(leader_id=uid) | Q(manager_id=uid)).exists():
+        transaction.on_commit(principal_cache.invalidate_all)
+    else:
+        transaction.on_commit(lambda: principal_cache.invalidate_user(uid))
+
+
+# 用户删除时，部门的leader/manager会被数据库直接置空（不会触发部门的signal），所以全部失效
+@receiver(post_delete, sender=OAUser)
+def invalidate_principal_on_user_delete(sender, instance, **kwargs):
+    transaction.on_commit(principal_cache.invalidate_all)
+
+
+# 部门的名称、leader、manager等变化：所有用户缓存失效；新建的部门还没有员工，字段没有变化也跳过
+@receiver(post_save, sender=OAdepartment)
+def invalidate_principal_on_department_save(sender, instance, created, **kwargs):
+    changed = changed_fields(instance)
+    if created or not changed:
+        return
+    transaction.on_commit(principal_cache.invalidate_all)
+
+
+@receiver(post_delete, sender=OAdepartment)
+def invalidate_principal_on_department_delete(sender, instance, **kwargs):
+    transaction.on_commit(principal_cache.invalidate_all)
+
+
+# 基础数据缓存（见utils/refdata.py）：部门变化时部门列表、部门人数失效；员工新增、删除、换部门时部门人数失效
+refdata.watch(refdata.DEPARTMENTS, OAdepartment)
+refdata.watch(refdata.DEPARTMENT_STAFF_COUNT, OAdepartment)
+refdata.watch(refdata.DEPARTMENT_STAFF_COUNT, OAUser, fields=('department', 'department_id'))
+
+
+# 员工删除时，部门的leader/manager会被数据库直接置空（不会触发部门的signal），部门列表也要失效
+@receiver(post_delete, sender=OAUser)
+def bump_departments_on_user_delete(sender, instance, **kwargs):
+    refdata.bump(refdata.DEPARTMENTS)
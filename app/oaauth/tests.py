@@ -1,3 +1,131 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .authentications import generate_jwt
+from .middlewares import LoginCheckMiddleware
+from .models import OAUser, OAdepartment, UserStatusChoices
+from .principals import principal_cache
+from .scopes import AccessScope
+
+# 测试不依赖Redis：principal缓存使用进程内缓存
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OAuthTestCase(TestCase):
+    """
+    董事会：雷冥（leader）
+    销售部：琥珀（leader，由雷冥分管）、小明（普通员工）
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.board = OAdepartment.objects.create(name='董事会', intro='董事会')
+        cls.sales = OAdepartment.objects.create(name='销售部', intro='销售部')
+        cls.leiming = cls.create_user('leiming@qq.com', '雷冥', cls.board)
+        cls.hupo = cls.create_user('hupo@qq.com', '琥珀', cls.sales)
+        cls.xiaoming = cls.create_user('xiaoming@qq.com', '小明', cls.sales)
+        cls.board.leader = cls.leiming
+        cls.board.save()
+        cls.sales.leader = cls.hupo
+        cls.sales.manager = cls.leiming
+        cls.sales.save()
+
+    @staticmethod
+    def create_user(email, realname, department):
+        return OAUser.objects.create(email=email, realname=realname, department=department, status=UserStatusChoices.ACTIVED)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.local.clear()
+
+
+class LoginCheckMiddlewareTests(OAuthTestCase):
+
+    def process_view(self, request):
+        return LoginCheckMiddleware(lambda request: None).process_view(request, None, (), {})
+
+    def test_access_scope(self):
+        # 访问范围挂在request.access_scope上，不会覆盖ASGI请求的scope
+        request = RequestFactory().get('/api/absent/responder', HTTP_AUTHORIZATION='JWT ' + generate_jwt(self.hupo))
+        asgi_scope = request.scope = {'type': 'http'}
+        self.assertIsNone(self.process_view(request))
+        self.assertIs(request.scope, asgi_scope)
+        self.assertIsInstance(request.access_scope, AccessScope)
+        self.assertTrue(request.access_scope.is_leader)
+        self.assertEqual(request.user.uid, self.hupo.uid)
+
+    def test_invalid_token(self):
+        request = RequestFactory().get('/api/absent/responder', HTTP_AUTHORIZATION='JWT invalid')
+        with self.assertLogs('app.oaauth.middlewares', 'ERROR'):
+            response = self.process_view(request)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(hasattr(request, 'access_scope'))
+
+
+class PrincipalInvalidationTests(OAuthTestCase):
+
+    def versions(self, uid):
+        keys = [principal_cache.global_version_key, principal_cache.user_version_key.format(uid=uid)]
+        values = cache.get_many(keys)
+        return tuple(values.get(key, 0) for key in keys)
+
+    def test_unchanged_user(self):
+        # 只更新了last_login、或者没有任何变化：不查询部门表，缓存不失效
+        user = OAUser.objects.get(pk=self.xiaoming.uid)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                user.last_login = timezone.now()
+                user.save(update_fields=['last_login'])
+            user.save()
+        self.assertEqual(self.versions(user.uid), (0, 0))
+
+    def test_user_changed_after_commit(self):
+        user = OAUser.objects.get(pk=self.xiaoming.uid)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.realname = '小明明'
+            user.save()
+            self.assertEqual(self.versions(user.uid), (0, 0))
+        self.assertEqual(self.versions(user.uid), (0, 1))
+
+        # 回滚了就不失效
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    user.realname = '小明'
+                    user.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(self.versions(user.uid), (0, 1))
+
+    def test_leader_changed(self):
+        # leader的数据在其他用户的缓存中（department.leader），全部失效
+        leader = OAUser.objects.get(pk=self.hupo.uid)
+        with self.captureOnCommitCallbacks(execute=True):
+            leader.telephone = '13800000000'
+            leader.save()
+        self.assertEqual(self.versions(self.xiaoming.uid), (1, 0))
+
+    def test_department_changed(self):
+        department = OAdepartment.objects.get(pk=self.sales.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            department.save()
+        self.assertEqual(self.versions(self.xiaoming.uid), (0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            department.leader = self.xiaoming
+            department.save()
+        self.assertEqual(self.versions(self.xiaoming.uid), (1, 0))
+        # 缓存中的用户是修改后的数据
+        self.assertEqual(principal_cache.get(self.xiaoming.uid).department.leader_id, self.xiaoming.uid)
+
+    def test_stats_log(self):
+        principal_cache.get(self.xiaoming.uid)
+        with mock.patch.object(principal_cache, 'stats_interval', 1):
+            with self.assertLogs('app.oaauth.principals', 'INFO') as logs:
+                principal_cache.get(self.xiaoming.uid)
+        self.assertIn("'local_hits'", logs.output[0])
@@ -91,7 +91,7 @@ class Login(APIView):
 
             #记录登录时间
             user.last_login=datetime.now()#更新最后登录时间为当前时间
-            user.save()#保存用户对象
+            user.save(update_fields=['last_login'])#只更新last_login字段，不会触发搜索索引重建等
             #Django的ORM在调用.save()时，会执行UPDATE语句更新数据库中的last_login字段。
 
             token=generate_jwt(user)#生成JWT token
@@ -141,7 +141,7 @@ class ResetPwdView(APIView):
 
             # 设置新密码并保存用户
             request.user.set_password(pwd1) #Django内置用户模型 AbstractBaseUser 提供的方法，会自动加密新密码
-            request.user.save()
+            request.user.save(update_fields=['password'])
 
             return Response({
                 'message': '密码修改成功',
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StaffConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app.staff'
+
+    def ready(self):
+        # 注册signal：员工保存后同步搜索索引
+        from . import signals  # noqa: F401
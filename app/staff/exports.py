@@ -0,0 +1,233 @@
+#导出：分块从数据库读取，逐行写入CSV/XLSX，内存占用不随行数增长
+# CSV逐行流式返回；XLSX是zip格式，要整个文件写完才能生成，所以先写入磁盘上的临时文件，再分块返回
+import csv
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse, FileResponse
+from openpyxl import Workbook
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from app.absent.models import Absent
+from app.oaauth.principals import principal_cache
+from app.oaauth.scopes import AccessScope
+from .models import ExportJob, ExportStatusChoices
+
+OAUser = get_user_model()
+
+# 支持的导出格式
+EXPORT_FORMATS = ('xlsx', 'csv')
+
+# 员工导出的列：(values字段, 表头)
+STAFF_EXPORT_COLUMNS = (
+    ('realname', '姓名'),
+    ('email', '邮箱'),
+    ('department__name', '部门'),
+    ('date_joined', '入职日期'),
+    ('status', '状态'),
+)
+
+# 考勤导出的列
+ABSENT_EXPORT_COLUMNS = (
+    ('title', '标题'),
+    ('requester__realname', '发起人'),
+    ('requester__department__name', '部门'),
+    ('absent_type__name', '请假类型'),
+    ('start_date', '开始日期'),
+    ('end_date', '结束日期'),
+    ('status', '状态'),
+    ('responder__realname', '审批人'),
+    ('create_time', '发起时间'),
+)
+
+CONTENT_TYPES = {
+    'xlsx': 'application/xlsx',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def get_export_root():
+    return str(getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports')))
+
+
+def export_path(job):
+    """导出任务文件的绝对路径，job.file是相对于EXPORT_ROOT的文件名"""
+    return os.path.join(get_export_root(), job.file)
+
+
+def get_chunk_size():
+    # 每次从数据库读取的行数
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def iter_rows(queryset, columns, chunk_size=None):
+    """按块读取queryset，逐行返回元组，不会一次性把所有数据加载到内存"""
+    fields = [field for field, _ in columns]
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size or get_chunk_size())
+
+
+class Echo:
+    """csv.writer需要一个有write方法的对象，这里直接把写入的内容返回，交给StreamingHttpResponse"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, headers):
+    writer = csv.writer(Echo())
+    # 带BOM，Excel打开中文不乱码
+    yield '\ufeff' + writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(rows, headers, fp, sheet_name):
+    """write_only模式的workbook，行数据直接刷到临时文件，不会在内存中保留整张表"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fp)
+
+
+def write_csv(rows, headers, fp):
+    for line in iter_csv(rows, headers):
+        fp.write(line)
+
+
+def export_response(rows, columns, export_format, filename, sheet_name):
+    """根据导出格式返回响应（CSV流式返回，XLSX写完临时文件后分块返回），filename不带扩展名"""
+    headers = [header for _, header in columns]
+    if export_format == 'csv':
+        response = StreamingHttpResponse(iter_csv(rows, headers), content_type=CONTENT_TYPES['csv'])
+    else:
+        # xlsx本质是zip，需要先写到临时文件中，再分块返回给客户端（FileResponse结束后会关闭并删除临时文件）
+        fp = tempfile.TemporaryFile()
+        write_xlsx(rows, headers, fp, sheet_name)
+        fp.seek(0)
+        response = FileResponse(fp, content_type=CONTENT_TYPES['xlsx'])
+    response['Content-Disposition'] = f"attachment; filename={filename}.{export_format}"
+    return response
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """?format=csv|xlsx 表示导出文件的格式，不能交给DRF当成渲染格式处理（否则DRF找不到渲染器会返回404）"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+# ┌─────────────────────────────────────────────────────────────────┐
+# │                        异步导出任务                               │
+# │                                                                 │
+# │   POST /staff/export ──→ 创建ExportJob ──→ export_job_task.delay │
+# │   GET  /staff/export/<uid> ──→ 轮询进度（processed/total）        │
+# │   DELETE /staff/export/<uid> ──→ 取消（worker每处理一块检查一次）  │
+# │   GET  /staff/export/<uid>/download ──→ 下载EXPORT_ROOT下的文件   │
+# │   导出文件不放在MEDIA_ROOT下：/api/media/不需要登录，任何人拿到     │
+# │   链接都能下载；只能通过下载接口（校验任务创建者）下载              │
+# └─────────────────────────────────────────────────────────────────┘
+
+def staff_export_queryset(scope, params):
+    queryset = scope.filter(OAUser.objects)
+    if params.get('pks') is not None:
+        queryset = queryset.filter(pk__in=params['pks'])
+    return queryset.order_by('-date_joined')
+
+
+def absent_export_queryset(scope, params):
+    queryset = scope.filter(Absent.objects, 'requester__department_id')
+    # 导出与日期范围有重叠的考勤
+    if params.get('start_date'):
+        queryset = queryset.filter(end_date__gte=params['start_date'])
+    if params.get('end_date'):
+        queryset = queryset.filter(start_date__lte=params['end_date'])
+    return queryset.order_by('-create_time')
+
+
+# 导出类型 -> (列, 文件名, queryset函数)
+EXPORT_KINDS = {
+    'staff': (STAFF_EXPORT_COLUMNS, '员工信息', staff_export_queryset),
+    'absent': (ABSENT_EXPORT_COLUMNS, '考勤信息', absent_export_queryset),
+}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def track_progress(job_uid, rows, step):
+    """每导出step行更新一次进度，如果任务已经被取消（状态不再是RUNNING），抛出ExportCancelled"""
+    processed = 0
+    for row in rows:
+        yield row
+        processed += 1
+        if processed % step == 0:
+            if not ExportJob.objects.filter(pk=job_uid, status=ExportStatusChoices.RUNNING).update(processed=processed):
+                raise ExportCancelled()
+
+
+def run_export_job(job_uid):
+    """Celery worker中执行的导出逻辑"""
+    # 只有PENDING的任务才能开始执行，同时也避免同一个任务被执行两次
+    if not ExportJob.objects.filter(pk=job_uid, status=ExportStatusChoices.PENDING).update(status=ExportStatusChoices.RUNNING):
+        return
+    job = ExportJob.objects.get(pk=job_uid)
+    columns, filename, get_queryset = EXPORT_KINDS[job.kind]
+    relative_path = f'{job.uid}.{job.export_format}'
+    path = os.path.join(get_export_root(), relative_path)
+    try:
+        # 按任务创建者的访问范围导出
+        scope = AccessScope(principal_cache.get(job.owner_id))
+        queryset = get_queryset(scope, job.params)
+        total = queryset.count()
+        ExportJob.objects.filter(pk=job_uid).update(total=total)
+
+        chunk_size = get_chunk_size()
+        rows = track_progress(job_uid, iter_rows(queryset, columns, chunk_size), chunk_size)
+        headers = [header for _, header in columns]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if job.export_format == 'csv':
+            with open(path, 'w', encoding='utf-8', newline='') as fp:
+                write_csv(rows, headers, fp)
+        else:
+            with open(path, 'wb') as fp:
+                write_xlsx(rows, headers, fp, sheet_name=filename)
+    except ExportCancelled:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
+        ExportJob.objects.filter(pk=job_uid).update(status=ExportStatusChoices.FAILED, error=str(e), finish_time=datetime.now())
+        raise
+
+    now = datetime.now()
+    updated = ExportJob.objects.filter(pk=job_uid, status=ExportStatusChoices.RUNNING).update(
+        status=ExportStatusChoices.SUCCESS,
+        processed=total,
+        file=relative_path,
+        finish_time=now,
+        expire_time=now + timedelta(seconds=getattr(settings, 'EXPORT_FILE_TTL', 60 * 60 * 24)),
+    )
+    # 最后一块导出期间被取消了
+    if not updated and os.path.exists(path):
+        os.remove(path)
+
+
+def cleanup_export_jobs():
+    """删除过期的导出文件，返回清理的任务数量"""
+    jobs = ExportJob.objects.filter(status=ExportStatusChoices.SUCCESS, expire_time__lt=datetime.now())
+    count = 0
+    for job in jobs.iterator():
+        path = export_path(job)
+        if job.file and os.path.exists(path):
+            os.remove(path)
+        count += ExportJob.objects.filter(pk=job.uid, status=ExportStatusChoices.SUCCESS).update(status=ExportStatusChoices.EXPIRED, file='')
+    return count
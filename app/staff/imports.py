@@ -0,0 +1,138 @@
+#员工批量导入：整张表一次性校验（向量化），再分批写入数据库
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  1. 统一列名、清洗数据（去空格、空值）                            │
+# │  2. 所有部门名称一次IN查询                                       │
+# │  3. 文件内重复邮箱 + 数据库中已存在邮箱（一次IN查询）             │
+# │  4. 汇总每一行的错误，整张表都没有错误才写入                      │
+# │  5. bulk_create(batch_size=...) 分批插入                         │
+# └─────────────────────────────────────────────────────────────────┘
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from app.oaauth.models import OAdepartment, UserStatusChoices
+from .search import index_users
+from utils import refdata
+
+OAUser = get_user_model()
+
+# Excel表头 -> 内部字段名
+STAFF_IMPORT_COLUMNS = {
+    '姓名': 'realname',
+    '邮箱': 'email',
+    '部门': 'department',
+}
+
+# 导入员工的默认密码
+DEFAULT_PASSWORD = '111111'
+
+# 和前端、Django的EmailValidator保持大致一致的邮箱格式校验
+EMAIL_PATTERN = r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9\-]+(\.[A-Za-z0-9\-]+)+"
+
+
+class StaffImportResult:
+    def __init__(self, users=None, errors=None, detail=''):
+        self.users = users or []
+        # [{'row': Excel中的行号, 'email': 邮箱, 'errors': [错误信息, ...]}, ...]
+        self.errors = errors or []
+        self.detail = detail
+
+    @property
+    def ok(self):
+        return not self.errors and not self.detail
+
+
+def normalize_frame(staff_df):
+    """统一列名，所有值转成去掉首尾空格的字符串，空值变成空字符串"""
+    staff_df = staff_df.rename(columns=lambda column: str(column).strip())
+    staff_df = staff_df.rename(columns=STAFF_IMPORT_COLUMNS)
+    for column in STAFF_IMPORT_COLUMNS.values():
+        if column in staff_df.columns:
+            staff_df[column] = staff_df[column].fillna('').astype(str).str.strip()
+    return staff_df
+
+
+def validate_frame(staff_df, scope, current_user):
+    """
+    校验整张表，返回StaffImportResult
+    scope：当前用户的访问范围，非董事会只能导入本部门的员工
+    """
+    required = ['realname', 'email'] + (['department'] if scope.is_board else [])
+    missing = [header for header, column in STAFF_IMPORT_COLUMNS.items() if column in required and column not in staff_df.columns]
+    if missing:
+        return StaffImportResult(detail=f"{'、'.join(missing)}列不存在！")
+    if staff_df.empty:
+        return StaffImportResult(detail='文件中没有员工数据！')
+
+    # 每一行的错误信息，key是DataFrame的index
+    row_errors = {}
+
+    def add_errors(mask, message):
+        for index in staff_df.index[mask]:
+            row_errors.setdefault(index, []).append(message)
+
+    realname = staff_df['realname']
+    add_errors(realname == '', '姓名不能为空！')
+    add_errors(realname.str.len() > OAUser._meta.get_field('realname').max_length, '姓名太长！')
+
+    email = staff_df['email']
+    add_errors(email == '', '邮箱不能为空！')
+    add_errors((email != '') & ~email.str.fullmatch(EMAIL_PATTERN), '邮箱格式错误！')
+
+    # 文件内重复的邮箱（不区分大小写）
+    email_key = email.str.lower()
+    add_errors((email != '') & email_key.duplicated(keep=False), '文件中邮箱重复！')
+
+    # 数据库中已经存在的邮箱，一次查询
+    existed = {value.lower() for value in OAUser.objects.filter(email__in=email[email != ''].unique().tolist()).values_list('email', flat=True)}
+    add_errors(email_key.isin(existed), '该邮箱已存在！')
+
+    # 部门：董事会可以导入到任意部门，所有部门名称一次查询；其他人只能导入到本部门
+    # 部门名称没有唯一约束，同名的部门有多个时无法确定导入到哪个部门，这些行报错
+    departments = {}
+    if scope.is_board:
+        names = staff_df['department']
+        ambiguous = set()
+        for department in OAdepartment.objects.filter(name__in=names[names != ''].unique().tolist()):
+            if department.name in departments:
+                ambiguous.add(department.name)
+            departments[department.name] = department
+        add_errors(names == '', '部门不能为空！')
+        add_errors((names != '') & ~names.isin(list(departments)), '部门不存在！')
+        add_errors(names.isin(list(ambiguous)), '存在多个同名部门，无法确定导入到哪个部门！')
+
+    def department_of(row):
+        if scope.is_board:
+            return departments[row.department]
+        return current_user.department
+
+    if row_errors:
+        errors = [
+            # DataFrame的index从0开始，Excel第1行是表头，所以行号是index+2
+            {'row': int(index) + 2, 'email': staff_df.at[index, 'email'], 'errors': messages}
+            for index, messages in sorted(row_errors.items())
+        ]
+        return StaffImportResult(errors=errors)
+
+    users = []
+    for row in staff_df.itertuples(index=False):
+        users.append(OAUser(email=row.email, realname=row.realname, department=department_of(row), status=UserStatusChoices.UNACTIVE))
+    return StaffImportResult(users=users)
+
+
+def import_staff(file, scope, current_user):
+    """读取Excel并导入员工，有任何一行错误都不会写入数据库"""
+    staff_df = normalize_frame(pd.read_excel(file, dtype=str))
+    result = validate_frame(staff_df, scope, current_user)
+    if result.ok:
+        # 密码哈希很耗CPU，用进程池并行计算（在事务外面，避免长时间占用事务）
+        OAUser.objects.set_passwords(result.users, DEFAULT_PASSWORD)
+        # 原子操作（事务），分批插入，避免生成过大的SQL
+        with transaction.atomic():
+            OAUser.objects.bulk_create(result.users, batch_size=getattr(settings, 'STAFF_IMPORT_BATCH_SIZE', 500))
+            # bulk_create不会触发signal，手动建立搜索索引
+            index_users(result.users)
+            # 部门人数变化，缓存失效（事务提交后）
+            refdata.bump(refdata.DEPARTMENT_STAFF_COUNT)
+    return result
@@ -0,0 +1,87 @@
+#批量发送激活邮件：每个worker只建立一次SMTP连接（TLS握手），每封邮件失败单独重试（不会重发已经发出的邮件），并限制发送速率
+import logging
+import time
+from urllib import parse
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from utils import aeser
+
+logger = logging.getLogger(__name__)
+
+aes = aeser.AESCipher(settings.SECRET_KEY)  # 创建AES对象
+
+ACTIVE_EMAIL_SUBJECT = 'XHC-OA账号激活'
+
+
+def build_active_content(email, active_url, token=None):
+    """
+    构造激活邮件的主题和正文，返回 (subject, message)
+    active_url：激活页面的完整地址（不带token），例如 http://127.0.0.1:8000/api/staff/active
+    token：加密后的邮箱，不传时重新生成（每次加密的结果都不同）
+    """
+    # 为了区分用户，链接中带上加密后的邮箱
+    token = token or aes.encrypt(email)
+    url = active_url + '?' + parse.urlencode({'token': token})
+    return ACTIVE_EMAIL_SUBJECT, f'请点击激活链接激活账号：{url}'
+
+
+def build_active_message(email, active_url):
+    """构造激活邮件"""
+    subject, message = build_active_content(email, active_url)
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
+
+
+def send_message(connection, message, max_retries=0, retry_delay=0):
+    """
+    通过connection发送一封邮件，失败后重新建立连接再重试，返回是否发送成功
+    每次只发送一封：一批中间失败时，不知道前面哪些已经发出去了，整批重试会给已经收到的人重复发送
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            # 显式打开连接，send_messages就不会在发送完后关闭连接
+            connection.open()
+            return bool(connection.send_messages([message]))
+        except Exception as e:
+            # 出错后连接可能已经不可用，关闭后下一次重新建立
+            connection.close()
+            if attempt == max_retries:
+                logger.error('send active email failed: %s, %s', message.to, e)
+            else:
+                time.sleep(retry_delay * 2 ** attempt)
+    return False
+
+
+def send_active_emails(emails, active_url, connection=None):
+    """
+    通过同一个SMTP连接发送激活邮件，返回 (发送成功数量, 发送失败的邮箱列表)
+    - ACTIVE_EMAIL_CHUNK_SIZE：每块的邮件数量（按块限速）
+    - ACTIVE_EMAIL_MAX_RETRIES：每封邮件失败后的重试次数（重新建立连接后只重发这一封）
+    - ACTIVE_EMAIL_RATE_LIMIT：每秒最多发送的邮件数量，0表示不限制
+    """
+    chunk_size = getattr(settings, 'ACTIVE_EMAIL_CHUNK_SIZE', 100)
+    max_retries = getattr(settings, 'ACTIVE_EMAIL_MAX_RETRIES', 3)
+    retry_delay = getattr(settings, 'ACTIVE_EMAIL_RETRY_DELAY', 5)
+    rate_limit = getattr(settings, 'ACTIVE_EMAIL_RATE_LIMIT', 0)
+
+    connection = connection or get_connection()
+    sent = 0
+    failed = []
+    try:
+        for start in range(0, len(emails), chunk_size):
+            chunk = emails[start:start + chunk_size]
+            chunk_start = time.monotonic()
+            for email in chunk:
+                if send_message(connection, build_active_message(email, active_url), max_retries, retry_delay):
+                    sent += 1
+                else:
+                    failed.append(email)
+            # 限速：这一块至少要花 len(chunk)/rate_limit 秒
+            if rate_limit:
+                wait = len(chunk) / rate_limit - (time.monotonic() - chunk_start)
+                if wait > 0:
+                    time.sleep(wait)
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,100 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from app.absent.models import Absent, AbsentType
+from app.inform import visibility
+from app.inform.models import Inform
+from app.oaauth.models import OAUser, OAdepartment
+from utils.paginations import KeysetPagination
+
+
+#分页基准测试：对比页码分页和keyset分页在第1页、第N页的耗时
+# python manage.py benchpagination --page 500 --size 10 --seed 6000
+class Command(BaseCommand):
+    help = '对比页码分页和keyset分页第1页与第N页的耗时'
+
+    # 列表 -> (queryset, keyset排序)，和对应视图的cursor_ordering保持一致
+    LISTS = {
+        'staff': (lambda: OAUser.objects.all(), ('-date_joined', '-uid')),
+        'absent': (lambda: Absent.objects.all(), ('-create_time', '-id')),
+        # 通知列表按可见范围表过滤（见app/inform/visibility.py），这里用没有部门的员工能看到的公开通知
+        'inform': (lambda: Inform.objects.filter(visibility__audience=visibility.PUBLIC), ('-create_time', '-id')),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=500, help='对比的页码')
+        parser.add_argument('--size', type=int, default=10, help='每页数量')
+        parser.add_argument('--repeat', type=int, default=5, help='每种情况重复次数，取中位数')
+        parser.add_argument('--seed', type=int, default=0, help='临时生成的员工/考勤/通知数量，测试结束后回滚')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            for name, (queryset, ordering) in self.LISTS.items():
+                self.bench(name, queryset, ordering, options['page'], options['size'], options['repeat'])
+            # 临时数据不保存
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        department = OAdepartment.objects.first()
+        absent_type = AbsentType.objects.first() or AbsentType.objects.create(name='事假')
+        users = OAUser.objects.bulk_create([
+            OAUser(email=f'bench{i}@bench.local', realname=f'bench{i}', password='!', department=department)
+            for i in range(count)
+        ], batch_size=1000)
+        Absent.objects.bulk_create([
+            Absent(title='bench', request_content='bench', absent_type=absent_type, requester=user,
+                   start_date='2024-01-01', end_date='2024-01-02')
+            for user in users
+        ], batch_size=1000)
+        Inform.objects.bulk_create([Inform(title='bench', content='bench', public=True, author=user) for user in users], batch_size=1000)
+        # bulk_create不会写入可见范围表，重建一次（和临时数据一起回滚）
+        visibility.rebuild()
+
+    def fetch(self, queryset, ordering, size, params):
+        request = Request(APIRequestFactory().get('/bench', params))
+        paginator = KeysetPagination()
+        paginator.page_size = size
+        # 页码分页使用和keyset分页相同的排序
+        results = paginator.paginate_queryset(queryset().order_by(*ordering), request, view=SimpleNamespace(cursor_ordering=ordering))
+        return paginator, results
+
+    def timed(self, repeat, func):
+        costs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            costs.append((time.perf_counter() - start) * 1000)
+        return statistics.median(costs)
+
+    def bench(self, name, queryset, ordering, page, size, repeat):
+        total = queryset().count()
+        if total <= (page - 1) * size:
+            self.stdout.write(f'{name}：只有{total}条数据，不够{page}页，可以用--seed生成临时数据')
+            return
+
+        # 页码分页：COUNT(*) + OFFSET
+        page_first = self.timed(repeat, lambda: self.fetch(queryset, ordering, size, {'page': 1}))
+        page_last = self.timed(repeat, lambda: self.fetch(queryset, ordering, size, {'page': page}))
+
+        # keyset分页：先一页一页地翻到第page页拿到游标（不计时），再计时取这一页
+        cursor = ''
+        for _ in range(page - 1):
+            paginator, _ = self.fetch(queryset, ordering, size, {'cursor': cursor, 'count': 0})
+            cursor = paginator.next_cursor
+        cursor_first = self.timed(repeat, lambda: self.fetch(queryset, ordering, size, {'cursor': ''}))
+        cursor_last = self.timed(repeat, lambda: self.fetch(queryset, ordering, size, {'cursor': cursor}))
+        nocount_first = self.timed(repeat, lambda: self.fetch(queryset, ordering, size, {'cursor': '', 'count': 0}))
+        nocount_last = self.timed(repeat, lambda: self.fetch(queryset, ordering, size, {'cursor': cursor, 'count': 0}))
+
+        self.stdout.write(f'{name}（{total}条，每页{size}条）')
+        self.stdout.write(f'  页码分页          第1页 {page_first:.2f}ms  第{page}页 {page_last:.2f}ms')
+        self.stdout.write(f'  keyset分页        第1页 {cursor_first:.2f}ms  第{page}页 {cursor_last:.2f}ms')
+        self.stdout.write(f'  keyset分页不计总数 第1页 {nocount_first:.2f}ms  第{page}页 {nocount_last:.2f}ms')
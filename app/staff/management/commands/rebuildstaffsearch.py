@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from app.staff.search import rebuild_index
+
+
+#重建员工搜索索引（上线搜索功能、或者直接改过数据库之后执行）
+# python manage.py rebuildstaffsearch
+class Command(BaseCommand):
+    help = '重建员工姓名、邮箱的n-gram搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='每次读取的员工数量')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(f'员工搜索索引重建完成：{count}个员工，耗时{time.perf_counter() - start:.2f}秒')
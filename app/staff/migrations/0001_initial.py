@@ -0,0 +1,39 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:48
+
+import django.db.models.deletion
+import shortuuidfield.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('uid', shortuuidfield.fields.ShortUUIDField(blank=True, editable=False, max_length=22, primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('export_format', models.CharField(default='xlsx', max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('status', models.IntegerField(choices=[(1, 'Pending'), (2, 'Running'), (3, 'Success'), (4, 'Failed'), (5, 'Cancelled'), (6, 'Expired')], default=1)),
+                ('total', models.IntegerField(default=0)),
+                ('processed', models.IntegerField(default=0)),
+                ('file', models.CharField(blank=True, max_length=200)),
+                ('error', models.TextField(blank=True)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('finish_time', models.DateTimeField(null=True)),
+                ('expire_time', models.DateTimeField(null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', related_query_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-create_time'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('oaauth', '0002_oadepartment_oauser_department'),
+        ('staff', '0002_emailoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=10)),
+                ('field', models.CharField(choices=[('n', 'Realname'), ('e', 'Email')], max_length=1)),
+                ('department', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='oaauth.oadepartment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'field', 'department'], name='staff_staff_token_374b52_idx')],
+                'unique_together': {('user', 'field', 'token')},
+            },
+        ),
+    ]
@@ -1,3 +1,104 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from shortuuidfield import ShortUUIDField
 
-# Create your models here.
+OAUser = get_user_model()
+
+
+class ExportStatusChoices(models.IntegerChoices):
+    # 排队中
+    PENDING = 1
+    # 导出中
+    RUNNING = 2
+    # 导出成功
+    SUCCESS = 3
+    # 导出失败
+    FAILED = 4
+    # 已取消
+    CANCELLED = 5
+    # 文件已过期删除
+    EXPIRED = 6
+
+
+# 异步导出任务：POST创建后交给Celery执行，前端轮询进度，完成后通过下载接口下载EXPORT_ROOT下生成的文件
+class ExportJob(models.Model):
+    uid = ShortUUIDField(primary_key=True)  # 使用短UUID，避免通过自增id猜到别人的导出文件
+    # 导出类型：staff（员工信息）、absent（考勤信息）
+    kind = models.CharField(max_length=20)
+    # 导出格式：xlsx、csv
+    export_format = models.CharField(max_length=10, default='xlsx')
+    # 导出参数（员工pks、考勤日期范围等）
+    params = models.JSONField(default=dict, blank=True)
+    status = models.IntegerField(choices=ExportStatusChoices, default=ExportStatusChoices.PENDING)
+    # 总行数和已导出行数，用于计算进度
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    # 生成的文件，相对于EXPORT_ROOT的路径
+    file = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    owner = models.ForeignKey(OAUser, on_delete=models.CASCADE, related_name='export_jobs', related_query_name='export_jobs')
+    create_time = models.DateTimeField(auto_now_add=True)
+    finish_time = models.DateTimeField(null=True)
+    # 文件过期时间，过期后文件会被定时任务删除
+    expire_time = models.DateTimeField(null=True)
+
+    class Meta:
+        ordering = ['-create_time']
+
+
+class OutboxStatusChoices(models.IntegerChoices):
+    # 待发送
+    PENDING = 1
+    # 发送中（被某个worker领取了）
+    SENDING = 2
+    # 已发送
+    SENT = 3
+    # 多次重试后仍然失败
+    FAILED = 4
+
+
+# 邮件发件箱：业务代码在事务中写入，Celery worker批量取出发送，失败后按指数退避重试
+class EmailOutbox(models.Model):
+    # 去重key，同一个key只会发送一次，例如 active:{用户uid}:{激活token的摘要}
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    status = models.IntegerField(choices=OutboxStatusChoices, default=OutboxStatusChoices.PENDING)
+    # 已尝试发送的次数
+    attempts = models.IntegerField(default=0)
+    # 下一次可以发送的时间（重试退避；发送中的消息超过这个时间还没结束，认为worker已经挂了，可以被重新领取）
+    next_attempt_time = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+    create_time = models.DateTimeField(auto_now_add=True)
+    sent_time = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # worker领取待发送的消息
+            models.Index(fields=['status', 'next_attempt_time']),
+            # 统计吞吐量
+            models.Index(fields=['status', 'sent_time']),
+        ]
+
+
+class SearchFieldChoices(models.TextChoices):
+    REALNAME = 'n'
+    EMAIL = 'e'
+
+
+# 员工搜索索引：把姓名、邮箱拆成n-gram，每个n-gram一行
+# 搜索时先按n-gram走索引找到候选员工，避免 realname LIKE '%x%' 全表扫描
+class StaffSearchToken(models.Model):
+    token = models.CharField(max_length=10)
+    # token来自哪个字段：n（姓名）、e（邮箱）
+    field = models.CharField(max_length=1, choices=SearchFieldChoices)
+    user = models.ForeignKey(OAUser, on_delete=models.CASCADE, related_name='+')
+    # 冗余员工所在部门，按部门限定搜索范围时不需要再关联用户表；部门删除时和用户一样置空
+    department = models.ForeignKey('oaauth.OAdepartment', null=True, on_delete=models.SET_NULL, related_name='+', db_index=False)
+
+    class Meta:
+        unique_together = [('user', 'field', 'token')]
+        indexes = [
+            models.Index(fields=['token', 'field', 'department']),
+        ]
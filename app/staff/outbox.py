@@ -0,0 +1,157 @@
+#邮件发件箱（outbox）
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  业务代码 ──→ enqueue_email()（和业务数据在同一个事务中写入）      │
+# │                      ↓ 事务提交后                                │
+# │              dispatch_outbox_task.delay()                       │
+# │                      ↓                                          │
+# │  worker ──→ 批量领取待发送的消息 ──→ 同一个SMTP连接逐封发送         │
+# │               ├── 全局限速（所有worker共享，每秒最多N封）          │
+# │               ├── 成功：SENT                                     │
+# │               └── 失败：指数退避后重试，超过次数：FAILED           │
+# │  定时任务每隔一段时间也会触发一次，处理需要重试的消息               │
+# └─────────────────────────────────────────────────────────────────┘
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Min
+
+from .models import EmailOutbox, OutboxStatusChoices
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(email, subject, message, dedupe_key):
+    """
+    写入发件箱，返回 (outbox, created)
+    同一个dedupe_key只会写入一次；如果在事务中调用，消息和业务数据一起提交或回滚
+    """
+    with transaction.atomic():
+        outbox, created = EmailOutbox.objects.get_or_create(
+            dedupe_key=dedupe_key,
+            defaults={'email': email, 'subject': subject, 'message': message},
+        )
+    if created:
+        # 事务提交后再通知worker，避免worker读不到这条消息
+        transaction.on_commit(schedule_dispatch)
+    return outbox, created
+
+
+def schedule_dispatch():
+    # 短时间内大量写入时只投递一次任务，由worker一次性批量取出
+    from .tasks import dispatch_outbox_task
+    if cache.add('outbox:dispatch:scheduled', 1, timeout=1):
+        dispatch_outbox_task.delay()
+
+
+def claim_batch(batch_size):
+    """
+    领取一批到期的消息，标记为发送中，返回消息列表
+    领取时就计一次尝试：发送某封邮件时worker崩溃（lease到期后被重新领取），也会在EMAIL_OUTBOX_MAX_ATTEMPTS次后放弃，不会无限重试
+    """
+    now = datetime.now()
+    lease = timedelta(seconds=_setting('EMAIL_OUTBOX_LEASE', 60 * 5))
+    max_attempts = _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    with transaction.atomic():
+        # lease到期、尝试次数已经用完的消息（每次都让worker崩溃）：不再领取，直接标记为失败
+        EmailOutbox.objects.filter(
+            status=OutboxStatusChoices.SENDING, next_attempt_time__lte=now, attempts__gte=max_attempts
+        ).update(status=OutboxStatusChoices.FAILED, last_error='发送超时（worker在发送过程中退出）')
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutboxStatusChoices.PENDING, OutboxStatusChoices.SENDING], next_attempt_time__lte=now)
+            .order_by('next_attempt_time')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        # 发送中的消息在lease时间内不会被其他worker领取，worker挂掉后lease到期会被重新领取
+        EmailOutbox.objects.filter(id__in=ids).update(
+            status=OutboxStatusChoices.SENDING, next_attempt_time=now + lease, attempts=F('attempts') + 1
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by('next_attempt_time', 'id'))
+
+
+def throttle():
+    """全局限速：所有worker共享每秒的发送计数，超过EMAIL_OUTBOX_RATE_LIMIT就等到下一秒"""
+    rate_limit = _setting('EMAIL_OUTBOX_RATE_LIMIT', 10)
+    if not rate_limit:
+        return
+    while True:
+        now = time.time()
+        key = f'outbox:rate:{int(now)}'
+        cache.add(key, 0, timeout=5)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # key刚好过期，重新来一次
+            continue
+        if count <= rate_limit:
+            return
+        time.sleep(1 - (now - int(now)))
+
+
+def mark_failed(outbox, error):
+    # 领取时已经计过这次尝试
+    attempts = outbox.attempts
+    max_attempts = _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    if attempts >= max_attempts:
+        status, next_attempt_time = OutboxStatusChoices.FAILED, datetime.now()
+    else:
+        # 指数退避：base, base*2, base*4 ...
+        delay = _setting('EMAIL_OUTBOX_RETRY_DELAY', 30) * 2 ** (attempts - 1)
+        status, next_attempt_time = OutboxStatusChoices.PENDING, datetime.now() + timedelta(seconds=delay)
+    EmailOutbox.objects.filter(pk=outbox.pk).update(
+        status=status, attempts=attempts, next_attempt_time=next_attempt_time, last_error=str(error)[:2000]
+    )
+
+
+def dispatch_outbox(max_batches=None):
+    """发送到期的消息，返回成功发送的数量"""
+    batch_size = _setting('EMAIL_OUTBOX_BATCH_SIZE', 100)
+    max_batches = max_batches or _setting('EMAIL_OUTBOX_MAX_BATCHES', 10)
+    sent = 0
+    connection = get_connection()
+    try:
+        for _ in range(max_batches):
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            for outbox in batch:
+                throttle()
+                try:
+                    # 显式打开连接，整批消息复用同一个SMTP连接
+                    connection.open()
+                    connection.send_messages([EmailMessage(outbox.subject, outbox.message, settings.DEFAULT_FROM_EMAIL, [outbox.email])])
+                except Exception as e:
+                    logger.warning('send outbox email %s failed: %s', outbox.pk, e)
+                    connection.close()
+                    mark_failed(outbox, e)
+                    continue
+                EmailOutbox.objects.filter(pk=outbox.pk).update(
+                    status=OutboxStatusChoices.SENT, sent_time=datetime.now(), last_error=''
+                )
+                sent += 1
+    finally:
+        connection.close()
+    return sent
+
+
+def outbox_metrics(window=60):
+    """发件箱指标：积压数量、最早一条待发送消息的等待时间（秒）、最近window秒的吞吐量（封/秒）、失败数量"""
+    now = datetime.now()
+    pending = EmailOutbox.objects.filter(status__in=[OutboxStatusChoices.PENDING, OutboxStatusChoices.SENDING])
+    oldest = pending.aggregate(oldest=Min('create_time'))['oldest']
+    sent = EmailOutbox.objects.filter(status=OutboxStatusChoices.SENT, sent_time__gte=now - timedelta(seconds=window)).count()
+    return {
+        'depth': pending.count(),
+        'oldest_age': (now - oldest).total_seconds() if oldest else 0,
+        'throughput': sent / window,
+        'failed': EmailOutbox.objects.filter(status=OutboxStatusChoices.FAILED).count(),
+    }
@@ -1,6 +1,7 @@
-from rest_framework.pagination import PageNumberPagination
+from utils.paginations import KeysetPagination
 
-class StaffPagination(PageNumberPagination):
+# 默认页码分页；带上cursor参数时切换为keyset分页（见utils/paginations.py）
+class StaffPagination(KeysetPagination):
     page_query_param = 'page' # 默认的分页参数名称
     page_size_query_param = 'size' # 默认的分页大小参数名称
     page_size=2 # 默认的分页大小
@@ -0,0 +1,157 @@
+#员工搜索：姓名、邮箱拆成n-gram存到StaffSearchToken，搜索时按n-gram走索引找候选员工，再在内存中校验、排序
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  姓名 张三丰  → 张、三、丰、张三、三丰（1~2-gram）                │
+# │  邮箱 zhangsf@qq.com → 只取@前面的部分，1~3-gram                  │
+# │  搜索 三丰   → 姓名n-gram中同时有"三丰"的员工                      │
+# │  搜索 zhang  → 邮箱n-gram中同时有zha、han、ang、ngs的员工          │
+# │  候选员工先在数据库中粗略排序，只取前limit*CANDIDATE_FACTOR个，      │
+# │  再用真实的子串匹配过滤掉误命中，按匹配程度排序                     │
+# └─────────────────────────────────────────────────────────────────┘
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.db.models.functions import Length
+
+from .models import SearchFieldChoices, StaffSearchToken
+
+OAUser = get_user_model()
+
+# 每个字段n-gram的最大长度：中文姓名一般2~4个字，2-gram就有足够的区分度；邮箱是字母数字，用3-gram
+MAX_GRAM = {
+    SearchFieldChoices.REALNAME: 2,
+    SearchFieldChoices.EMAIL: 3,
+}
+
+# 搜索一个字（比如"张"）时候选员工可能有成千上万：在数据库中按匹配程度粗略排序，只加载前limit*CANDIDATE_FACTOR个
+# 粗略排序和score()的差别只有大小写、空白，多取几倍足够覆盖
+CANDIDATE_FACTOR = 5
+
+# 影响搜索索引的字段，save(update_fields=...)没有包含这些字段时不需要重建索引
+INDEXED_FIELDS = {'realname', 'email', 'department', 'department_id'}
+
+
+def normalize(text):
+    """统一小写，去掉所有空白"""
+    return ''.join((text or '').lower().split())
+
+
+def field_text(user, field):
+    if field == SearchFieldChoices.REALNAME:
+        return normalize(user.realname)
+    # 邮箱只索引@前面的部分，域名大家都一样，没有区分度
+    return normalize(user.email).split('@')[0]
+
+
+def ngrams(text, max_gram):
+    """text的所有1~max_gram长度的子串"""
+    return {text[i:i + n] for n in range(1, max_gram + 1) for i in range(len(text) - n + 1)}
+
+
+def query_grams(text, max_gram):
+    """
+    搜索词对应的n-gram：搜索词不超过max_gram时就是它本身，否则是所有max_gram长度的子串
+    包含这个子串的文本一定包含所有这些n-gram
+    """
+    if len(text) <= max_gram:
+        return {text} if text else set()
+    return {text[i:i + max_gram] for i in range(len(text) - max_gram + 1)}
+
+
+def build_tokens(user):
+    return [
+        StaffSearchToken(token=token, field=field, user_id=user.uid, department_id=user.department_id)
+        for field, max_gram in MAX_GRAM.items()
+        for token in ngrams(field_text(user, field), max_gram)
+    ]
+
+
+def index_users(users):
+    """重建这些员工的搜索索引（先删后插）"""
+    users = list(users)
+    if not users:
+        return
+    with transaction.atomic():
+        StaffSearchToken.objects.filter(user_id__in=[user.uid for user in users]).delete()
+        StaffSearchToken.objects.bulk_create([token for user in users for token in build_tokens(user)], batch_size=1000)
+
+
+def rebuild_index(chunk_size=1000):
+    """重建所有员工的搜索索引，返回员工数量"""
+    StaffSearchToken.objects.all().delete()
+    count = 0
+    users = OAUser.objects.only('uid', 'realname', 'email', 'department_id').order_by('pk')
+    chunk = []
+    for user in users.iterator(chunk_size=chunk_size):
+        chunk.append(user)
+        if len(chunk) >= chunk_size:
+            StaffSearchToken.objects.bulk_create([token for item in chunk for token in build_tokens(item)], batch_size=1000)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        StaffSearchToken.objects.bulk_create([token for item in chunk for token in build_tokens(item)], batch_size=1000)
+        count += len(chunk)
+    return count
+
+
+def candidate_ids(text, field, department_id=None):
+    """
+    返回n-gram全部命中的员工id（values queryset，可以直接作为子查询 pk__in=...）
+    只是候选：n-gram都命中不一定就包含搜索词，需要调用方再校验
+    """
+    grams = query_grams(normalize(text), MAX_GRAM[field])
+    tokens = StaffSearchToken.objects.filter(field=field, token__in=grams)
+    if department_id is not None:
+        tokens = tokens.filter(department_id=department_id)
+    return tokens.values('user_id').annotate(hits=Count('token')).filter(hits=len(grams)).values('user_id')
+
+
+def score(user, text):
+    """匹配程度：姓名完全相同 > 姓名开头 > 姓名包含 > 邮箱开头 > 邮箱包含，不匹配返回0"""
+    realname = field_text(user, SearchFieldChoices.REALNAME)
+    email = field_text(user, SearchFieldChoices.EMAIL)
+    if realname == text:
+        return 100
+    if realname.startswith(text):
+        return 80
+    if text in realname:
+        return 60
+    if email.startswith(text):
+        return 40
+    if text in email:
+        return 20
+    return 0
+
+
+def rough_score(text):
+    """数据库中计算的匹配程度，和score()的顺序一致；候选员工的n-gram都命中了，其余的算邮箱包含"""
+    return Case(
+        When(realname__iexact=text, then=Value(100)),
+        When(realname__istartswith=text, then=Value(80)),
+        When(realname__icontains=text, then=Value(60)),
+        When(email__istartswith=text, then=Value(40)),
+        default=Value(20),
+        output_field=IntegerField(),
+    )
+
+
+def search_staff(text, department_id=None, limit=10):
+    """
+    输入提示（typeahead）：按姓名、邮箱搜索员工，返回排好序的员工列表
+    department_id：只搜索这个部门的员工，None表示不限制
+    """
+    text = normalize(text)
+    if not text:
+        return []
+    candidates = Q()
+    for field in MAX_GRAM:
+        candidates |= Q(pk__in=candidate_ids(text, field, department_id))
+    users = (
+        OAUser.objects.filter(candidates).select_related('department')
+        .annotate(rough_score=rough_score(text), realname_length=Length('realname'))
+        .order_by('-rough_score', 'realname_length', 'realname')[:limit * CANDIDATE_FACTOR]
+    )
+    ranked = sorted(
+        ((score(user, text), user) for user in users),
+        key=lambda item: (-item[0], len(item[1].realname), item[1].realname),
+    )
+    return [user for value, user in ranked if value][:limit]
@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from utils.serializers import SparseFieldsMixin  # 支持 ?fields=&expand= 裁剪返回的字段
 from django.contrib.auth import get_user_model
 from django.core.validators import  FileExtensionValidator
+from django.urls import reverse
+from .models import ExportJob, ExportStatusChoices
+from .exports import EXPORT_KINDS, EXPORT_FORMATS
 
 
 OAUser = get_user_model()
@@ -20,7 +24,7 @@ class AddStaffSerializer(serializers.Serializer):
             raise serializers.ValidationError('该邮箱已存在！')
 
         # 2. 验证当前用户是否是部门的leader
-        if request.user.department.leader.uid != request.user.uid:
+        if not request.access_scope.is_leader:
             raise serializers.ValidationError('非部门leader不能添加员工！')
         return attrs
 
@@ -44,3 +48,42 @@ class StaffUploadSerializer(serializers.Serializer):#上传员工信息
         validators=[FileExtensionValidator(['xlsx','xls'])],
         error_messages={'required': '请上传员工信息文件！'}
     )
+
+
+# 创建导出任务序列化器
+class CreateExportJobSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=list(EXPORT_KINDS), error_messages={"required": "请选择导出类型！", "invalid_choice": "导出类型错误！"})
+    format = serializers.ChoiceField(choices=EXPORT_FORMATS, default='xlsx', error_messages={"invalid_choice": "导出格式错误！"})
+    # 员工导出：要导出的员工uid列表，不传则导出权限范围内的全部员工
+    pks = serializers.ListField(child=serializers.CharField(), required=False)
+    # 考勤导出：日期范围
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        request = self.context['request']
+        if not request.access_scope.can_manage_staff:
+            raise serializers.ValidationError('没有权限导出！')
+        return attrs
+
+
+# 导出任务序列化器（前端轮询进度）
+class ExportJobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['uid', 'kind', 'export_format', 'status', 'total', 'processed', 'progress', 'download_url', 'error', 'create_time', 'finish_time', 'expire_time']
+
+    def get_progress(self, obj):
+        if obj.status == ExportStatusChoices.SUCCESS:
+            return 100
+        if not obj.total:
+            return 0
+        return min(99, obj.processed * 100 // obj.total)
+
+    def get_download_url(self, obj):
+        if obj.status != ExportStatusChoices.SUCCESS:
+            return None
+        return reverse('staff:export_job_download', kwargs={'uid': obj.uid})
@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .search import INDEXED_FIELDS, index_users
+
+OAUser = get_user_model()
+
+
+# 员工保存后同步搜索索引；只更新了其他字段（比如登录时的last_login）就跳过
+# 注意：bulk_create/update不会触发signal，需要调用方自己调用index_users
+@receiver(post_save, sender=OAUser)
+def index_user_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_users([instance])
@@ -1,6 +1,9 @@
 from django.core.mail import send_mail
 from django.conf import settings
 from OA_back import celery_app
+from .exports import run_export_job, cleanup_export_jobs
+from .mails import send_active_emails
+from .outbox import dispatch_outbox
 
 # 将普通函数注册为 Celery 异步任务，name 参数指定任务名称
 @celery_app.task(name='send_mail_task')  
@@ -8,6 +11,30 @@ def send_mail_task(email, subject, message):#邮件发送任务
     send_mail(subject, recipient_list=[email] , message=message,from_email=settings.DEFAULT_FROM_EMAIL)
 
 
+# 批量发送激活邮件：一个任务、一个SMTP连接发送一批邮件，而不是每个员工一个任务、一个连接
+@celery_app.task(name='send_active_emails_task', ignore_result=True)
+def send_active_emails_task(emails, active_url):
+    send_active_emails(emails, active_url)
+
+
+# 异步导出任务，job_uid为ExportJob的主键
+@celery_app.task(name='export_job_task', ignore_result=True)
+def export_job_task(job_uid):
+    run_export_job(job_uid)
+
+
+# 发送邮件发件箱中到期的消息：写入发件箱后触发一次，定时任务也会定期触发（处理退避后需要重试的消息）
+@celery_app.task(name='dispatch_outbox_task', ignore_result=True)
+def dispatch_outbox_task():
+    return dispatch_outbox()
+
+
+# 定时清理过期的导出文件（配置在CELERY_BEAT_SCHEDULE中）
+@celery_app.task(name='cleanup_export_jobs_task', ignore_result=True)
+def cleanup_export_jobs_task():
+    return cleanup_export_jobs()
+
+
 # 参数	类型	说明
 # subject	str	邮件主题
 # message	str	邮件正文
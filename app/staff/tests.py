@@ -1,3 +1,324 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from OA_back import celery_app
+from app.oaauth.authentications import generate_jwt
+from app.oaauth.models import OAUser, OAdepartment, UserStatusChoices
+from app.oaauth.principals import principal_cache
+from .exports import cleanup_export_jobs, run_export_job
+from .mails import send_active_emails
+from .models import EmailOutbox, ExportJob, ExportStatusChoices, OutboxStatusChoices
+from .outbox import claim_batch, dispatch_outbox
+from .search import CANDIDATE_FACTOR, search_staff
+
+# 测试不依赖Redis：缓存使用进程内缓存，Celery使用内存broker并在当前进程中同步执行任务
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaffTestCase(TestCase):
+    """
+    董事会：雷冥（leader）
+    销售部：琥珀（leader）、小明
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.board = OAdepartment.objects.create(name='董事会', intro='董事会')
+        cls.sales = OAdepartment.objects.create(name='销售部', intro='销售部')
+        cls.leiming = cls.create_user('leiming@qq.com', '雷冥', cls.board)
+        cls.hupo = cls.create_user('hupo@qq.com', '琥珀', cls.sales)
+        cls.xiaoming = cls.create_user('xiaoming@qq.com', '小明', cls.sales)
+        cls.board.leader = cls.leiming
+        cls.board.save()
+        cls.sales.leader = cls.hupo
+        cls.sales.manager = cls.leiming
+        cls.sales.save()
+
+    @staticmethod
+    def create_user(email, realname, department):
+        return OAUser.objects.create(email=email, realname=realname, department=department, status=UserStatusChoices.ACTIVED)
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.local.clear()
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='JWT ' + generate_jwt(user))
+        return client
+
+
+class ExportJobTests(StaffTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.export_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_root, ignore_errors=True)
+        settings_override = override_settings(EXPORT_ROOT=self.export_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Celery的配置在第一次使用时就从settings读取好了，这里直接修改
+        previous = {key: celery_app.conf[key] for key in ('broker_url', 'task_always_eager')}
+        celery_app.conf.update(broker_url='memory://', task_always_eager=True)
+        self.addCleanup(celery_app.conf.update, previous)
+
+    def test_create_poll_download(self):
+        client = self.client_for(self.leiming)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/staff/export', {'kind': 'staff', 'format': 'csv'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        uid = response.json()['uid']
+
+        response = client.get(f'/api/staff/export/{uid}')
+        self.assertEqual(response.json()['status'], ExportStatusChoices.SUCCESS)
+        self.assertEqual(response.json()['progress'], 100)
+
+        response = client.get(f'/api/staff/export/{uid}/download')
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(content.splitlines()[0], '姓名,邮箱,部门,入职日期,状态')
+        self.assertEqual(len(content.splitlines()), 1 + OAUser.objects.count())
+
+        # 文件只在EXPORT_ROOT下，不能通过不需要登录的媒体文件路由下载
+        job = ExportJob.objects.get(pk=uid)
+        self.assertTrue(os.path.exists(os.path.join(self.export_root, job.file)))
+        self.assertEqual(APIClient().get(f'/api/media/{job.file}').status_code, 404)
+        self.assertEqual(APIClient().get(f'/api/media/exports/{job.file}').status_code, 404)
+
+    def test_download_owner_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            uid = self.client_for(self.leiming).post('/api/staff/export', {'kind': 'staff', 'format': 'xlsx'}, format='json').json()['uid']
+        self.assertEqual(self.client_for(self.hupo).get(f'/api/staff/export/{uid}/download').status_code, 404)
+        response = self.client_for(self.leiming).get(f'/api/staff/export/{uid}/download')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+
+    def create_job(self, export_format='csv'):
+        return ExportJob.objects.create(kind='staff', export_format=export_format, owner=self.leiming)
+
+    def test_failure(self):
+        # 写文件失败：任务标记为失败并记录原因，删除写了一半的文件，异常继续抛出（Celery记录）
+        job = self.create_job()
+
+        def write_csv(rows, headers, fp):
+            fp.write('姓名\n')
+            raise OSError('disk full')
+
+        with mock.patch('app.staff.exports.write_csv', side_effect=write_csv):
+            with self.assertRaises(OSError):
+                run_export_job(job.uid)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportStatusChoices.FAILED)
+        self.assertEqual(job.error, 'disk full')
+        self.assertIsNotNone(job.finish_time)
+        self.assertEqual(os.listdir(self.export_root), [])
+        self.assertEqual(self.client_for(self.leiming).get(f'/api/staff/export/{job.uid}/download').status_code, 404)
+
+        # 已经不是排队中的任务不会再执行
+        run_export_job(job.uid)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportStatusChoices.FAILED)
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_cancelled(self):
+        # 导出过程中被取消：下一次检查进度时停止，删除文件，状态保持已取消
+        job = self.create_job()
+
+        def write_csv(rows, headers, fp):
+            ExportJob.objects.filter(pk=job.uid).update(status=ExportStatusChoices.CANCELLED)
+            for row in rows:
+                fp.write(str(row))
+
+        with mock.patch('app.staff.exports.write_csv', side_effect=write_csv):
+            run_export_job(job.uid)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportStatusChoices.CANCELLED)
+        self.assertEqual(job.file, '')
+        self.assertEqual(os.listdir(self.export_root), [])
+
+    def test_cleanup_expired(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            uid = self.client_for(self.leiming).post('/api/staff/export', {'kind': 'staff', 'format': 'csv'}, format='json').json()['uid']
+        ExportJob.objects.filter(pk=uid).update(expire_time=datetime.now() - timedelta(seconds=1))
+        self.assertEqual(cleanup_export_jobs(), 1)
+        job = ExportJob.objects.get(pk=uid)
+        self.assertEqual((job.status, job.file), (ExportStatusChoices.EXPIRED, ''))
+        self.assertEqual(os.listdir(self.export_root), [])
+
+
+class FlakyEmailBackend(EmailBackend):
+    """locmem邮件后端，发送第fail_at封邮件时失败一次"""
+
+    def __init__(self, fail_at, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def send_messages(self, messages):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise ConnectionResetError('connection lost')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   ACTIVE_EMAIL_CHUNK_SIZE=3, ACTIVE_EMAIL_MAX_RETRIES=1, ACTIVE_EMAIL_RETRY_DELAY=0, ACTIVE_EMAIL_RATE_LIMIT=0)
+class ActiveEmailTests(TestCase):
+    emails = [f'staff{index}@qq.com' for index in range(7)]
+
+    def test_send_all(self):
+        sent, failed = send_active_emails(self.emails, 'http://testserver/api/staff/active')
+        self.assertEqual((sent, failed), (7, []))
+        self.assertEqual([message.to[0] for message in mail.outbox], self.emails)
+        self.assertIn('http://testserver/api/staff/active?token=', mail.outbox[0].body)
+
+    def test_retry_does_not_resend(self):
+        # 第一块的第2封失败一次：重试时只重发这一封，已经发出的第1封不会重复发送
+        sent, failed = send_active_emails(self.emails, 'http://testserver/api/staff/active', connection=FlakyEmailBackend(fail_at=2))
+        self.assertEqual((sent, failed), (7, []))
+        self.assertEqual([message.to[0] for message in mail.outbox], self.emails)
+
+    def test_give_up_after_retries(self):
+        class AlwaysFail(EmailBackend):
+            def send_messages(self, messages):
+                if messages[0].to[0] == 'staff4@qq.com':
+                    raise ConnectionResetError('rejected')
+                return super().send_messages(messages)
+
+        sent, failed = send_active_emails(self.emails, 'http://testserver/api/staff/active', connection=AlwaysFail())
+        self.assertEqual((sent, failed), (6, ['staff4@qq.com']))
+        self.assertEqual(len(mail.outbox), 6)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RATE_LIMIT=0)
+class EmailOutboxTests(StaffTestCase):
+
+    def add_staff(self, email):
+        with self.captureOnCommitCallbacks():
+            response = self.client_for(self.hupo).post('/api/staff/staff', {'realname': '新人', 'email': email, 'password': '111111'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['data']['uid']
+
+    def test_readd_staff_gets_new_activation_mail(self):
+        uid = self.add_staff('newbie@qq.com')
+        OAUser.objects.filter(pk=uid).delete()
+        self.add_staff('newbie@qq.com')
+        self.assertEqual(EmailOutbox.objects.filter(email='newbie@qq.com').count(), 2)
+        self.assertEqual(dispatch_outbox(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_expired_lease_counts_attempts(self):
+        # 每次领取后worker都崩溃（lease到期），尝试次数用完后标记为失败，不再领取
+        self.add_staff('crash@qq.com')
+        outbox = EmailOutbox.objects.get(email='crash@qq.com')
+        for attempt in range(1, 4):
+            self.assertEqual([message.pk for message in claim_batch(10)], [outbox.pk])
+            self.assertEqual(EmailOutbox.objects.get(pk=outbox.pk).attempts, attempt)
+            EmailOutbox.objects.filter(pk=outbox.pk).update(next_attempt_time=outbox.create_time)
+        self.assertEqual(claim_batch(10), [])
+        self.assertEqual(EmailOutbox.objects.get(pk=outbox.pk).status, OutboxStatusChoices.FAILED)
+
+
+class StaffUploadTests(StaffTestCase):
+
+    def test_broken_file(self):
+        # 文件无法解析：记录异常日志，返回400，不写入任何员工
+        file = SimpleUploadedFile('staffs.xlsx', b'not an excel file')
+        count = OAUser.objects.count()
+        with self.assertLogs('app.staff.views', 'ERROR'):
+            response = self.client_for(self.leiming).post('/api/staff/upload', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], '员工数据添加错误！')
+        self.assertEqual(OAUser.objects.count(), count)
+
+
+class StaffSearchTests(StaffTestCase):
+
+    def search(self, user, q, **params):
+        response = self.client_for(user).get('/api/staff/search', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['realname'] for item in response.json()]
+
+    def test_search(self):
+        self.create_user('zhangsanfeng@qq.com', '张三丰', self.sales)
+        self.create_user('sanfeng@qq.com', '李三丰', self.sales)
+        self.assertEqual(self.search(self.hupo, '三丰'), ['张三丰', '李三丰'])
+        self.assertEqual(self.search(self.hupo, 'zhang'), ['张三丰'])
+        # 其他部门的员工搜索不到
+        self.assertEqual(self.search(self.leiming, '三丰', department_id=self.board.id), [])
+
+    def test_short_query_is_bounded(self):
+        # 搜索一个字：候选员工很多，只从数据库加载limit*CANDIDATE_FACTOR个，排在前面的还是匹配程度最高的
+        for index in range(30):
+            self.create_user(f'user{index}@qq.com', f'老张{index}', self.sales)
+        self.create_user('zhang@qq.com', '张', self.sales)
+        self.create_user('zhangwei@qq.com', '张伟', self.sales)
+        with CaptureQueriesContext(connection) as queries:
+            users = search_staff('张', limit=3)
+        self.assertEqual([user.realname for user in users], ['张', '张伟', '老张0'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn(f'LIMIT {3 * CANDIDATE_FACTOR}', queries[0]['sql'])
+
+
+class RefdataETagTests(StaffTestCase):
+
+    def get(self, params=None, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client_for(self.hupo).get('/api/staff/departments', params or {}, **headers)
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.get(etag=etag).status_code, 304)
+
+        # 部门变化后ETag变化
+        with self.captureOnCommitCallbacks(execute=True):
+            OAdepartment.objects.create(name='研发部', intro='研发部')
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_variant(self):
+        # ?fields=、?page=不同，返回的内容不同，ETag也不同，不能用另一个变体的ETag得到304
+        for index in range(10):
+            OAdepartment.objects.create(name=f'部门{index}', intro='部门')
+        full = self.get()
+        trimmed = self.get({'fields': 'id'})
+        second_page = self.get({'page': 2})
+        self.assertEqual(set(trimmed.json()['results'][0]), {'id'})
+        self.assertEqual(len(second_page.json()['results']), 2)
+        etags = {full['ETag'], trimmed['ETag'], second_page['ETag']}
+        self.assertEqual(len(etags), 3)
+
+        self.assertEqual(self.get({'fields': 'id'}, etag=full['ETag']).status_code, 200)
+        self.assertEqual(self.get({'page': 2}, etag=full['ETag']).status_code, 200)
+        self.assertEqual(self.get({'fields': 'id'}, etag=trimmed['ETag']).status_code, 304)
+        self.assertEqual(self.get({'page': 2}, etag=second_page['ETag']).status_code, 304)
+
+
+class PaginationTests(StaffTestCase):
+
+    def test_size_only_on_staff_list(self):
+        # 只有员工列表（StaffPagination）支持?size=，其他列表使用全局默认的每页数量
+        client = self.client_for(self.leiming)
+        self.assertEqual(len(client.get('/api/staff/staff', {'size': 1}).json()['results']), 1)
+        self.assertEqual(len(client.get('/api/staff/staff', {'size': 1, 'cursor': ''}).json()['results']), 1)
+        self.assertEqual(len(client.get('/api/staff/departments', {'size': 1}).json()['results']), 2)
@@ -18,6 +18,11 @@ urlpatterns = [
     # path('staff',views.StaffView.as_view(),name='staff_view'),
     path('download',views.StaffDownloadView.as_view(),name='download_staff'),
     path('upload',views.StaffUploadView.as_view(),name='upload_staff'),
+    path('export',views.ExportJobView.as_view(),name='export_job'),
+    path('export/<str:uid>',views.ExportJobDetailView.as_view(),name='export_job_detail'),
+    path('export/<str:uid>/download',views.ExportJobDownloadView.as_view(),name='export_job_download'),
+    path('search',views.StaffSearchView.as_view(),name='staff_search'),
+    path('outbox/metrics',views.OutboxMetricsView.as_view(),name='outbox_metrics'),
     path('active',views.ActiveStaffView.as_view(),name='active_staff'),
     path('test/celery',views.TestCeleryView.as_view(),name='test_celery')
 ]+router.urls
@@ -26,5 +31,10 @@ urlpatterns = [
 # GET / api/departments	DepartmentListView	获取部门列表
 # GET / api/download	StaffDownloadView	下载员工模板/数据
 # POST / api/upload	StaffUploadView	上传员工 Excel
+# POST / api/export	ExportJobView	创建异步导出任务
+# GET/DELETE / api/export/{uid}	ExportJobDetailView	查询导出进度/取消导出
+# GET / api/export/{uid}/download	ExportJobDownloadView	下载导出文件
+# GET / api/search	StaffSearchView	员工输入提示（姓名、邮箱）
+# GET / api/outbox/metrics	OutboxMetricsView	邮件发件箱指标
 # POST / api/active	ActiveStaffView	激活员工账号
 # GET / api/test/celery	TestCeleryView	测试 Celery 异步任务
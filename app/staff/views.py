@@ -3,7 +3,7 @@ from rest_framework.generics import ListAPIView
 from app.oaauth.models import OAdepartment,UserStatusChoices
 from app.oaauth.serializer import DepartmentSerializer
 from rest_framework.views import APIView
-from .serializer import AddStaffSerializer,ActiveStaffSerializer,StaffUploadSerializer
+from .serializer import AddStaffSerializer,ActiveStaffSerializer,StaffUploadSerializer,CreateExportJobSerializer,ExportJobSerializer
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import get_user_model
@@ -12,7 +12,9 @@ from django.conf import settings
 from utils import aeser
 from django.urls import reverse
 from OA_back.celery import debug_task
-from .tasks import send_mail_task
+from .tasks import send_mail_task, send_active_emails_task, export_job_task
+from .models import ExportJob, ExportStatusChoices, SearchFieldChoices
+from .search import candidate_ids, search_staff
 from django.views import View
 from django.http.response import JsonResponse
 from urllib import parse
@@ -20,13 +22,25 @@ from rest_framework import generics
 from rest_framework import exceptions
 from app.oaauth.serializer import UserSerializer
 from .paginations import StaffPagination
+from utils.serializers import SparseFieldsViewMixin, first_error
+from utils.paginations import ListPagination
+from utils import refdata
 from rest_framework import viewsets
 from rest_framework import mixins
 from datetime import datetime
+import hashlib
 import json
+import logging
 import pandas as pd
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
+import os
 from django.db import transaction
+from .imports import import_staff
+from .outbox import enqueue_email, outbox_metrics
+from .mails import build_active_content
+from .exports import EXPORT_FORMATS, EXPORT_KINDS, CONTENT_TYPES, STAFF_EXPORT_COLUMNS, ExportContentNegotiation, iter_rows, export_response, export_path
+
+logger = logging.getLogger(__name__)
 
 OAUser = get_user_model()
 aes = aeser.AESCipher(settings.SECRET_KEY)  # 创建AES对象
@@ -55,6 +69,21 @@ def send_active_email(request, email):
 class DepartmentListView(ListAPIView):
     queryset = OAdepartment.objects.all()
     serializer_class = DepartmentSerializer
+    pagination_class = ListPagination # 部门列表整个缓存起来（见utils/refdata.py），在内存中分页
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+            return list(self.get_serializer(queryset, many=True).data)
+
+        # 页码不影响缓存的部门列表，但是影响返回的内容，计入ETag
+        vary = (self.paginator.page_query_param,) if self.paginator is not None else ()
+        data, etag, not_modified = refdata.get_cached(request, refdata.DEPARTMENTS, build, vary=vary)
+        if not_modified:
+            return refdata.with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        page = self.paginate_queryset(data)
+        response = self.get_paginated_response(page) if page is not None else Response(data)
+        return refdata.with_etag(response, etag)
 
 
 #激活员工的过程
@@ -85,7 +114,7 @@ class ActiveStaffView(View):
                 if email != form_email:
                     return JsonResponse({'code':400,'message':'邮箱错误！'})
                 user.status = UserStatusChoices.ACTIVED
-                user.save()
+                user.save(update_fields=['status'])
                 return JsonResponse({'code':200,'message':'激活成功！'})
             else:
                 detail=list(serializer.errors.values())[0][0]
@@ -112,12 +141,10 @@ class StaffView(generics.ListCreateAPIView):
         #1.如果是董事会的，那么返回所有员工
         #2.如果不是董事会的，但是是部门的leader，那么返回部门员工列表
         #3.一般员工，抛出403 Forbidden错误
-        user=self.request.user
-        if user.department.name != "董事会":
-            if user.uid != user.department.leader.uid:
-                raise exceptions.PermissionDenied()
-            else:
-                queryset = queryset.filter(department_id=user.department_id)
+        scope=self.request.access_scope
+        if not scope.can_manage_staff:
+            raise exceptions.PermissionDenied()
+        queryset = scope.filter(queryset)
         return queryset.order_by("-data_joined").all()
 
 
@@ -160,9 +187,11 @@ class StaffView(generics.ListCreateAPIView):
 
 
 
-class StaffViewSet(viewsets.GenericViewSet,mixins.CreateModelMixin,mixins.ListModelMixin,mixins.UpdateModelMixin):
+class StaffViewSet(SparseFieldsViewMixin,viewsets.GenericViewSet,mixins.CreateModelMixin,mixins.ListModelMixin,mixins.UpdateModelMixin):
     queryset=OAUser.objects.all()
     pagination_class = StaffPagination
+    # keyset分页的排序，uid保证排序唯一
+    cursor_ordering = ('-date_joined', '-uid')
     def get_serializer_class(self):
        if self.request.method in ['GET','PUT']:
            return UserSerializer
@@ -181,17 +210,17 @@ class StaffViewSet(viewsets.GenericViewSet,mixins.CreateModelMixin,mixins.ListMo
         # 2.如果不是董事会的，但是是部门的leader，那么返回部门员工列表
         # 3.一般员工，抛出403 Forbidden错误
 
-        user = self.request.user
-        if user.department.name != "董事会":
-            if user.uid != user.department.leader.uid:
-                raise exceptions.PermissionDenied()
-            else:
-                queryset = queryset.filter(department_id=user.department_id)
+        scope = self.request.access_scope
+        if not scope.can_manage_staff:
+            raise exceptions.PermissionDenied()
+        if not scope.is_board:
+            queryset = scope.filter(queryset)
         else:
             if department_id:
                 queryset = queryset.filter(department_id=department_id)
             if realname:
-                queryset = queryset.filter(realname__contains=realname)
+                # 先用搜索索引找到候选员工，再校验子串，避免 LIKE '%x%' 全表扫描
+                queryset = queryset.filter(pk__in=candidate_ids(realname, SearchFieldChoices.REALNAME), realname__contains=realname)
             if date_joined:
                 try:
                     start_date = datetime.strptime(date_joined[0], "%Y-%m-%d")
@@ -202,7 +231,8 @@ class StaffViewSet(viewsets.GenericViewSet,mixins.CreateModelMixin,mixins.ListMo
                 except Exception:
                     pass
 
-        return queryset.order_by("-date_joined").all()
+        # 序列化员工时要用到部门，一次JOIN查出来
+        return queryset.select_related('department').order_by("-date_joined").all()
     # 添加员工
     def create(self, request, *args, **kwargs):
         serializer = AddStaffSerializer(data=request.data, context={'request': request})
@@ -211,14 +241,15 @@ class StaffViewSet(viewsets.GenericViewSet,mixins.CreateModelMixin,mixins.ListMo
             email = serializer.validated_data['email']
             password = serializer.validated_data['password']
 
-            # 保存用户数据
-            user = OAUser.objects.create_user(realname=realname, email=email, password=password)
-            department = request.user.department
-            user.department = department
-            user.save()
+            # 保存用户数据，激活邮件和用户在同一个事务中写入发件箱，要么都成功，要么都回滚
+            with transaction.atomic():
+                user = OAUser.objects.create_user(realname=realname, email=email, password=password)
+                department = request.user.department
+                user.department = department
+                user.save()
 
-            # 发送激活邮件（需要添加这个方法）
-            self.send_active_email(request, email)  # 注意：这里需要传入 request
+                # 发送激活邮件
+                self.send_active_email(request, user)
 
             return Response({
                 'code': 201,
@@ -235,14 +266,16 @@ class StaffViewSet(viewsets.GenericViewSet,mixins.CreateModelMixin,mixins.ListMo
                 'message': list(serializer.errors.values())[0][0]
             }, status=status.HTTP_400_BAD_REQUEST)
 
-    def send_active_email(self, request, email):
-        """发送激活邮件"""
-        token = aes.encrypt(email)
-        active_path = reverse('staff:active_staff') + '?' + parse.urlencode({'token': token})
-        active_url = request.build_absolute_uri(active_path)
-        message = f'请点击激活链接激活账号：{active_url}'
-        subject = 'XHC-OA账号激活'
-        send_mail_task.delay(email, subject, message)
+    def send_active_email(self, request, user):
+        """
+        写入邮件发件箱，由Celery worker发送激活邮件（失败自动重试）
+        去重key带上用户uid和这次的token：同一封邮件只发送一次，员工删除后重新添加、重新发送激活邮件时会生成新的邮件
+        """
+        active_url = request.build_absolute_uri(reverse('staff:active_staff'))
+        token = aes.encrypt(user.email)
+        subject, message = build_active_content(user.email, active_url, token)
+        # token的长度和邮箱长度有关，取摘要保证不超过dedupe_key的长度
+        enqueue_email(user.email, subject, message, dedupe_key=f'active:{user.uid}:{hashlib.sha256(token.encode()).hexdigest()[:32]}')
 
     def update(self, request, *args, **kwargs):
         kwargs['partial'] = True#告诉DRF只修改部分数据
@@ -258,46 +291,122 @@ class TestCeleryView(APIView):
         return Response({'成功'})
 
 
+# 员工输入提示：按姓名、邮箱搜索，董事会可以搜索所有部门（可以用department_id指定部门），其他人只能搜索本部门
+# /staff/search?q=张&limit=10
+class StaffSearchView(APIView):
+    def get(self, request):
+        q = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+        scope = request.access_scope
+        if not scope.is_board and scope.department_id is None:
+            return Response([])
+        department_id = request.query_params.get('department_id') if scope.is_board else scope.department_id
+        users = search_staff(q, department_id=department_id or None, limit=limit)
+        return Response([
+            {'uid': user.uid, 'realname': user.realname, 'email': user.email,
+             'department': {'id': user.department_id, 'name': user.department.name} if user.department else None}
+            for user in users
+        ])
+
+
+# 邮件发件箱指标：积压数量、最早消息的等待时间、吞吐量、失败数量（仅董事会）
+class OutboxMetricsView(APIView):
+    def get(self, request):
+        if not request.access_scope.is_board:
+            return Response({"detail": "您没有权限访问！"}, status=status.HTTP_403_FORBIDDEN)
+        return Response(outbox_metrics())
+
+
 # 下载员工信息
 class StaffDownloadView(APIView):
+    # ?format=csv|xlsx 是导出文件的格式，不参与DRF的内容协商
+    content_negotiation_class = ExportContentNegotiation
+
     def get(self, request):
-        # /staff/download?pks=[x,y]
-        # ['x','y'] -> json格式的字符串
+        # /staff/download?pks=[x,y]&format=xlsx
+        # ['x','y'] -> json格式的字符串（导出全部员工请使用异步导出任务 /staff/export）
         pks = request.query_params.get('pks')
         try:
             pks = json.loads(pks)
         except Exception:
             return Response({"detail": "员工参数错误！"}, status=status.HTTP_400_BAD_REQUEST)
+        export_format = request.query_params.get('format', 'xlsx')
+        if export_format not in EXPORT_FORMATS:
+            return Response({"detail": "导出格式错误！"}, status=status.HTTP_400_BAD_REQUEST)
         
         #权限检查
         try:
-            current_user = request.user
-            queryset = OAUser.objects
-            if current_user.department.name != '董事会':
-                if current_user.department.leader_id != current_user.uid:
-                    return Response({'detail': "没有权限下载！"}, status=status.HTTP_403_FORBIDDEN)
-                else:
-                    # 如果是部门的leader，那么就先过滤为本部门的员工
-                    queryset = queryset.filter(department_id=current_user.department_id)
+            scope = request.access_scope
+            if not scope.can_manage_staff:
+                return Response({'detail': "没有权限下载！"}, status=status.HTTP_403_FORBIDDEN)
+            # 如果是部门的leader，那么就先过滤为本部门的员工
+            queryset = scope.filter(OAUser.objects)
             
-            # 查询并导出数据
+            # 查询并导出数据：分块读取，CSV流式返回，XLSX先写入磁盘上的临时文件（见exports.py）
             queryset = queryset.filter(pk__in=pks)
-            result = queryset.values("realname", "email", "department__name", 'date_joined', 'status')
-            staff_df = pd.DataFrame(list(result))
-            staff_df = staff_df.rename(
-                columns={"realname": "姓名", "email": '邮箱', 'department__name': '部门', "date_joined": '入职日期',
-                         'status': '状态'})
-            response = HttpResponse(content_type='application/xlsx')
-            response['Content-Disposition'] = "attachment; filename=员工信息.xlsx"
-
-            #返回Excel文件
-            with pd.ExcelWriter(response) as writer:
-                staff_df.to_excel(writer, sheet_name='员工信息')
-            return response
+            rows = iter_rows(queryset.order_by('-date_joined'), STAFF_EXPORT_COLUMNS)
+            return export_response(rows, STAFF_EXPORT_COLUMNS, export_format, filename='员工信息', sheet_name='员工信息')
         except Exception as e:
-            print(e)
+            logger.exception('staff download failed')
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+# 创建异步导出任务（大批量导出不占用请求线程）
+class ExportJobView(APIView):
+    def post(self, request):
+        serializer = CreateExportJobSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            data = serializer.validated_data
+            params = {}
+            if 'pks' in data:
+                params['pks'] = data['pks']
+            for key in ('start_date', 'end_date'):
+                if data.get(key):
+                    params[key] = data[key].isoformat()
+            job = ExportJob.objects.create(kind=data['kind'], export_format=data['format'], params=params, owner=request.user)
+            # 事务提交后再投递任务，避免worker查不到这条记录
+            transaction.on_commit(lambda: export_job_task.delay(job.uid))
+            return Response(ExportJobSerializer(job).data, status=status.HTTP_201_CREATED)
+        else:
+            return Response({"detail": first_error(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# 查询导出进度 / 取消导出任务
+class ExportJobDetailView(APIView):
+    def get(self, request, uid):
+        job = ExportJob.objects.filter(pk=uid, owner_id=request.user.uid).first()
+        if not job:
+            return Response({"detail": "导出任务不存在！"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ExportJobSerializer(job).data)
+
+    def delete(self, request, uid):
+        # 排队中或导出中的任务才能取消，worker每导出一块数据会检查一次状态
+        cancelled = ExportJob.objects.filter(
+            pk=uid, owner_id=request.user.uid,
+            status__in=[ExportStatusChoices.PENDING, ExportStatusChoices.RUNNING]
+        ).update(status=ExportStatusChoices.CANCELLED)
+        if not cancelled:
+            return Response({"detail": "导出任务不存在或已结束！"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# 下载导出完成的文件
+class ExportJobDownloadView(APIView):
+    def get(self, request, uid):
+        job = ExportJob.objects.filter(pk=uid, owner_id=request.user.uid).first()
+        if not job or job.status != ExportStatusChoices.SUCCESS or job.expire_time < datetime.now():
+            return Response({"detail": "导出文件不存在或已过期！"}, status=status.HTTP_404_NOT_FOUND)
+        path = export_path(job)
+        if not os.path.exists(path):
+            return Response({"detail": "导出文件不存在或已过期！"}, status=status.HTTP_404_NOT_FOUND)
+        _, filename, _ = EXPORT_KINDS[job.kind]
+        response = FileResponse(open(path, 'rb'), content_type=CONTENT_TYPES[job.export_format])
+        response['Content-Disposition'] = f"attachment; filename={filename}.{job.export_format}"
+        return response
+
+
 # 上传员工信息
 class StaffUploadView(APIView):
     def post(self, request):
@@ -306,45 +415,25 @@ class StaffUploadView(APIView):
         if serializer.is_valid():
             file = serializer.validated_data.get('file')
             current_user = request.user
-            if current_user.department.name != '董事会' or current_user.department.leader_id != current_user.uid:
+            scope = request.access_scope
+            if not scope.is_board or not scope.is_leader:
                 return Response({"detail": "您没有权限访问！"}, status=status.HTTP_403_FORBIDDEN)
-            # 读取Excel文件中的数据
-            staff_df = pd.read_excel(file)
-            # 创建用户列表，用于批量创建用户
-            users = []
-            for index, row in staff_df.iterrows():
-                # 获取部门，如果当前用户不是董事会的leader，那么就只能添加本部门的员工
-                if current_user.department.name != '董事会':
-                    department = current_user.department
-                else:
-                    try:
-                        department = OAdepartment.objects.filter(name=row['部门']).first()
-                        if not department:
-                            return Response({"detail": f"{row['部门']}不存在！"}, status=status.HTTP_400_BAD_REQUEST)
-                    except Exception as e:
-                        return Response({"detail": "部门列不存在！"}, status=status.HTTP_400_BAD_REQUEST)
-
-                try:
-                    email = row['邮箱']
-                    realname = row['姓名']
-                    password = "111111"
-                    user = OAUser(email=email, realname=realname, department=department, status=UserStatusChoices.UNACTIVE)
-                    user.set_password(password)
-                    users.append(user)
-                except Exception:
-                    return Response({"detail": "请检查文件中邮箱、姓名、部门名称！"}, status=status.HTTP_400_BAD_REQUEST)
-            # 批量创建用户
+            # 读取Excel文件中的数据，整张表一次性校验，没有错误才批量写入数据库
             try:
-                # 原子操作（事务）
-                with transaction.atomic():
-                    # 统一把数据添加到数据库中
-                    OAUser.objects.bulk_create(users)
+                result = import_staff(file, scope, current_user)
             except Exception:
+                logger.exception('staff upload failed: user=%s', current_user.uid)
                 return Response({"detail": "员工数据添加错误！"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # 异步给每个新增的员工发送邮件
-            for user in users:
-                send_active_email(request, user.email)
+            if result.detail:
+                return Response({"detail": result.detail}, status=status.HTTP_400_BAD_REQUEST)
+            if result.errors:
+                # errors：每一行的错误信息，前端可以一次性展示给用户修改
+                return Response({"detail": f"共有{len(result.errors)}行数据有误，请检查文件中邮箱、姓名、部门名称！", "errors": result.errors}, status=status.HTTP_400_BAD_REQUEST)
+            users = result.users
+
+            # 异步给新增的员工批量发送激活邮件（一个任务，复用同一个SMTP连接）
+            active_url = request.build_absolute_uri(reverse('staff:active_staff'))
+            send_active_emails_task.delay([user.email for user in users], active_url)
             return Response()
         else:
             detail = list(serializer.errors.values())[0][0]
@@ -0,0 +1,157 @@
+#分页：默认还是页码分页，请求带上cursor参数时切换为keyset（游标）分页
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  页码分页：?page=500     → COUNT(*) + LIMIT 10 OFFSET 4990       │
+# │            页数越大，OFFSET要扫描、丢弃的行越多                   │
+# │  keyset分页：?cursor=xxx → WHERE (date_joined, uid) < (上一页最后一条)│
+# │            ORDER BY ... LIMIT 11，走索引直接定位，和第几页无关      │
+# │            ?count=0 不返回总数，省掉COUNT(*)                      │
+# └─────────────────────────────────────────────────────────────────┘
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(values, reverse=False):
+    """游标对前端是不透明的字符串：{"v": 排序字段的值, "r": 是否是向前翻页} 的json再base64"""
+    data = {'v': values}
+    if reverse:
+        data['r'] = 1
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """返回 (values, reverse)，游标无效时抛出ValueError"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return list(data['v']), bool(data.get('r'))
+    except Exception:
+        raise ValueError('invalid cursor')
+
+
+def keyset_q(ordering, values, reverse=False):
+    """
+    构造"排在这些值后面"的条件，ordering是 ('-date_joined', '-uid') 这样的排序
+    (a DESC, b DESC) 在 (x, y) 后面：a < x OR (a = x AND b < y)
+    reverse=True时取"排在前面"的数据（向前翻页）
+    """
+    q = Q()
+    for index, field in enumerate(ordering):
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition = Q(**{f'{name}__{lookup}': values[index]})
+        for prev_field, prev_value in zip(ordering[:index], values[:index]):
+            condition &= Q(**{prev_field.lstrip('-'): prev_value})
+        q |= condition
+    return q
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    页码分页 + keyset分页
+    - 不带cursor参数：和PageNumberPagination完全一样，前端不需要修改
+    - ?cursor=（空字符串表示第一页）：keyset分页，返回next_cursor/previous_cursor
+    - ?count=0：keyset分页时不计算总数，count返回null
+    排序字段由视图的cursor_ordering指定，最后一个字段必须唯一（主键），保证翻页稳定不重复、不遗漏
+    这是全局默认分页：不支持前端指定每页数量，需要的视图自己继承后设置page_size_query_param（例如StaffPagination）
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    # 视图没有指定cursor_ordering时使用
+    ordering = ('-create_time', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = tuple(getattr(view, 'cursor_ordering', None) or self.ordering)
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        values, reverse = [], False
+        if cursor:
+            try:
+                values, reverse = decode_cursor(cursor)
+            except ValueError:
+                raise NotFound('无效的游标！')
+            if len(values) != len(self.ordering):
+                raise NotFound('无效的游标！')
+
+        # 总数：只统计过滤条件，和游标无关
+        self.count = None
+        if request.query_params.get(self.count_query_param) != '0':
+            self.count = queryset.count()
+
+        if values:
+            queryset = queryset.filter(keyset_q(self.ordering, values, reverse))
+        # 向前翻页时反过来排序，取完再倒回来
+        ordering = [self.reverse_field(field) for field in self.ordering] if reverse else self.ordering
+        # 多取一条，判断还有没有下一页
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if results:
+            first, last = self.cursor_values(results[0]), self.cursor_values(results[-1])
+            # 向后翻页：有多出来的一条说明还有下一页；带了游标说明前面还有数据
+            # 向前翻页：反过来
+            if (has_more and not reverse) or (reverse and values):
+                self.next_cursor = encode_cursor(last)
+            if (values and not reverse) or (reverse and has_more):
+                self.previous_cursor = encode_cursor(first, reverse=True)
+        return results
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def cursor_values(self, instance):
+        """把对象的排序字段值转成json可以保存的值（时间转成isoformat，查询时Django会自动解析）"""
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.cursor_link(self.next_cursor)),
+            ('previous', self.cursor_link(self.previous_cursor)),
+            ('next_cursor', self.next_cursor),
+            ('previous_cursor', self.previous_cursor),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count']['nullable'] = True
+        schema['properties']['next_cursor'] = {'type': 'string', 'nullable': True}
+        schema['properties']['previous_cursor'] = {'type': 'string', 'nullable': True}
+        return schema
+
+
+class ListPagination(PageNumberPagination):
+    """对已经在内存中的列表（例如缓存的基础数据）分页，只支持页码分页，参数和KeysetPagination相同（?page=，不支持?size=）"""
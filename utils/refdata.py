@@ -0,0 +1,148 @@
+#基础数据（考勤类型、部门列表、部门人数等很少变化的小表）缓存 + HTTP ETag
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  refdata:{name}:version                 -> 版本号                │
+# │  refdata:{name}:{version}:{variant}     -> 序列化好的返回数据     │
+# │                                                                 │
+# │  模型保存/删除（事务提交后）版本号+1，旧版本的数据不再使用，自然过期  │
+# │  返回 ETag: "{name}-{version}-{variant}"（variant是查询参数的hash，  │
+# │  ?fields=、?page=不同返回的内容也不同），请求带 If-None-Match       │
+# │  并且ETag没变时直接返回304，只读一次缓存中的版本号，不查询数据库     │
+# │  bulk_create/update不会触发signal，需要调用方自己调用bump()         │
+# └─────────────────────────────────────────────────────────────────┘
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'refdata:{name}:version'
+PAYLOAD_KEY = 'refdata:{name}:{version}:{variant}'
+
+# 基础数据的名字
+ABSENT_TYPES = 'absent_types'
+DEPARTMENTS = 'departments'
+DEPARTMENT_STAFF_COUNT = 'department_staff_count'
+
+
+def get_timeout():
+    return getattr(settings, 'REFDATA_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def get_cache_control():
+    # 默认：浏览器可以缓存，但每次使用前都要用If-None-Match验证（验证一般返回304）
+    return getattr(settings, 'REFDATA_CACHE_CONTROL', 'private, no-cache')
+
+
+def get_version(name):
+    key = VERSION_KEY.format(name=name)
+    try:
+        version = cache.get(key)
+        if version is None:
+            # 版本号用当前时间（毫秒）初始化：缓存被清空后不会和客户端手里旧的ETag重复
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            version = cache.get(key)
+        return version
+    except Exception as e:
+        logger.warning('refdata cache unavailable: %s', e)
+        return None
+
+
+def _bump(names):
+    for name in names:
+        key = VERSION_KEY.format(name=name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 版本号不存在，下次读取时重新初始化
+            pass
+        except Exception as e:
+            logger.warning('refdata cache unavailable: %s', e)
+
+
+def bump(*names):
+    """基础数据变化：事务提交后版本号+1"""
+    transaction.on_commit(lambda: _bump(names))
+
+
+def watch(name, *models, fields=None):
+    """
+    模型保存、删除时让基础数据name的版本号+1，在AppConfig.ready()加载的signals.py中调用
+    fields：只有save(update_fields=...)更新了这些字段时才+1（例如登录时只更新last_login就不需要）
+    """
+    def on_save(sender, update_fields=None, **kwargs):
+        if fields is not None and update_fields is not None and not set(fields).intersection(update_fields):
+            return
+        bump(name)
+
+    def on_delete(sender, **kwargs):
+        bump(name)
+
+    for model in models:
+        uid = f'refdata:{name}:{model._meta.label}'
+        post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid + ':save')
+        post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=uid + ':delete')
+
+
+def _variant(request, params):
+    # 会影响返回数据的查询参数（例如?fields=）不同，缓存不同的数据
+    values = '&'.join(f'{param}={request.query_params.get(param, "")}' for param in params)
+    return hashlib.md5(values.encode()).hexdigest()[:12]
+
+
+def not_modified(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags or f'W/{etag}' in etags
+
+
+def get_cached(request, name, build, params=('fields', 'expand'), vary=()):
+    """
+    返回 (数据, etag, 是否可以直接返回304)
+    build()：缓存未命中时生成返回数据（可以JSON序列化的list/dict）
+    params：影响build()返回数据的查询参数，不同的值缓存不同的数据
+    vary：不影响缓存的数据、但是影响返回内容的查询参数（例如在内存中分页的?page=），只计入ETag
+    """
+    version = get_version(name)
+    if version is None:
+        return build(), None, False
+    etag = f'"{name}-{version}-{_variant(request, (*params, *vary))}"'
+    if not_modified(request, etag):
+        return None, etag, True
+    key = PAYLOAD_KEY.format(name=name, version=version, variant=_variant(request, params))
+    try:
+        data = cache.get(key)
+    except Exception as e:
+        logger.warning('refdata cache unavailable: %s', e)
+        return build(), etag, False
+    if data is None:
+        data = build()
+        try:
+            cache.set(key, data, get_timeout())
+        except Exception as e:
+            logger.warning('refdata cache unavailable: %s', e)
+    return data, etag, False
+
+
+def with_etag(response, etag):
+    if etag:
+        response['ETag'] = etag
+        response['Cache-Control'] = get_cache_control()
+    return response
+
+
+def cached_response(request, name, build, params=('fields', 'expand'), vary=()):
+    """整个返回数据都是基础数据的视图：return cached_response(request, refdata.ABSENT_TYPES, build)"""
+    data, etag, is_not_modified = get_cached(request, name, build, params, vary)
+    if is_not_modified:
+        return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+    return with_etag(Response(data), etag)
@@ -0,0 +1,193 @@
+#稀疏字段（sparse fieldsets）：GET请求通过 ?fields= 和 ?expand= 只返回需要的字段，同时减少数据库查询的工作量
+# ┌─────────────────────────────────────────────────────────────────┐
+# │  不带fields：和原来一样返回全部字段（嵌套对象完整展开）              │
+# │  ?fields=id,title,author                                         │
+# │      → 只返回这三个字段，author只返回主键（不JOIN用户表）           │
+# │  ?fields=id,title,author&expand=author                           │
+# │      → author返回完整的用户对象                                   │
+# │  ?fields=id,author.realname,author.department.name                │
+# │      → 点号表示嵌套对象中需要的字段（自动展开）                     │
+# │  数据库：only()只查需要的列，select_related/prefetch_related       │
+# │        去掉没有展开的关联                                         │
+# └─────────────────────────────────────────────────────────────────┘
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.db.models import Prefetch
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_sparse_params(request):
+    """
+    解析 ?fields=&expand=，返回 (spec, expand)
+    spec：{'id': {}, 'author': {'realname': {}}}，None表示不裁剪
+    expand：需要完整展开的嵌套对象路径，例如 {'author', 'author.department'}
+    只对GET等安全请求生效，创建、修改时返回的数据不受影响
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, frozenset()
+    params = getattr(request, 'query_params', request.GET)
+    fields = params.get(FIELDS_QUERY_PARAM)
+    if not fields:
+        return None, frozenset()
+    spec = {}
+    for path in fields.split(','):
+        node = spec
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    expand = frozenset(path.strip() for path in params.get(EXPAND_QUERY_PARAM, '').split(',') if path.strip())
+    return spec, expand
+
+
+def child_expand(expand, name):
+    """expand中属于name下面的路径，去掉name前缀"""
+    prefix = name + '.'
+    return frozenset(path[len(prefix):] for path in expand if path.startswith(prefix))
+
+
+class SparseFieldsMixin:
+    """
+    序列化器混入：根据 ?fields=&expand= 裁剪字段
+    顶层序列化器从context中的request解析参数，嵌套的序列化器由上一层设置
+    write_only的字段不会被裁剪
+    """
+    _sparse_spec = None
+    _sparse_expand = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        spec, expand = parse_sparse_params(self.context.get('request'))
+        if spec is not None:
+            self._sparse_spec, self._sparse_expand = spec, expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self._sparse_spec
+        if spec is None:
+            return fields
+        for name in list(fields):
+            if name not in spec and not fields[name].write_only:
+                fields.pop(name)
+
+        for name, children in spec.items():
+            field = fields.get(name)
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            if children or name in self._sparse_expand:
+                # 指定了嵌套字段，或者在expand中：展开，children为空表示嵌套对象的全部字段
+                if isinstance(nested, SparseFieldsMixin):
+                    nested._sparse_spec = children or None
+                    nested._sparse_expand = child_expand(self._sparse_expand, name)
+            else:
+                # 没有展开的嵌套对象只返回主键，外键直接用 xxx_id，不需要查询关联表
+                kwargs = {'source': field.source} if field.source else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **kwargs)
+        return fields
+
+
+def prune_select_related(tree, spec, expand, prefix=''):
+    """select_related的树只保留展开了的关联"""
+    result = {}
+    for name, sub in tree.items():
+        if name not in spec:
+            continue
+        path = prefix + name
+        if spec[name]:
+            result[name] = prune_select_related(sub, spec[name], expand, path + '.')
+        elif path in expand:
+            result[name] = sub
+    return result
+
+
+def tree_paths(tree, prefix=''):
+    """{'requester': {'department': {}}} -> ['requester__department']"""
+    paths = []
+    for name, sub in tree.items():
+        path = prefix + name
+        paths.extend(tree_paths(sub, path + '__') if sub else [path])
+    return paths
+
+
+def only_fields(model, spec, select_tree, prefix=''):
+    """
+    only()需要的列，包括select_related的关联对象中需要的列
+    spec中有不是模型字段的名字（例如SerializerMethodField）时返回None，不知道它会用到哪些列，不使用only()
+    """
+    names = [prefix + model._meta.pk.name]
+    for name, children in spec.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        # 多对多、反向关联不是本表的列，由prefetch_related处理
+        if not field.concrete or field.many_to_many:
+            continue
+        names.append(prefix + name)
+        if field.is_relation and name in select_tree and children:
+            related = only_fields(field.related_model, children, select_tree[name], prefix + name + '__')
+            if related is None:
+                return None
+            names.extend(related)
+    return names
+
+
+def sparse_queryset(queryset, spec, expand, keep=()):
+    """
+    根据spec裁剪查询：
+    - select_related只保留展开了的关联
+    - prefetch_related只保留需要返回的关联
+    - only()只查询需要的列，keep是一定要查询的列（例如keyset分页的排序字段）
+    """
+    select = queryset.query.select_related
+    select_tree = {}
+    if isinstance(select, dict):
+        select_tree = prune_select_related(select, spec, expand)
+        queryset = queryset.select_related(None)
+        if select_tree:
+            queryset = queryset.select_related(*tree_paths(select_tree))
+
+    lookups = queryset._prefetch_related_lookups
+    if lookups:
+        kept = [
+            lookup for lookup in lookups
+            if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')[0] in spec
+        ]
+        queryset = queryset.prefetch_related(None).prefetch_related(*kept)
+
+    names = only_fields(queryset.model, spec, select_tree)
+    if names is not None:
+        queryset = queryset.only(*names, *(field.lstrip('-') for field in keep))
+    return queryset
+
+
+class SparseFieldsViewMixin:
+    """
+    视图混入：GET请求带 ?fields= 时，根据需要返回的字段裁剪查询
+    在filter_queryset中处理，所以list、retrieve都会生效（自定义的list要调用filter_queryset）
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        spec, expand = parse_sparse_params(self.request)
+        if spec is None:
+            return queryset
+        return sparse_queryset(queryset, spec, expand, keep=getattr(self, 'cursor_ordering', None) or ())
+
+
+def first_error(errors):
+    """
+    序列化器的第一条错误信息（字符串）
+    ListField、嵌套序列化器的错误是 {下标: [错误]}、[{字段: [错误]}] 这样的嵌套结构，不能直接取 [0][0]
+    """
+    while isinstance(errors, (dict, list)):
+        values = list(errors.values()) if isinstance(errors, dict) else errors
+        values = [value for value in values if value]
+        if not values:
+            return ''
+        errors = values[0]
+    return str(errors)